@@ -1,7 +1,7 @@
 """
 Functions for recording and retrieving audit logs.
 """
-from typing import Dict, List, Optional, Any, Union
+from typing import Callable, Dict, List, Optional, Any, Tuple, Union
 import json
 from datetime import datetime
 from psql import execute_query
@@ -11,7 +11,8 @@ def record_audit_log(
     table_name: str,
     record_id: int,
     action: str,
-    changes: Optional[Dict[str, Any]] = None
+    changes: Optional[Dict[str, Any]] = None,
+    execute: Callable = execute_query
 ) -> Dict:
     """
     Record an audit log entry.
@@ -22,10 +23,55 @@ def record_audit_log(
         record_id: The ID of the record being modified
         action: The action being performed (INSERT, UPDATE, DELETE)
         changes: A dictionary of changes (for UPDATE) or the full record (for INSERT/DELETE)
+        execute: Runs the query; pass a transaction's execute to write inside it
         
     Returns:
         Dict: The result of the operation
     """
+    result = record_audit_logs(user_id, table_name, action, [(record_id, changes)], execute=execute)
+    if result['status'] == 'okay':
+        return {'status': 'okay', 'message': 'Audit log recorded successfully', 'id': result['ids'][0]}
+    return result
+
+def _changes_to_sql(changes: Optional[Dict[str, Any]]) -> str:
+    """
+    Render a changes dictionary as a quoted JSON literal, or NULL.
+    """
+    if not changes:
+        return 'NULL'
+    # Convert any datetime objects to strings
+    changes_str = {}
+    for key, value in changes.items():
+        if isinstance(value, datetime):
+            changes_str[key] = value.isoformat()
+        else:
+            changes_str[key] = value
+    
+    # Escape single quotes in JSON string; other non-JSON values (dates, decimals) are stored as text
+    json_string = json.dumps(changes_str, default=str)
+    json_string_escaped = json_string.replace("'", "''")
+    return f"'{json_string_escaped}'"
+
+def record_audit_logs(
+    user_id: Optional[int],
+    table_name: str,
+    action: str,
+    records: List[Tuple[int, Optional[Dict[str, Any]]]],
+    execute: Callable = execute_query
+) -> Dict:
+    """
+    Record one audit log entry per record with a single multi-row INSERT.
+    
+    Args:
+        user_id: The ID of the user performing the action (can be None for system actions)
+        table_name: The name of the table being modified
+        action: The action being performed (INSERT, UPDATE, DELETE)
+        records: (record ID, changes) of every record being modified
+        execute: Runs the query; pass a transaction's execute to write inside it
+        
+    Returns:
+        Dict: The result of the operation, with the IDs of the audit log entries
+    """
     # Safety check: prevent audit logging for the audit_log table itself to avoid infinite loops
     if table_name.lower() == 'audit_log':
         return {
@@ -43,48 +89,33 @@ def record_audit_log(
             'message': f'Invalid action: {action}'
         }
     
-    # Convert changes to JSON
-    changes_json = 'NULL'
-    if changes:
-        # Convert any datetime objects to strings
-        changes_str = {}
-        for key, value in changes.items():
-            if isinstance(value, datetime):
-                changes_str[key] = value.isoformat()
-            else:
-                changes_str[key] = value
-        
-        # Escape single quotes in JSON string
-        json_string = json.dumps(changes_str)
-        json_string_escaped = json_string.replace("'", "''")
-        changes_json = f"'{json_string_escaped}'"
-    
     # Escape table name and action to prevent SQL injection
     table_name_escaped = table_name.replace("'", "''")
     action_escaped = action.replace("'", "''")
     
     # Build the query
     user_id_str = 'NULL' if user_id is None else str(user_id)
+    rows = ',\n        '.join(
+        f"({user_id_str}, '{table_name_escaped}', {int(record_id)}, '{action_escaped}', {_changes_to_sql(changes)})"
+        for (record_id, changes) in records
+    )
     
     query = f"""
     INSERT INTO audit_log (
         user_id, table_name, record_id, action, changes
     )
-    VALUES (
-        {user_id_str}, '{table_name_escaped}', {record_id}, '{action_escaped}', {changes_json}
-    )
+    VALUES
+        {rows}
     RETURNING id
     """
-
-
     
     try:
-        result = execute_query(query, exec_remote=False)
+        result = execute(query, exec_remote=False)
         if result['status'] == 'okay' and result['result']:
             return {
                 'status': 'okay',
                 'message': 'Audit log recorded successfully',
-                'id': result['result'][0]['id']
+                'ids': [row['id'] if isinstance(row, dict) else row[0] for row in result['result']]
             }
         return {
             'status': 'error',
@@ -0,0 +1,112 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+from psql import transaction
+from pypika import Query, Table
+from .update_order_form import mark_order_forms_delivered_bulk
+from .validate_register_entry import existing_bills_query, find_register_conflicts, conflict_error
+
+# Staging table the batch is COPY'd into; dropped automatically at commit
+STAGING_TABLE = 'register_entry_import'
+STAGING_COLUMNS = ['row_index', 'supplier_id', 'party_id', 'register_date', 'amount', 'bill_number', 'status', 'gr_amount', 'deduction']
+INSERT_COLUMNS = STAGING_COLUMNS[1:]
+
+def _missing_individuals_query() -> str:
+    """Finds every staged row pointing at a supplier or party that does not exist."""
+    return f"""
+        SELECT i.row_index, s.id IS NULL AS missing_supplier, p.id IS NULL AS missing_party
+        FROM {STAGING_TABLE} i
+        LEFT JOIN supplier s ON s.id = i.supplier_id
+        LEFT JOIN party p ON p.id = i.party_id
+        WHERE s.id IS NULL OR p.id IS NULL
+    """
+
+def _missing_individual_error(row: Dict) -> Dict:
+    """Formats a missing supplier or party as an input error."""
+    input_errors = {}
+    if row['missing_supplier']:
+        input_errors['supplier_id'] = {'status': 'error', 'message': 'Supplier does not exist'}
+    if row['missing_party']:
+        input_errors['party_id'] = {'status': 'error', 'message': 'Party does not exist'}
+    return {'status': 'error', 'message': 'Unknown supplier or party', 'input_errors': input_errors}
+
+def bulk_insert_register_entries(entries: List[Tuple[int, object]]) -> Dict:
+    """
+    Validates and inserts a batch of register entries in one transaction.
+
+    The batch is COPY'd into a temporary staging table, validated with set-based
+    queries against register_entry (see validate_register_entry for the bill number
+    rules), and the valid rows are moved into register_entry
+    with a single INSERT ... SELECT. Rows that fail validation are skipped and reported.
+
+    Args:
+        entries: (row index, RegisterEntry) pairs; the row index identifies the row in errors
+
+    Returns:
+        Dict: status, the inserted ids and a list of per-row errors
+    """
+    errors: Dict[int, Dict] = {}
+    with transaction() as tx:
+        tx.execute(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                row_index INT PRIMARY KEY,
+                supplier_id INT,
+                party_id INT,
+                register_date TIMESTAMP(0),
+                amount INT,
+                bill_number INT,
+                status VARCHAR(2),
+                gr_amount INT,
+                deduction INT
+            ) ON COMMIT DROP
+        """, exec_remote=False)
+        rows = [[index, entry.supplier_id, entry.party_id, entry.register_date, entry.amount, entry.bill_number, entry.status, entry.gr_amount, entry.deduction] for (index, entry) in entries]
+        tx.copy_rows(STAGING_TABLE, STAGING_COLUMNS, rows)
+
+        for row in tx.execute(_missing_individuals_query())['result']:
+            errors[row['row_index']] = _missing_individual_error(row)
+        existing = tx.execute(existing_bills_query(STAGING_TABLE))['result']
+        candidates = [(index, entry) for (index, entry) in sorted(entries, key=lambda pair: pair[0]) if index not in errors]
+        for (index, conflict) in find_register_conflicts(candidates, existing).items():
+            errors[index] = conflict_error(conflict)
+
+        accepted = [(index, entry) for (index, entry) in entries if index not in errors]
+        ids = []
+        if accepted:
+            columns = list(INSERT_COLUMNS)
+            selected = list(INSERT_COLUMNS)
+            if tx.current_user_id is not None:
+                columns += ['created_by', 'last_updated_by']
+                selected += [str(tx.current_user_id), str(tx.current_user_id)]
+            # NOT IN over an empty list would need NULL, which matches no row at all
+            where = f"WHERE row_index NOT IN ({', '.join(str(index) for index in errors)})" if errors else ''
+            insert_sql = f"""
+                INSERT INTO register_entry ({', '.join(columns)})
+                SELECT {', '.join(selected)}
+                FROM {STAGING_TABLE}
+                {where}
+                ORDER BY row_index
+                RETURNING id, {', '.join(INSERT_COLUMNS)}
+            """
+            # Returning the inserted columns gives every entry its own audit row with its values
+            ids = [row['id'] for row in tx.execute(insert_sql, exec_remote=False)['result']]
+
+            # The staging table only exists here, so the remote server gets the rows themselves
+            register_entry_table = Table('register_entry')
+            remote_query = Query.into(register_entry_table).columns(*columns)
+            audit_values = [tx.current_user_id, tx.current_user_id] if tx.current_user_id is not None else []
+            for (_, entry) in accepted:
+                remote_query = remote_query.insert(entry.supplier_id, entry.party_id, entry.register_date, entry.amount, entry.bill_number, entry.status, entry.gr_amount, entry.deduction, *audit_values)
+            tx.replicate(remote_query.get_sql())
+
+            latest_bills = {}
+            for (_, entry) in accepted:
+                key = (entry.supplier_id, entry.party_id)
+                latest_bills[key] = max(latest_bills.get(key, entry.register_date), entry.register_date)
+            mark_order_forms_delivered_bulk(latest_bills, execute=tx.execute)
+
+    return {
+        'status': 'okay',
+        'ids': ids,
+        'inserted': len(ids),
+        'errors': [{'row': index, **error} for (index, error) in sorted(errors.items())]
+    }
@@ -0,0 +1,24 @@
+from __future__ import annotations
+from typing import Callable, Dict, Iterable
+from psql import execute_query
+
+# Tables whose changes bump their row in data_version (see data_version_upgrade.sql)
+VERSIONED_TABLES = ('supplier', 'party', 'bank', 'transport')
+
+def get_data_versions(tables: Iterable[str] = VERSIONED_TABLES, execute: Callable = execute_query) -> Dict[str, int]:
+    """
+    Get the current data version of each table with a single lookup on data_version.
+    A version changes whenever a row of the table is inserted, updated or deleted;
+    tables that were never changed report 0.
+    """
+    tables = [table.lower() for table in tables]
+    names = ', '.join(f"'{table}'" for table in tables)
+    query = f'SELECT table_name, version FROM data_version WHERE table_name IN ({names})'
+    versions = {row['table_name']: int(row['version']) for row in execute(query)['result']}
+    return {table: versions.get(table, 0) for table in tables}
+
+def get_data_version(table: str, execute: Callable = execute_query) -> int:
+    """
+    Get the current data version of a table.
+    """
+    return get_data_versions([table], execute=execute)[table.lower()]
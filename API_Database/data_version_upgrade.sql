@@ -0,0 +1,38 @@
+-- Data versions for cached lookups (data_version.py).
+-- Every statement that changes supplier, party, bank or transport bumps that table's version,
+-- so in-memory copies of those tables can tell they are stale with a single-row lookup.
+-- The trigger function body contains ';', so apply this file with psql -f.
+CREATE TABLE IF NOT EXISTS data_version(
+    table_name VARCHAR PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_version (table_name, version)
+VALUES ('supplier', 1), ('party', 1), ('bank', 1), ('transport', 1)
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = data_version.version + 1, last_updated = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS supplier_data_version ON supplier;
+CREATE TRIGGER supplier_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON supplier
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
+DROP TRIGGER IF EXISTS party_data_version ON party;
+CREATE TRIGGER party_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON party
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
+DROP TRIGGER IF EXISTS bank_data_version ON bank;
+CREATE TRIGGER bank_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON bank
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
+DROP TRIGGER IF EXISTS transport_data_version ON transport;
+CREATE TRIGGER transport_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON transport
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
@@ -73,7 +73,7 @@ CREATE TABLE register_entry (
     deduction INT DEFAULT 0,
     status VARCHAR(2) DEFAULT 'N',
     partial_amount INT DEFAULT 0,
-    UNIQUE (bill_number, supplier_id, party_id, register_date),
+    UNIQUE (supplier_id, party_id, bill_number, register_date),
     last_update TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     created_by BIGINT,
@@ -185,6 +185,8 @@ CREATE TABLE order_form(
     FOREIGN KEY (supplier_id) REFERENCES supplier(id)
 );
 
+CREATE INDEX order_form_undelivered_idx ON order_form (supplier_id, party_id) WHERE delivered = false;
+
 CREATE SEQUENCE item_seq;
 
 CREATE TABLE item (
@@ -343,6 +345,76 @@ CREATE TABLE IF NOT EXISTS memo_dalali_payments (
     FOREIGN KEY (last_updated_by) REFERENCES users(id)
 );
 
+-- Memo number allocator (memo_number.py)
+-- A single counter row hands out memo numbers; reservations hold a number for the data-entry screen.
+CREATE TABLE IF NOT EXISTS memo_number_counter(
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    next_number INT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_by BIGINT REFERENCES users(id),
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_updated_by BIGINT REFERENCES users(id)
+);
+
+-- Start after the highest memo number in use
+INSERT INTO memo_number_counter (id, next_number)
+SELECT 1, COALESCE(MAX(memo_number), 0) + 1 FROM memo_entry
+ON CONFLICT (id) DO NOTHING;
+
+CREATE SEQUENCE IF NOT EXISTS memo_number_reservations_seq;
+
+CREATE TABLE IF NOT EXISTS memo_number_reservations(
+    id INT DEFAULT nextval('memo_number_reservations_seq') PRIMARY KEY,
+    memo_number INT NOT NULL UNIQUE,
+    reserved_by BIGINT REFERENCES users(id),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_by BIGINT REFERENCES users(id),
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_updated_by BIGINT REFERENCES users(id)
+);
+
+CREATE INDEX IF NOT EXISTS memo_number_reservations_expires_at_idx
+ON memo_number_reservations (expires_at);
+
+-- Data versions for cached lookups (data_version.py)
+-- Every statement that changes supplier, party, bank or transport bumps that table's version,
+-- so in-memory copies of those tables can tell they are stale with a single-row lookup.
+CREATE TABLE IF NOT EXISTS data_version(
+    table_name VARCHAR PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_version (table_name, version)
+VALUES ('supplier', 1), ('party', 1), ('bank', 1), ('transport', 1)
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = data_version.version + 1, last_updated = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS supplier_data_version ON supplier;
+CREATE TRIGGER supplier_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON supplier
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
+DROP TRIGGER IF EXISTS party_data_version ON party;
+CREATE TRIGGER party_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON party
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
+DROP TRIGGER IF EXISTS bank_data_version ON bank;
+CREATE TRIGGER bank_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON bank
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
+DROP TRIGGER IF EXISTS transport_data_version ON transport;
+CREATE TRIGGER transport_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON transport
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_data_version();
+
 -- Default admin user
 INSERT INTO users (username, password_hash, full_name, role, is_active)
 SELECT 'admin', '$2b$12$1xxxxxxxxxxxxxxxxxxxxuZLbwxnpY0o58unSvIPxddLxGystU.', 'Administrator', 'admin', TRUE
@@ -374,3 +446,22 @@ VALUES
 ('user', 'item', FALSE, TRUE, FALSE, FALSE),
 ('user', 'item_entry', TRUE, TRUE, TRUE, FALSE)
 ON CONFLICT (role, resource) DO NOTHING;
+
+-- Trigram indexes for /search (search_entities.py)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS supplier_name_trgm_idx ON supplier USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS supplier_address_trgm_idx ON supplier USING GIN (address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS supplier_phone_number_trgm_idx ON supplier USING GIN (phone_number gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS party_name_trgm_idx ON party USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS party_address_trgm_idx ON party USING GIN (address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS party_phone_number_trgm_idx ON party USING GIN (phone_number gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS bank_name_trgm_idx ON bank USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS bank_address_trgm_idx ON bank USING GIN (address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS bank_phone_number_trgm_idx ON bank USING GIN (phone_number gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS register_entry_party_id_idx ON register_entry (party_id);
+CREATE INDEX IF NOT EXISTS memo_entry_supplier_id_idx ON memo_entry (supplier_id);
+CREATE INDEX IF NOT EXISTS memo_entry_party_id_idx ON memo_entry (party_id);
@@ -1,32 +1,38 @@
 from __future__ import annotations
-from typing import Dict
-from psql import db_connector, execute_query
+from typing import Dict, List, Callable
+from psql import db_connector, execute_query, transaction
 from API_Database import retrieve_memo_entry, sql_date
 from Entities import MemoEntry, MemoBill
-from .update_partial_amount import update_part_payment
+from .update_partial_amount import update_part_payments
+from .memo_number import consume_memo_number
 from Exceptions import DataError
 from pypika import Query, Table
 import json
 
 def insert_memo_entry(entry: MemoEntry) -> Dict:
-    """Inserts a memo entry along with its bills and payments into the database; returns the insertion status."""
-    status = insert_memo(entry)
-    memo_id = MemoEntry.get_memo_entry_id(entry.supplier_id, entry.party_id, entry.memo_number)
-    for bill in entry.memo_bills:
-        status = insert_memo_bill(bill, memo_id)
-    for payment in entry.payment:
-        payment['memo_id'] = memo_id
-        status = insert_memo_payment(payment)
-    if entry.mode == 'Full':
-        for part_memo_id in entry.part_payment:
-            status = update_part_payment(entry.supplier_id, entry.party_id, memo_id=part_memo_id, use_memo_id=memo_id)
-        return status
-    elif entry.mode == 'Part':
-        return insert_part_memo(entry, memo_id)
-    else:
+    """
+    Inserts a memo entry along with its bills and payments into the database in a single transaction.
+    The memo is written with one INSERT, its bills and payments with one multi-row INSERT each,
+    and its memo number is consumed from the memo number counter.
+    Returns the memo insertion status with the new memo id under 'id'.
+    """
+    if entry.mode not in ['Full', 'Part']:
         raise DataError('Invalid Memo Type')
+    with transaction() as tx:
+        status = insert_memo(entry, execute=tx.execute)
+        memo_id = int(status['result'][0]['id'])
+        insert_memo_bills(entry.memo_bills, memo_id, execute=tx.execute)
+        insert_memo_payments(entry.payment, memo_id, execute=tx.execute)
+        if entry.mode == 'Full':
+            if entry.part_payment:
+                update_part_payments(entry.supplier_id, entry.party_id, memo_ids=entry.part_payment, use_memo_id=memo_id, execute=tx.execute)
+        else:
+            insert_part_memo(entry, memo_id, execute=tx.execute)
+        consume_memo_number(entry.memo_number, execute=tx.execute)
+    status['id'] = memo_id
+    return status
 
-def insert_memo(entry: MemoEntry) -> None:
+def insert_memo(entry: MemoEntry, execute: Callable = execute_query) -> Dict:
     """
     Insert a memo_entry into the memo_entry table.
     """
@@ -53,42 +59,54 @@ def insert_memo(entry: MemoEntry) -> None:
     )
     
     sql = insert_query.get_sql()
-    return execute_query(sql)
+    return execute(sql)
 
-def insert_memo_bill(entry: MemoBill, memo_id: int) -> None:
+def insert_memo_bills(bills: List[MemoBill], memo_id: int, execute: Callable = execute_query) -> Dict:
     """
-    Insert all the bills attached to the same memo number.
+    Insert all the bills attached to the same memo number with a single multi-row INSERT.
     """
+    if not bills:
+        return {'result': [], 'status': 'okay', 'message': 'No memo bills to insert'}
     memo_bills_table = Table('memo_bills')
-    insert_query = Query.into(memo_bills_table).columns('memo_id', 'bill_id', 'type', 'amount').insert(memo_id, entry.bill_id, entry.type, entry.amount)
-    sql = insert_query.get_sql()
-    if entry.bill_id is None:
-        sql = sql.replace(f'{entry.bill_id}', 'NULL')
-    return execute_query(sql)
+    insert_query = Query.into(memo_bills_table).columns('memo_id', 'bill_id', 'type', 'amount')
+    for bill in bills:
+        insert_query = insert_query.insert(memo_id, bill.bill_id, bill.type, bill.amount)
+    return execute(insert_query.get_sql())
 
-def insert_memo_payment(payment: Dict) -> None:
+def insert_memo_bill(entry: MemoBill, memo_id: int) -> Dict:
     """
-    Add the memo payments for the given memo_entry
+    Insert a single bill attached to a memo number.
     """
+    return insert_memo_bills([entry], memo_id)
+
+def insert_memo_payments(payments: List[Dict], memo_id: int, execute: Callable = execute_query) -> Dict:
+    """
+    Add all the memo payments for the given memo_entry with a single multi-row INSERT
+    """
+    if not payments:
+        return {'result': [], 'status': 'okay', 'message': 'No memo payments to insert'}
     memo_payments_table = Table('memo_payments')
-    
-    # Default amount to 0 if not present
-    amount = payment.get('amount', 0)
-    
     insert_query = Query.into(memo_payments_table).columns(
         'memo_id', 'bank_id', 'cheque_number', 'amount'
-    ).insert(
-        payment['memo_id'], payment['bank_id'], payment['cheque_number'], amount
     )
-    
-    sql = insert_query.get_sql()
-    return execute_query(sql)
+    for payment in payments:
+        # Default amount to 0 if not present
+        insert_query = insert_query.insert(
+            memo_id, payment['bank_id'], payment['cheque_number'], payment.get('amount', 0)
+        )
+    return execute(insert_query.get_sql())
+
+def insert_memo_payment(payment: Dict) -> Dict:
+    """
+    Add a single memo payment; the payment must carry its memo_id
+    """
+    return insert_memo_payments([payment], payment['memo_id'])
 
-def insert_part_memo(entry: MemoEntry, memo_id) -> None:
+def insert_part_memo(entry: MemoEntry, memo_id, execute: Callable = execute_query) -> Dict:
     """
-    Insert all the bills attached to the same memo number.
+    Record the part payment made through the given memo.
     """
     part_payments_table = Table('part_payments')
     insert_query = Query.into(part_payments_table).columns('supplier_id', 'party_id', 'memo_id').insert(entry.supplier_id, entry.party_id, memo_id)
     sql = insert_query.get_sql()
-    return execute_query(sql)
+    return execute(sql)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+from typing import Callable, Dict
+from psql import execute_query, transaction
+from Exceptions import DataError
+
+# How long a reserved memo number is held for the data-entry screen before it can be handed out again
+RESERVATION_MINUTES = 30
+
+# Counter and reservations are local coordination state; the remote copy only needs the memos themselves
+COUNTER_TABLE = 'memo_number_counter'
+RESERVATIONS_TABLE = 'memo_number_reservations'
+
+def peek_next_memo_number(execute: Callable = execute_query) -> int:
+    """
+    Returns the memo number the next reservation would get, without reserving it.
+    Reads the counter row and the few open reservations, so the cost does not grow with memo_entry.
+    """
+    query = f"""
+        SELECT COALESCE(
+            (SELECT MIN(memo_number) FROM {RESERVATIONS_TABLE} WHERE expires_at < CURRENT_TIMESTAMP),
+            (SELECT next_number FROM {COUNTER_TABLE} WHERE id = 1)
+        ) AS memo_number
+    """
+    result = execute(query)['result']
+    if not result or result[0]['memo_number'] is None:
+        raise DataError('Memo number counter is not initialised, run memo_number_upgrade.sql')
+    return int(result[0]['memo_number'])
+
+def reserve_memo_number(minutes: int = RESERVATION_MINUTES) -> Dict:
+    """
+    Atomically hands out a memo number and holds it for the caller.
+
+    An expired reservation that was never used is handed out again first, otherwise
+    the counter row is bumped. Both updates lock the row they touch, so two operators
+    can never receive the same number.
+
+    Returns:
+        Dict: memo_number and expires_at of the reservation
+    """
+    with transaction(exec_remote=False) as tx:
+        reclaimed = tx.execute(f"""
+            UPDATE {RESERVATIONS_TABLE}
+            SET reserved_by = {tx.current_user_id or 'NULL'}, expires_at = CURRENT_TIMESTAMP + INTERVAL '{int(minutes)} minutes'
+            WHERE id = (
+                SELECT id FROM {RESERVATIONS_TABLE}
+                WHERE expires_at < CURRENT_TIMESTAMP
+                ORDER BY memo_number
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING memo_number, expires_at
+        """)['result']
+        if reclaimed:
+            return {'status': 'okay', **reclaimed[0]}
+
+        allocated = tx.execute(f"""
+            UPDATE {COUNTER_TABLE}
+            SET next_number = next_number + 1
+            WHERE id = 1
+            RETURNING next_number - 1 AS memo_number
+        """)['result']
+        if not allocated:
+            raise DataError('Memo number counter is not initialised, run memo_number_upgrade.sql')
+        memo_number = int(allocated[0]['memo_number'])
+        reservation = tx.execute(f"""
+            INSERT INTO {RESERVATIONS_TABLE} (memo_number, reserved_by, expires_at)
+            VALUES ({memo_number}, {tx.current_user_id or 'NULL'}, CURRENT_TIMESTAMP + INTERVAL '{int(minutes)} minutes')
+            RETURNING memo_number, expires_at
+        """)['result']
+    return {'status': 'okay', **reservation[0]}
+
+def release_memo_number(memo_number: int) -> Dict:
+    """
+    Gives a reserved memo number back, e.g. when the data-entry screen is closed without saving.
+    The number is expired rather than deleted, so the next reservation hands it out again.
+    Only the user holding the reservation can release it.
+    """
+    with transaction(exec_remote=False) as tx:
+        reserved_by = 'IS NULL' if tx.current_user_id is None else f'= {int(tx.current_user_id)}'
+        ret = tx.execute(f"""
+            UPDATE {RESERVATIONS_TABLE}
+            SET expires_at = CURRENT_TIMESTAMP - INTERVAL '1 second'
+            WHERE memo_number = {int(memo_number)} AND reserved_by {reserved_by}
+        """)
+    if not ret['result']:
+        raise DataError(f'Memo number {memo_number} is not reserved by you')
+    return {'status': 'okay', 'memo_number': int(memo_number)}
+
+def consume_memo_number(memo_number: int, execute: Callable) -> Dict:
+    """
+    Records that a memo was saved with this number: drops its reservation and moves the
+    counter past it. Numbers typed in by hand are handled too, since the counter only moves forward.
+
+    Args:
+        memo_number: The number the memo was saved with
+        execute: The execute of the transaction inserting the memo; execute_query would not
+            commit, since it runs data-modifying WITH queries as SELECTs
+    """
+    query = f"""
+        WITH used AS (
+            DELETE FROM {RESERVATIONS_TABLE} WHERE memo_number = {int(memo_number)}
+        )
+        UPDATE {COUNTER_TABLE}
+        SET next_number = GREATEST(next_number, {int(memo_number) + 1})
+        WHERE id = 1
+        RETURNING next_number
+    """
+    return execute(query, exec_remote=False)
@@ -0,0 +1,31 @@
+-- Memo number allocator (memo_number.py).
+-- A single counter row hands out memo numbers; reservations hold a number for the data-entry screen.
+CREATE TABLE IF NOT EXISTS memo_number_counter(
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    next_number INT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_by BIGINT REFERENCES users(id),
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_updated_by BIGINT REFERENCES users(id)
+);
+
+-- Start after the highest memo number in use
+INSERT INTO memo_number_counter (id, next_number)
+SELECT 1, COALESCE(MAX(memo_number), 0) + 1 FROM memo_entry
+ON CONFLICT (id) DO NOTHING;
+
+CREATE SEQUENCE IF NOT EXISTS memo_number_reservations_seq;
+
+CREATE TABLE IF NOT EXISTS memo_number_reservations(
+    id INT DEFAULT nextval('memo_number_reservations_seq') PRIMARY KEY,
+    memo_number INT NOT NULL UNIQUE,
+    reserved_by BIGINT REFERENCES users(id),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_by BIGINT REFERENCES users(id),
+    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_updated_by BIGINT REFERENCES users(id)
+);
+
+CREATE INDEX IF NOT EXISTS memo_number_reservations_expires_at_idx
+ON memo_number_reservations (expires_at);
@@ -0,0 +1,4 @@
+-- Index behind delivery marking on register insert (mark_order_forms_delivered).
+-- Only undelivered order forms are ever looked up, so the index skips the delivered history.
+CREATE INDEX IF NOT EXISTS order_form_undelivered_idx
+ON order_form (supplier_id, party_id) WHERE delivered = false;
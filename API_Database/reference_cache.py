@@ -0,0 +1,106 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+from .data_version import VERSIONED_TABLES, get_data_version
+
+# How often, at most, a cached response asks the database whether its table changed
+REFERENCE_CHECK_SECONDS = float(os.environ.get('REFERENCE_CHECK_SECONDS', 1))
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A serialized response body with the data version it was built at and its strong ETag."""
+    body: str
+    version: Optional[int]
+    etag: str
+
+class ReferenceCache:
+    """Serialized responses of reference data (name lists and individual tables), shared by every request.
+
+    A response is rebuilt only when the data version of its table moved, and the version is
+    read at most once every REFERENCE_CHECK_SECONDS, so requests in between do no database
+    I/O. The ETag is a hash of the body, so it is the same in every worker and a client
+    holding it can be answered 304 Not Modified without reading any rows. Each response is
+    rebuilt under its own lock, so a slow table does not hold up requests for the others.
+    """
+
+    def __init__(self, check_seconds: float = REFERENCE_CHECK_SECONDS, get_version: Callable[[str], int] = get_data_version):
+        """Initialize the cache.
+
+        Args:
+            check_seconds: Minimum time between two version checks of the same response
+            get_version: Returns the current data version of a table
+        """
+        self.check_seconds = check_seconds
+        self._get_version = get_version
+        self._responses: Dict[Tuple[str, str], CachedResponse] = {}
+        self._checked_at: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table: str, kind: str, load: Callable[[], str]) -> CachedResponse:
+        """Return the response of a kind for a table, rebuilding it with load if the table changed.
+
+        Args:
+            table: The table the response is read from; only VERSIONED_TABLES are cached
+            kind: Distinguishes the responses built from the same table, e.g. 'names'
+            load: Reads the rows and returns the serialized body
+        """
+        if table not in VERSIONED_TABLES:
+            return self._build(load(), None)
+        key = (table, kind)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                cached = self._responses.get(key)
+                now = time.monotonic()
+                if cached is not None and now - self._checked_at[key] < self.check_seconds:
+                    self.hits += 1
+                    return cached
+            try:
+                version = self._get_version(table)
+            except Exception as e:
+                # Without the version table, serve fresh rows; the ETag still saves the transfer
+                print(f"Error reading data version of {table}: {str(e)}")
+                version = None
+            rebuild = cached is None or version is None or version != cached.version
+            if rebuild:
+                cached = self._build(load(), version)
+            with self._lock:
+                if rebuild:
+                    self.misses += 1
+                    self._responses[key] = cached
+                else:
+                    self.hits += 1
+                self._checked_at[key] = now
+            return cached
+
+    @staticmethod
+    def _build(body: str, version: Optional[int]) -> CachedResponse:
+        """Wrap a body with its ETag."""
+        return CachedResponse(body, version, hashlib.sha256(body.encode('utf-8')).hexdigest()[:32])
+
+    def invalidate(self, table: Optional[str] = None):
+        """Force the next get to rebuild the responses of one table, or of all of them."""
+        with self._lock:
+            for key in [key for key in self._responses if table is None or key[0] == table]:
+                del self._responses[key]
+
+    def get_stats(self) -> dict:
+        """Hit and miss counts of the cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._responses), 'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': self.hits / total if total else 0}
+
+_reference_cache = ReferenceCache()
+
+def get_reference_cache() -> ReferenceCache:
+    """Return the process-wide reference data cache."""
+    return _reference_cache
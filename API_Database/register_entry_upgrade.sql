@@ -0,0 +1,5 @@
+-- Index behind the duplicate bill validation (validate_register_entry.py).
+-- Every check looks up bills by supplier, party and bill number, so those lead the index.
+-- Older databases created before the UNIQUE constraint on register_entry also gain uniqueness here.
+CREATE UNIQUE INDEX IF NOT EXISTS register_entry_supplier_party_bill_date_idx
+ON register_entry (supplier_id, party_id, bill_number, register_date);
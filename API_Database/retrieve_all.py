@@ -5,6 +5,13 @@ from .retrieve_order_form import get_all_order_forms
 from .retrieve_item import get_all_items
 from .retrieve_item_entry import get_all_item_entries
 
+# Tables with their own retrieval; every other table is an individual table read in full
+ENTRY_TABLES = ('memo_entry', 'register_entry', 'order_form', 'item', 'item_entry')
+
+def is_individual(table_name: str) -> bool:
+    """Whether get_all reads the table in full, ignoring any filters."""
+    return table_name not in ENTRY_TABLES
+
 def get_all(table_name: str, **kwargs):
     """Retrieves all records from a specified table based on provided parameters."""
     if table_name == 'memo_entry':
@@ -8,6 +8,7 @@ from psql import db_connector, execute_query
 from API_Database.utils import parse_date, sql_date
 from API_Database.retrieve_partial_payment import get_partial_payment
 from API_Database.retrieve_partial_payment import get_partial_payment_bulk
+from API_Database.memo_number import peek_next_memo_number
 from pypika import Query, Table, Field, functions as fn, Order
 import sys
 import math
@@ -40,13 +41,9 @@ def check_add_memo(memo_number: int, memo_date: str) -> bool:
 
 def get_next_available_memo_number() -> int:
     """
-    Get the next available memo number
+    Get the next available memo number from the memo number counter
     """
-    query = 'select memo_number from memo_entry order by memo_number DESC;'
-    response = execute_query(query)
-    if len(response['result']) == 0:
-        raise DataError('No Memo Entries Found, please contact Vaibhav')
-    return response['result'][0]['memo_number'] + 1
+    return peek_next_memo_number()
 
 def get_memo_entry_id(supplier_id: int, party_id: int, memo_number: int) -> int:
     """
@@ -1,18 +1,43 @@
-from pypika import Query, Table, Criterion
-from psql import execute_query
+import os
+from pypika import Query, Table, Criterion, Order
+from pypika.enums import Comparator
+from pypika.terms import BasicCriterion, Case, Function, ValueWrapper
+from psql import transaction
+from Exceptions import DataError
 
-def search_entities(table_name: str, search_query: str, **kwargs):
+# Rows returned when the caller does not ask for a limit, and the most it may ask for
+SEARCH_LIMIT = int(os.environ.get('SEARCH_LIMIT', '100'))
+MAX_SEARCH_LIMIT = 1000
+# Longest a search may run before it is cancelled, in milliseconds
+SEARCH_TIMEOUT_MS = int(os.environ.get('SEARCH_TIMEOUT_MS', '5000'))
+
+class TrigramComparator(Comparator):
+    """pg_trgm operators; 'q <% name' holds when q is similar to a word sequence of name."""
+    word_similar = '<%'
+
+def word_similarity(search_query: str, field):
+    """pg_trgm's similarity of the query to the best matching part of a field, from 0 to 1."""
+    return Function('word_similarity', search_query, field)
+
+def build_search_query(table_name: str, search_query: str, limit: int = SEARCH_LIMIT, trigram: bool = True, **kwargs) -> str:
     """
-    Search for entities in the specified table that match the search query using PyPika.
+    Build the SQL searching a table for the search query.
+    
+    Text fields are matched with ILIKE, which the pg_trgm GIN indexes of
+    search_trgm_upgrade.sql serve, and names also match with small typos through the
+    word similarity operator. Supplier and party names of register and memo entries are
+    matched in their own tables first, so the entry tables are only probed by id.
+    Results are ranked by similarity to the query, then newest first.
     
     Args:
         table_name: The name of the table to search in
         search_query: The search query string
-        **kwargs: Additional filters to apply. Special parameters:
-            - field_filters: List of field filters with entityType, field, operator, and value
+        limit: The most rows returned
+        trigram: Use pg_trgm ranking and typo matching; without it only ILIKE is used
+        **kwargs: Additional filters, as for search_entities
         
     Returns:
-        List of entities that match the search criteria
+        The SQL of the search
     """
     # Define searchable fields based on entity type
     # Only including the five core entities: Supplier, Party, Bank, Register Entry, and Memo Entry
@@ -31,6 +56,20 @@ def search_entities(table_name: str, search_query: str, **kwargs):
     # Create table reference
     entity_table = Table(table_name)
     
+    def text_match(field):
+        """ILIKE on a text field, and for names also the typo-tolerant trigram match."""
+        criterion = field.ilike(f'%{search_query}%')
+        if trigram and field.name == 'name':
+            criterion = criterion | BasicCriterion(TrigramComparator.word_similar, ValueWrapper(search_query), field)
+        return criterion
+
+    def matching_ids(individual_table: str):
+        """Subquery of the ids of suppliers or parties whose name matches the query."""
+        individual = Table(individual_table).as_(f'matched_{individual_table}')
+        return Query.from_(individual).select(individual.id).where(text_match(individual.name))
+
+    rank_terms = []
+    
     # For register_entry and memo_entry, we need to join with supplier and party
     if table_name in ['register_entry', 'memo_entry']:
         supplier_table = Table('supplier')
@@ -56,6 +95,7 @@ def search_entities(table_name: str, search_query: str, **kwargs):
             # Only apply numeric search if the search query is a number
             if search_query.isdigit():
                 criterion = entity_table[field] == int(search_query)
+                rank_terms.append(Case().when(criterion, 1).else_(0))
                 
                 if search_criteria is None:
                     search_criteria = criterion
@@ -77,9 +117,11 @@ def search_entities(table_name: str, search_query: str, **kwargs):
         # Handle supplier_name and party_name fields
         elif field in ['supplier_name', 'party_name'] and table_name in ['register_entry', 'memo_entry']:
             if field == 'supplier_name':
-                criterion = supplier_table.name.ilike(f'%{search_query}%')
+                criterion = entity_table.supplier_id.isin(matching_ids('supplier'))
+                rank_terms.append(word_similarity(search_query, supplier_table.name))
             else:  # party_name
-                criterion = party_table.name.ilike(f'%{search_query}%')
+                criterion = entity_table.party_id.isin(matching_ids('party'))
+                rank_terms.append(word_similarity(search_query, party_table.name))
                 
             if search_criteria is None:
                 search_criteria = criterion
@@ -96,7 +138,8 @@ def search_entities(table_name: str, search_query: str, **kwargs):
                 search_criteria = search_criteria | criterion
         else:
             # For text fields, use ILIKE for case-insensitive search
-            criterion = entity_table[field].ilike(f'%{search_query}%')
+            criterion = text_match(entity_table[field])
+            rank_terms.append(word_similarity(search_query, entity_table[field]))
             if search_criteria is None:
                 search_criteria = criterion
             else:
@@ -174,9 +217,64 @@ def search_entities(table_name: str, search_query: str, **kwargs):
             else:
                 query = query.where(entity_table[key] == value)
     
-    # Get the SQL
-    sql = query.get_sql()
+    # Best matches first; GREATEST skips the NULL similarity of empty fields
+    if trigram and rank_terms:
+        query = query.orderby(Function('GREATEST', *rank_terms), order=Order.desc)
+    query = query.orderby(entity_table.id, order=Order.desc)
+    
+    return query.limit(limit).get_sql()
+
+def parse_search_limit(value) -> int:
+    """
+    Validate the limit a caller asked for: SEARCH_LIMIT if none, clamped to 1..MAX_SEARCH_LIMIT.
+    
+    Raises:
+        DataError: If the limit is not an integer
+    """
+    if value is None or value == '':
+        return SEARCH_LIMIT
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise DataError('limit must be an integer')
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise DataError('limit must be an integer')
+    return min(max(limit, 1), MAX_SEARCH_LIMIT)
+
+def search_entities(table_name: str, search_query: str, **kwargs):
+    """
+    Search for entities in the specified table that match the search query using PyPika.
+    
+    The search is cancelled after SEARCH_TIMEOUT_MS. Databases without the pg_trgm
+    migration are searched with ILIKE alone.
     
-    # Execute the query
-    result = execute_query(sql)
-    return result['result']
+    Args:
+        table_name: The name of the table to search in
+        search_query: The search query string
+        **kwargs: Additional filters to apply. Special parameters:
+            - field_filters: List of field filters with entityType, field, operator, and value
+            - limit: The most rows returned, SEARCH_LIMIT by default
+        
+    Returns:
+        List of entities that match the search criteria, best match first
+    """
+    limit = parse_search_limit(kwargs.pop('limit', None))
+    try:
+        return _run_search(build_search_query(table_name, search_query, limit, **kwargs))
+    except DataError as e:
+        message = str(e.dict().get('message', ''))
+        if 'word_similarity' not in message and 'operator does not exist' not in message:
+            raise
+        print("pg_trgm is not installed, searching without it")
+        return _run_search(build_search_query(table_name, search_query, limit, trigram=False, **kwargs))
+
+def _run_search(sql: str) -> list:
+    """Run a search query under the search timeout."""
+    try:
+        with transaction(exec_remote=False) as tx:
+            tx.execute(f"SET LOCAL statement_timeout = {SEARCH_TIMEOUT_MS}")
+            return tx.execute(sql)['result']
+    except DataError as e:
+        if 'statement timeout' in str(e.dict().get('message', '')):
+            raise DataError({'status': 'error', 'message': 'Search took too long, please use a more specific search'})
+        raise
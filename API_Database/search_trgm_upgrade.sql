@@ -0,0 +1,22 @@
+-- Trigram indexes for /search (search_entities.py).
+-- ILIKE '%q%' and pg_trgm's word similarity operator (<%) can use these GIN indexes; B-tree indexes cannot.
+-- CREATE INDEX CONCURRENTLY cannot run in a transaction block, so apply this file with psql -f.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_name_trgm_idx ON supplier USING GIN (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_address_trgm_idx ON supplier USING GIN (address gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_phone_number_trgm_idx ON supplier USING GIN (phone_number gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS party_name_trgm_idx ON party USING GIN (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS party_address_trgm_idx ON party USING GIN (address gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS party_phone_number_trgm_idx ON party USING GIN (phone_number gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bank_name_trgm_idx ON bank USING GIN (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bank_address_trgm_idx ON bank USING GIN (address gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bank_phone_number_trgm_idx ON bank USING GIN (phone_number gin_trgm_ops);
+
+-- Entries matching a supplier or party found by name are looked up by id
+-- (register_entry's unique key already leads with supplier_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS register_entry_party_id_idx ON register_entry (party_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS memo_entry_supplier_id_idx ON memo_entry (supplier_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS memo_entry_party_id_idx ON memo_entry (party_id);
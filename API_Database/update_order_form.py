@@ -1,4 +1,6 @@
 from __future__ import annotations
+from typing import Callable, Dict, Tuple
+from datetime import datetime
 from psql import execute_query
 from pypika import Query, Table, functions as fn
 
@@ -14,12 +16,46 @@ def update_order_form_by_id(entry, entry_id: int):
     query = "UPDATE order_form SET supplier_id= {}, party_id= {}, order_form_number = {}, register_date = '{}', status = '{}', delivered= {} WHERE id = {}".format(entry.supplier_id, entry.party_id, entry.order_form_number, str(entry.register_date), entry.status, entry.delivered, entry_id)
     return execute_query(query)
 
-def mark_order_forms_as_registered(supplier_id: int=None, party_id: int=None):
-    """Marks order forms as registered based on specific criteria; returns the update status."""
+def mark_order_forms_as_registered(supplier_id: int=None, party_id: int=None, execute: Callable=execute_query):
+    """
+    Marks order forms as registered based on specific criteria; returns the update status.
+    Scans the whole register history of the pair, so it is meant for reconciliation.
+    New bills should use mark_order_forms_delivered instead.
+    """
     order_form = Table('order_form')
     register_entry = Table('register_entry')
     sub_query = Query.from_(order_form).join(register_entry).on((order_form.supplier_id == register_entry.supplier_id) & (order_form.party_id == register_entry.party_id)).where((order_form.delivered == False) & (register_entry.register_date > order_form.register_date)).select(order_form.id)
     if supplier_id and party_id:
         sub_query = sub_query.where((order_form.supplier_id == supplier_id) & (order_form.party_id == party_id))
     sql = order_form.update().set(order_form.delivered, True).where(order_form.id.isin(sub_query))
-    return execute_query(sql.get_sql())
\ No newline at end of file
+    return execute(sql.get_sql())
+
+def mark_order_forms_delivered(supplier_id: int, party_id: int, register_date: str | datetime, execute: Callable=execute_query):
+    """
+    Marks the undelivered order forms of a supplier and party dated before a new bill as delivered.
+    Only touches the pair's undelivered order forms, which the partial index
+    order_form_undelivered_idx serves, so the cost does not grow with register history.
+    """
+    order_form = Table('order_form')
+    sql = order_form.update().set(order_form.delivered, True).where((order_form.supplier_id == supplier_id) & (order_form.party_id == party_id) & (order_form.delivered == False) & (order_form.register_date < str(register_date)))
+    return execute(sql.get_sql())
+
+def mark_order_forms_delivered_bulk(latest_bills: Dict[Tuple[int, int], str | datetime], execute: Callable=execute_query):
+    """
+    Bulk variant of mark_order_forms_delivered for imports.
+
+    Args:
+        latest_bills: (supplier_id, party_id) -> date of the latest new bill for that pair
+    """
+    if not latest_bills:
+        return {'status': 'okay', 'result': []}
+    values = ', '.join(f"({int(supplier_id)}, {int(party_id)}, TIMESTAMP '{register_date}')" for ((supplier_id, party_id), register_date) in sorted(latest_bills.items()))
+    query = f"""
+        UPDATE order_form o SET delivered = true
+        FROM (VALUES {values}) AS b (supplier_id, party_id, register_date)
+        WHERE o.supplier_id = b.supplier_id
+          AND o.party_id = b.party_id
+          AND o.delivered = false
+          AND o.register_date < b.register_date
+    """
+    return execute(query)
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from typing import List, Callable
 from psql import execute_query
 from pypika import Query, Table
 
@@ -24,6 +25,29 @@ def update_part_payment(supplier_id: int,
 
     return execute_query(update_query.get_sql())
 
+def update_part_payments(supplier_id: int,
+                         party_id: int,
+                         memo_ids: List[int],
+                         use_memo_id: int = None,
+                         used: bool = True,
+                         execute: Callable = execute_query) -> None:
+    """
+    Use several partial amounts between a supplier and party with a single UPDATE
+    """
+
+    part_payments = Table('part_payments')
+
+    update_query = (
+        Query.update(part_payments)
+        .set(part_payments.used, used)
+        .set(part_payments.use_memo_id, None if use_memo_id is None else use_memo_id)
+        .where(part_payments.supplier_id == supplier_id)
+        .where(part_payments.party_id == party_id)
+        .where(part_payments.memo_id.isin(memo_ids))
+    )
+
+    return execute(update_query.get_sql())
+
 
 
 
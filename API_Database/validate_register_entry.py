@@ -0,0 +1,106 @@
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+from psql import execute_query
+from API_Database.utils import parse_date
+
+# Bills reusing a bill number for the same supplier and party must be this many months apart
+MIN_MONTHS_APART = 6
+
+def months_between(first: datetime, second: datetime) -> int:
+    """
+    Returns the whole months between two dates, the same value as Postgres'
+    ABS(EXTRACT(year FROM AGE(a, b)) * 12 + EXTRACT(month FROM AGE(a, b))).
+    """
+    (earlier, later) = sorted((first, second))
+    months = (later.year - earlier.year) * 12 + (later.month - earlier.month)
+    if (later.day, later.time()) < (earlier.day, earlier.time()):
+        months -= 1
+    return months
+
+def existing_bills_query(candidates: str) -> str:
+    """
+    Builds the single query returning every existing bill that shares a supplier, party
+    and bill number with a candidate. Served by the unique index on
+    register_entry (supplier_id, party_id, bill_number, register_date).
+
+    Args:
+        candidates: A relation with supplier_id, party_id and bill_number columns,
+            e.g. a staging table or a VALUES list
+    """
+    return f"""
+        SELECT DISTINCT r.supplier_id, r.party_id, r.bill_number, r.register_date
+        FROM register_entry r
+        JOIN {candidates} c
+          ON r.supplier_id = c.supplier_id
+         AND r.party_id = c.party_id
+         AND r.bill_number = c.bill_number
+    """
+
+def get_existing_bills(entries: List, execute: Callable = execute_query) -> List[Dict]:
+    """Fetches the existing bills sharing a bill number with any of the entries in one round trip."""
+    if not entries:
+        return []
+    keys = sorted({(int(entry.supplier_id), int(entry.party_id), int(entry.bill_number)) for entry in entries})
+    values = ', '.join(f'({supplier_id}, {party_id}, {bill_number})' for (supplier_id, party_id, bill_number) in keys)
+    candidates = f'(VALUES {values}) AS c (supplier_id, party_id, bill_number)'
+    return execute(existing_bills_query(candidates))['result']
+
+def find_register_conflicts(entries: List[Tuple[int, object]], existing: List[Dict]) -> Dict[int, Dict]:
+    """
+    Checks candidate bills against the existing bills and against each other.
+
+    Rules:
+    1. No exact duplicate (same bill number, supplier, party, and date)
+    2. If bill number exists for same supplier and party, dates must be at least 6 months apart
+    A candidate that passes is checked against the later candidates, so a batch cannot clash with itself.
+
+    Args:
+        entries: (row index, RegisterEntry) pairs, in the order they would be inserted
+        existing: Rows from get_existing_bills or existing_bills_query
+
+    Returns:
+        Dict: row index -> conflict with bill_number, existing_date and exact_duplicate
+    """
+    dates_by_key = defaultdict(list)
+    for row in existing:
+        key = (int(row['supplier_id']), int(row['party_id']), int(row['bill_number']))
+        dates_by_key[key].append(parse_date(row['register_date']))
+
+    conflicts = {}
+    for (index, entry) in entries:
+        key = (int(entry.supplier_id), int(entry.party_id), int(entry.bill_number))
+        new_date = parse_date(entry.register_date)
+        known_dates = dates_by_key[key]
+        conflict = None
+        if new_date in known_dates:
+            conflict = {'bill_number': entry.bill_number, 'existing_date': new_date, 'exact_duplicate': True}
+        else:
+            for existing_date in sorted(known_dates):
+                if months_between(new_date, existing_date) < MIN_MONTHS_APART:
+                    conflict = {'bill_number': entry.bill_number, 'existing_date': existing_date, 'exact_duplicate': False}
+                    break
+        if conflict:
+            conflicts[index] = conflict
+        else:
+            known_dates.append(new_date)
+    return conflicts
+
+def conflict_error(conflict: Dict) -> Dict:
+    """Formats a conflict from find_register_conflicts as an input error."""
+    if conflict['exact_duplicate']:
+        return {'status': 'error', 'message': 'Duplicate Bill Number', 'input_errors': {'bill_number': {'status': 'error', 'message': 'Bill number already exists'}}}
+    message = f"Bill number {conflict['bill_number']} already exists with date {conflict['existing_date']}. Duplicate bill numbers must be at least {MIN_MONTHS_APART} months apart."
+    return {'status': 'error', 'message': 'Duplicate Bill Number too close in time', 'input_errors': {'bill_number': {'status': 'error', 'message': message}}}
+
+def validate_register_entries(entries: List, execute: Callable = execute_query) -> Dict[int, Dict]:
+    """
+    Validates many candidate bills with a single query.
+
+    Returns:
+        Dict: position in entries -> input error, for every entry that may not be inserted
+    """
+    existing = get_existing_bills(entries, execute=execute)
+    conflicts = find_register_conflicts(list(enumerate(entries)), existing)
+    return {index: conflict_error(conflict) for (index, conflict) in conflicts.items()}
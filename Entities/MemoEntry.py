@@ -13,6 +13,7 @@ from .MemoBill import MemoBill
 from API_Database import insert_memo_entry
 from API_Database import retrieve_memo_entry, get_memo_entry, get_memo_entry_id, get_memo_bills_by_id
 from API_Database import get_next_available_memo_number
+from API_Database import reserve_memo_number, release_memo_number
 from API_Database import update_part_payment
 from API_Database import parse_date, sql_date, delete_memo_payments
 from Exceptions import DataError
@@ -174,6 +175,20 @@ class MemoEntry(Entry):
         """
         return get_next_available_memo_number()
 
+    @staticmethod
+    def reserve_memo_number() -> Dict:
+        """
+        Reserve the next memo number for the data-entry screen
+        """
+        return reserve_memo_number()
+
+    @staticmethod
+    def release_memo_number(memo_number: int) -> Dict:
+        """
+        Release a reserved memo number that was not used
+        """
+        return release_memo_number(memo_number)
+
     @staticmethod
     def get_json(supplier_id: int, party_id: int, memo_number: int) -> Dict:
         """
@@ -270,12 +285,11 @@ class MemoEntry(Entry):
         memo = cls.from_dict(data)
         memo.generate_memo_bills_and_update_status()
         ret = insert_memo_entry.insert_memo_entry(memo)
+        # The memo id comes straight from the INSERT's RETURNING clause
+        if ret['status'] == 'okay':
+            memo.id = ret['id']
         if get_cls:
             if get_cls and ret['status'] == 'okay':
                 ret['class'] = memo
-        # Add the memo id to the ret
-        if ret['status'] == 'okay':
-            memo_id = MemoEntry.get_memo_entry_id(memo.supplier_id, memo.party_id, memo.memo_number)
-            ret['id'] = memo_id
 
         return ret
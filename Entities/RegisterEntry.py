@@ -5,11 +5,13 @@ the bill for an order is received.
 
 """
 from __future__ import annotations
+import time
 from datetime import datetime
 from typing import List, Dict, Union
 from API_Database import insert_register_entry, update_register_entry, utils, get_register_entry_by_id
 from API_Database import get_register_entry_id, get_register_entry
-from API_Database import get_pending_bills, mark_order_forms_as_registered
+from API_Database import get_pending_bills, mark_order_forms_delivered
+from API_Database import bulk_register_entry
 from Exceptions import DataError
 from Entities import Entry
 from OCR import parse_register_entry
@@ -149,9 +151,36 @@ class RegisterEntry(Entry):
         if insert_register_entry.check_new_register(register_entry):
             ret = insert_register_entry.insert_register_entry(register_entry)
             if ret['status'] == 'okay':
-                mark_order_forms_as_registered(register_entry.supplier_id, register_entry.party_id)
+                mark_order_forms_delivered(register_entry.supplier_id, register_entry.party_id, register_entry.register_date)
             if get_cls and ret['status'] == 'okay':
                 ret['class'] = register_entry
             return ret
         else:
-            raise DataError({'status': 'error', 'message': 'Duplicate Bill Number', 'input_errors': {'bill_number': {'status': 'error', 'message': 'Bill number already exists'}}})
\ No newline at end of file
+            raise DataError({'status': 'error', 'message': 'Duplicate Bill Number', 'input_errors': {'bill_number': {'status': 'error', 'message': 'Bill number already exists'}}})
+
+    @classmethod
+    def bulk_insert(cls, rows: List[Dict]) -> Dict:
+        """
+        Validates and inserts a batch of register entries at once.
+        Invalid rows are skipped and reported by their position in rows; the rest are inserted together.
+        Returns the insertion status, per-row errors and the import throughput.
+        """
+        start = time.perf_counter()
+        entries = []
+        errors = []
+        for (index, data) in enumerate(rows):
+            try:
+                entries.append((index, cls.from_dict(dict(data))))
+            except DataError as e:
+                errors.append({'row': index, 'input_errors': {}, **e.dict()})
+            except Exception as e:
+                errors.append({'row': index, 'status': 'error', 'message': f'Invalid register entry: {e}', 'input_errors': {}})
+        ret = {'status': 'okay', 'ids': [], 'inserted': 0, 'errors': []}
+        if entries:
+            ret = bulk_register_entry.bulk_insert_register_entries(entries)
+        ret['errors'] = sorted(errors + ret['errors'], key=lambda error: error['row'])
+        elapsed = time.perf_counter() - start
+        ret['total'] = len(rows)
+        ret['elapsed_seconds'] = round(elapsed, 4)
+        ret['rows_per_second'] = round(len(rows) / elapsed, 1) if elapsed > 0 else None
+        return ret
\ No newline at end of file
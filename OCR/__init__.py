@@ -1 +1,2 @@
-from .parse_register_entry_v2 import parse_register_entry
\ No newline at end of file
+from .parse_register_entry_v2 import parse_register_entry
+from .parse_register_entry_v2 import get_invoice_parser, get_name_matcher, warmup
@@ -0,0 +1,181 @@
+import fcntl
+import json
+import os
+from typing import Dict, Optional
+
+class AppendLog:
+    """An append-only JSON-lines store for a string-keyed dictionary.
+
+    Each line of the file is a JSON object of upserts; replaying the lines in order
+    rebuilds the dictionary. Writes append one line under an exclusive file lock, so
+    several processes (e.g. gunicorn workers) can share the file, and a crash can at
+    worst leave a torn last line, which is skipped on load. When the log grows well past
+    the live data it is compacted into a single line written to a temporary file and
+    swapped in with os.replace.
+
+    A file in the old format, one JSON object, is read as-is; loading never writes,
+    and the file is rewritten as a log only when the first line is appended.
+    """
+
+    def __init__(self, path: str, compact_ratio: int = 4, compact_min_lines: int = 1000):
+        """Initialize the store.
+
+        Args:
+            path: Path of the log file
+            compact_ratio: Compact once the log has this many lines per live key
+            compact_min_lines: Never compact logs shorter than this
+        """
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min_lines = compact_min_lines
+        self._offset = 0
+        self._inode = None
+        self._lines = 0
+        self._legacy = False
+
+    def load(self) -> Dict[str, str]:
+        """Read the whole file and return the dictionary it holds."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Create the file without truncating one another process may be writing
+        with open(self.path, 'a'):
+            pass
+        data = {}
+        self._offset = 0
+        self._lines = 0
+        self._legacy = False
+        with open(self.path, 'rb') as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            first = f.readline()
+            if first.strip() == b'{' or (first and not first.endswith(b'\n')):
+                # Legacy format: the whole file is one JSON object, indented or without a trailing newline
+                f.seek(0)
+                try:
+                    data.update(json.loads(f.read()))
+                except json.JSONDecodeError:
+                    pass
+                self._offset = f.tell()
+                self._lines = 1
+                self._legacy = True
+            else:
+                f.seek(0)
+                self._read_lines(f, data)
+        return data
+
+    def refresh(self, data: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Apply lines appended by other writers since the last read.
+
+        Costs a single stat when nothing changed. If another process compacted the
+        file, the dictionary is reloaded from scratch.
+
+        Args:
+            data: The dictionary returned by load, updated in place
+
+        Returns:
+            The upserts read, or None if the dictionary was reloaded
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        if stat.st_ino != self._inode:
+            fresh = self.load()
+            data.clear()
+            data.update(fresh)
+            return None
+        if stat.st_size <= self._offset:
+            return {}
+        changes = {}
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            self._read_lines(f, changes)
+        data.update(changes)
+        return changes
+
+    def _read_lines(self, f, data: Dict[str, str]):
+        """Apply every complete line from the current position to data."""
+        for line in f:
+            if not line.endswith(b'\n'):
+                # A line still being written, or torn by a crash; read it once it is complete
+                break
+            self._offset += len(line)
+            self._lines += 1
+            try:
+                upserts = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(upserts, dict):
+                data.update(upserts)
+
+    def _open_locked(self):
+        """Open the current file for appending with an exclusive lock, following compactions."""
+        while True:
+            f = open(self.path, 'ab')
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            # The file was replaced by a compaction while waiting for the lock
+            f.close()
+
+    def append(self, data: Dict[str, str], upserts: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Durably append upserts and apply them to the in-memory dictionary.
+
+        Lines appended by other writers are applied first, so data stays in step with the file.
+
+        Args:
+            data: The dictionary returned by load, updated in place
+            upserts: The keys to write
+
+        Returns:
+            Every upsert applied to data, or None if data was reloaded, as for refresh
+        """
+        line = (json.dumps(upserts, separators=(',', ':')) + '\n').encode()
+        if self._legacy:
+            # Convert the legacy file first so the line never lands after an unterminated object
+            self.compact(data)
+        with self._open_locked() as f:
+            changes = self.refresh(data)
+            size = os.fstat(f.fileno()).st_size
+            if size > self._offset:
+                # A torn line left by a crash; terminate it so this line stays readable
+                line = b'\n' + line
+                self._offset = size
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self._offset += len(line)
+            self._lines += 1
+            data.update(upserts)
+            if self._lines >= max(self.compact_min_lines, self.compact_ratio * len(data)):
+                self._compact(data)
+        if changes is None:
+            return None
+        changes.update(upserts)
+        return changes
+
+    def _compact(self, data: Dict[str, str]):
+        """Rewrite the file as a single line. Must be called while holding the append lock."""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as tmp:
+            tmp.write((json.dumps(data, separators=(',', ':')) + '\n').encode())
+            tmp.flush()
+            os.fsync(tmp.fileno())
+            size = tmp.tell()
+            inode = os.fstat(tmp.fileno()).st_ino
+        os.replace(tmp_path, self.path)
+        self._inode = inode
+        self._offset = size
+        self._lines = 1
+        self._legacy = False
+
+    def compact(self, data: Dict[str, str]):
+        """Rewrite the file as a single line holding data.
+
+        Args:
+            data: The dictionary returned by load, updated in place with any unread lines first
+        """
+        with self._open_locked():
+            self.refresh(data)
+            self._compact(data)
@@ -0,0 +1,94 @@
+import os
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+from .parse_register_entry_v2 import get_invoice_parser, get_name_matcher, get_result_cache, cached_ocr, set_matched_name
+from .result_cache import image_hash
+
+# Largest number of images accepted in one batch
+MAX_BATCH_IMAGES = 50
+
+def default_concurrency() -> int:
+    """Number of images processed at once, from OCR_BATCH_CONCURRENCY (default 4)."""
+    return max(1, int(os.environ.get('OCR_BATCH_CONCURRENCY', '4')))
+
+def process_image(encoded_image: str, parser, matcher, stage_pool: ThreadPoolExecutor) -> dict:
+    """Run the OCR pipeline for one image.
+
+    The invoice is extracted first; bill number normalization and the supplier and
+    party name matching only depend on that result, so they run concurrently on the
+    stage pool.
+    """
+    result = parser.parse_invoice(encoded_image, process_bill_number=False)
+    stages = {}
+    if result.get('bill_number'):
+        stages['bill_number'] = stage_pool.submit(parser.process_bill_number, result['bill_number'], result.get('supplier_name', ''))
+    if result.get('supplier_name'):
+        stages['supplier_name_matched'] = stage_pool.submit(matcher.find_match, result['supplier_name'], 'supplier')
+    if result.get('party_name'):
+        stages['party_name_matched'] = stage_pool.submit(matcher.find_match, result['party_name'], 'party')
+    for (field, stage) in stages.items():
+        if field == 'bill_number':
+            result[field] = stage.result()
+        else:
+            set_matched_name(result, field[:-len('_name_matched')], stage.result())
+    return result
+
+def process_batch(images: List[str], queue=None, parser=None, matcher=None, concurrency: Optional[int] = None, cache=None, image_paths: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Process many invoice images concurrently, yielding each result as soon as it is ready.
+
+    LLM calls go through the shared rate limit of the parser and matcher, and images
+    seen before are answered from the OCR result cache. Successful results are added
+    to the queue with a single write once every image is done.
+
+    Args:
+        images: Base64 encoded JPEG images
+        queue: OCRQueue to add the results to, or None to skip queueing
+        parser: InvoiceParser to use instead of the shared one
+        matcher: NameMatcher to use instead of the shared one
+        concurrency: Number of images processed at once
+        cache: OCRResultCache to use instead of the shared one
+        image_paths: The same images as files staged by the queue, moved into it instead of decoding images
+
+    Yields:
+        One dictionary per image with its index and result or error, in completion
+        order, then a summary with status 'done' and the queue entry id of each index
+    """
+    start = time.perf_counter()
+    parser = parser or get_invoice_parser()
+    matcher = matcher or get_name_matcher()
+    concurrency = concurrency or default_concurrency()
+    cache = cache or get_result_cache()
+    results = {}
+    failed = 0
+    # Each image fans out to at most three stages, so the stage pool never starves the image pool
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ocr-image') as image_pool, \
+            ThreadPoolExecutor(max_workers=3 * concurrency, thread_name_prefix='ocr-stage') as stage_pool:
+        futures = {image_pool.submit(cached_ocr, image, partial(process_image, image, parser, matcher, stage_pool), cache): index for (index, image) in enumerate(images)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+                yield {'index': index, 'status': 'okay', 'result': results[index]}
+            except Exception as e:
+                failed += 1
+                yield {'index': index, 'status': 'error', 'message': f'Error processing invoice: {str(e)}'}
+
+    queue_entry_ids = {}
+    if queue is not None and results:
+        hashes = {index: image_hash(images[index]) for index in results}
+        queue.add_entries([{'image_path': image_paths[index], 'image_hash': hashes[index], 'ocr_data': results[index]} if image_paths
+                           else {'image': images[index], 'ocr_data': results[index]} for index in sorted(results)])
+        # Duplicates of pending images share the pending entry, so look every image up by its hash
+        pending = queue.pending_by_hash(hashes.values())
+        queue_entry_ids = {index: pending[hashes[index]] for index in sorted(results) if hashes[index] in pending}
+    yield {
+        'status': 'done',
+        'total': len(images),
+        'succeeded': len(results),
+        'failed': failed,
+        'queue_entry_ids': queue_entry_ids,
+        'elapsed_seconds': round(time.perf_counter() - start, 3)
+    }
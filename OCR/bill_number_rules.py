@@ -0,0 +1,194 @@
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from .name_cache import normalize_name
+
+# Confirmations a rule needs, without any contradiction, before it replaces the LLM
+MIN_CONFIRMATIONS = 2
+
+def learn_pattern(raw_bill_number: str, bill_number: str) -> Optional[str]:
+    """Derive a template from a raw bill number and its confirmed core number.
+
+    The digit run holding the confirmed number becomes the captured group, other digit
+    runs (years, branch codes) match any digits, and everything else must match
+    literally, e.g. 'RF/123/23-24' confirmed as '123' gives '^RF/(\\d+)/\\d+\\-\\d+$'.
+
+    Returns:
+        The regex, or None if the confirmed number is not a digit run of the raw one
+    """
+    if not bill_number or not bill_number.isdigit():
+        return None
+    tokens = re.findall(r'\d+|\D+', raw_bill_number.strip())
+    target = int(bill_number)
+    # Prefer the last matching run; sequence numbers usually follow the prefix
+    matches = [i for (i, token) in enumerate(tokens) if token.isdigit() and int(token) == target]
+    if not matches:
+        return None
+    parts = []
+    for (i, token) in enumerate(tokens):
+        if i == matches[-1]:
+            parts.append(r'(\d+)')
+        elif token.isdigit():
+            parts.append(r'\d+')
+        else:
+            parts.append(re.escape(token.upper()))
+    return '^' + ''.join(parts) + '$'
+
+class BillNumberRules:
+    """Per-supplier templates for extracting the core number from a bill number.
+
+    Rules are learned from OCR results an operator confirmed. Once a supplier's template
+    has been confirmed MIN_CONFIRMATIONS times and never contradicted, apply answers
+    bill numbers in that format without an LLM call. Rules are kept in a small JSON file
+    that is re-read when another process changes it; writers take an exclusive lock on a
+    '.lock' file next to it, so concurrent workers never lose each other's updates.
+    """
+
+    def __init__(self, path: str = "data/bill_number_rules.json", min_confirmations: int = MIN_CONFIRMATIONS):
+        """Initialize the rules.
+
+        Args:
+            path: JSON file holding the rules
+            min_confirmations: Confirmations needed before a rule is used
+        """
+        self.path = path
+        self.min_confirmations = min_confirmations
+        self.llm_calls_avoided = 0
+        self.rule_misses = 0
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.rules: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._load()
+
+    def _load(self, force: bool = False):
+        """Read the rules file if it changed since it was last read, or always if forced."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime and not force:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.rules = json.load(f)
+            self._mtime = mtime
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error loading bill number rules: {str(e)}")
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold the exclusive lock every process takes to change the rules file."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _save(self):
+        """Write the rules atomically."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.rules, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def apply(self, supplier_name: str, raw_bill_number: str) -> Optional[str]:
+        """Extract the core number with the supplier's confident rule.
+
+        Returns:
+            The core number, or None if no confident rule matches and the LLM is needed
+        """
+        key = normalize_name(supplier_name or '')
+        raw = raw_bill_number.strip().upper()
+        with self._lock:
+            self._load()
+            candidates = sorted(self.rules.get(key, {}).items(), key=lambda item: -item[1]['confirmations'])
+            for (pattern, counts) in candidates:
+                if counts['contradictions'] or counts['confirmations'] < self.min_confirmations:
+                    continue
+                match = re.match(pattern, raw)
+                if match:
+                    self.llm_calls_avoided += 1
+                    return str(int(match.group(1)))
+            self.rule_misses += 1
+            return None
+
+    def learn(self, supplier_names: List[str], raw_bill_number: str, bill_number: str):
+        """Record a confirmed bill number for the suppliers it was seen under.
+
+        Every existing rule of the supplier that matches the raw bill number but would
+        have extracted a different number is marked as contradicted and no longer used.
+
+        Args:
+            supplier_names: Names the supplier appeared as, e.g. the OCR and matched names
+            raw_bill_number: The bill number as read from the invoice
+            bill_number: The core number the operator confirmed
+        """
+        if not raw_bill_number or not bill_number:
+            return
+        raw = raw_bill_number.strip().upper()
+        bill_number = str(bill_number).strip()
+        if raw.isdigit():
+            # Numeric bill numbers never reach the LLM, so there is nothing to learn
+            return
+        pattern = learn_pattern(raw, bill_number)
+        with self._lock, self._file_lock():
+            # Another worker may have written within the same mtime tick
+            self._load(force=True)
+            for key in {normalize_name(name) for name in supplier_names if name}:
+                supplier_rules = self.rules.setdefault(key, {})
+                for (existing, counts) in supplier_rules.items():
+                    match = re.match(existing, raw)
+                    if match and match.group(1).lstrip('0') != bill_number.lstrip('0'):
+                        counts['contradictions'] += 1
+                if pattern:
+                    counts = supplier_rules.setdefault(pattern, {'confirmations': 0, 'contradictions': 0})
+                    counts['confirmations'] += 1
+            self._save()
+
+    def learn_from_ocr(self, ocr_data: Dict, bill_number: Optional[str] = None, supplier_name: Optional[str] = None):
+        """Learn from a completed OCR result.
+
+        Nothing is learned without a bill number from the operator: the OCR result's own
+        bill_number is the LLM's guess, and learning it would confirm the model with itself.
+
+        Args:
+            ocr_data: The OCR result of the queue entry
+            bill_number: The bill number the operator saved
+            supplier_name: The supplier the operator saved; defaults to the matched supplier
+        """
+        if not bill_number:
+            return
+        names = [ocr_data.get('supplier_name'), supplier_name or ocr_data.get('supplier_name_matched')]
+        self.learn(names, ocr_data.get('raw_bill_number') or '', bill_number)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get rule statistics, including how many LLM calls the rules saved."""
+        with self._lock:
+            confident = sum(1 for supplier_rules in self.rules.values() for counts in supplier_rules.values()
+                            if not counts['contradictions'] and counts['confirmations'] >= self.min_confirmations)
+            return {
+                "suppliers": len(self.rules),
+                "confident_rules": confident,
+                "llm_calls_avoided": self.llm_calls_avoided,
+                "rule_misses": self.rule_misses
+            }
+
+_bill_number_rules = None
+_bill_number_rules_lock = threading.Lock()
+
+def get_bill_number_rules() -> BillNumberRules:
+    """Return the process-wide bill number rules."""
+    global _bill_number_rules
+    with _bill_number_rules_lock:
+        if _bill_number_rules is None:
+            _bill_number_rules = BillNumberRules()
+        return _bill_number_rules
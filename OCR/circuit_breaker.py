@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+class LLMUnavailableError(Exception):
+    """The LLM could not answer in time; callers should degrade rather than retry."""
+
+class CircuitOpenError(LLMUnavailableError):
+    """The call was refused because the circuit breaker is open."""
+
+class LLMTimeoutError(LLMUnavailableError):
+    """The call did not finish before its deadline."""
+
+class LLMBusyError(LLMUnavailableError):
+    """Every LLM worker is still busy, e.g. with calls that outlived their deadline."""
+
+class CircuitBreaker:
+    """Stops calling the LLM while it keeps failing or answering slowly.
+
+    The outcome of the last window calls is kept; a call that raised, timed out or took
+    longer than slow_call_seconds is bad. Once at least min_calls are recorded and the
+    share of bad ones reaches failure_ratio the breaker opens and refuses calls for
+    cooldown_seconds. It then half-opens and lets one trial call through: a good trial
+    closes it, a bad one opens it again.
+
+    Every change of state starts a new generation, and allow hands each admitted call
+    the generation it was admitted in. Only outcomes of the current generation move the
+    breaker, so a late answer to a call started before the breaker opened can neither
+    stand in for the trial nor count against the window after it closed.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_ratio: float = 0.5, window: int = 20, min_calls: int = 5, slow_call_seconds: float = 20.0, cooldown_seconds: float = 30.0):
+        """Initialize the breaker closed.
+
+        Args:
+            failure_ratio: Share of bad calls in the window that opens the breaker
+            window: Number of recent calls considered
+            min_calls: Calls needed in the window before the breaker may open
+            slow_call_seconds: Duration above which a successful call still counts as bad
+            cooldown_seconds: How long the breaker stays open before a trial call
+        """
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.fallbacks: Dict[str, int] = {}
+
+    def allow(self) -> Optional[int]:
+        """Admit a call if the breaker lets one through now; a refused call is counted as rejected.
+
+        Returns:
+            The generation the call was admitted in, to pass back with its outcome, or None if refused
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._trial_running):
+                self._trial_running = self.state == self.HALF_OPEN
+                self.calls += 1
+                return self._generation
+            self.rejected += 1
+            return None
+
+    def _set_state(self, state: str):
+        """Move to a state, starting a new generation; the caller holds the lock."""
+        self.state = state
+        self._generation += 1
+
+    def _record(self, bad: bool, generation: int):
+        """Add an outcome and open or close the breaker accordingly; the caller holds the lock."""
+        if generation != self._generation:
+            # Admitted before the last change of state; only the counters keep it
+            return
+        if self.state == self.HALF_OPEN:
+            self._trial_running = False
+            if bad:
+                self._open()
+            else:
+                self._set_state(self.CLOSED)
+                self._outcomes.clear()
+            return
+        self._outcomes.append(bad)
+        if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls and sum(self._outcomes) >= self.failure_ratio * len(self._outcomes):
+            self._open()
+
+    def _open(self):
+        """Open the breaker; the caller holds the lock."""
+        self._set_state(self.OPEN)
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def record_success(self, seconds: float, generation: int):
+        """Record a call that returned, slow if it took longer than slow_call_seconds.
+
+        Args:
+            seconds: How long the call took
+            generation: What allow returned for the call
+        """
+        with self._lock:
+            slow = seconds > self.slow_call_seconds
+            if slow:
+                self.slow_calls += 1
+            self._record(slow, generation)
+
+    def record_failure(self, generation: int, timed_out: bool = False):
+        """Record a call that raised or missed its deadline.
+
+        Args:
+            generation: What allow returned for the call
+            timed_out: Whether the call missed its deadline
+        """
+        with self._lock:
+            self.failures += 1
+            if timed_out:
+                self.timeouts += 1
+            self._record(True, generation)
+
+    def record_fallback(self, stage: str):
+        """Count a stage answered without the LLM, e.g. a fuzzy-only name match."""
+        with self._lock:
+            self.fallbacks[stage] = self.fallbacks.get(stage, 0) + 1
+
+    def get_stats(self) -> Dict:
+        """Get the breaker state and call, failure and fallback counts."""
+        with self._lock:
+            state = self.state
+            if state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                state = self.HALF_OPEN
+            return {
+                "state": state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "slow_calls": self.slow_calls,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "window_bad_calls": sum(self._outcomes),
+                "window_calls": len(self._outcomes),
+                "fallbacks": dict(self.fallbacks)
+            }
+
+class WorkerPool:
+    """Runs LLM calls so a caller can stop waiting at its deadline.
+
+    A call left behind cannot be cancelled once started and keeps its worker until the
+    client's own timeout. Busy workers are counted, and once all are busy new calls are
+    refused instead of queueing behind them, where they would only time out too.
+    """
+
+    def __init__(self, max_workers: int):
+        """Initialize the pool.
+
+        Args:
+            max_workers: Calls that may run at once
+        """
+        self.max_workers = max_workers
+        self.busy = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+        self._lock = threading.Lock()
+
+    def submit(self, function, *args, **kwargs):
+        """Start a call on a free worker.
+
+        Raises:
+            LLMBusyError: Every worker is busy
+        """
+        with self._lock:
+            if self.busy >= self.max_workers:
+                raise LLMBusyError(f"All {self.max_workers} LLM workers are busy")
+            self.busy += 1
+        future = self._executor.submit(function, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        """Free the worker of a finished call, whether or not anyone still waits for it."""
+        with self._lock:
+            self.busy -= 1
+
+_workers = WorkerPool(int(os.environ.get('OCR_LLM_MAX_WORKERS', '16')))
+
+def llm_busy_workers() -> int:
+    """Number of LLM calls still running, including those whose caller gave up."""
+    return _workers.busy
+
+class GuardedLLM:
+    """Wraps a chat model with a per-call deadline and a circuit breaker."""
+
+    def __init__(self, llm, breaker: CircuitBreaker, timeout_seconds: float, workers: Optional[WorkerPool] = None):
+        """Initialize the wrapper.
+
+        Args:
+            llm: The chat model to call
+            breaker: Breaker shared by every model calling the same API
+            timeout_seconds: Deadline of calls that do not pass their own
+            workers: Pool running the calls; defaults to the process-wide one
+        """
+        self.llm = llm
+        self.breaker = breaker
+        self.timeout_seconds = timeout_seconds
+        self.workers = workers or _workers
+
+    def invoke(self, messages, *args, timeout: Optional[float] = None, **kwargs):
+        """Invoke the model, giving up at the deadline.
+
+        Args:
+            messages: The rendered messages
+            timeout: Seconds the calling stage can wait; defaults to timeout_seconds
+
+        Raises:
+            CircuitOpenError: The breaker is open
+            LLMBusyError: Every worker is still busy
+            LLMTimeoutError: The model did not answer before the deadline
+        """
+        generation = self.breaker.allow()
+        if generation is None:
+            raise CircuitOpenError("LLM circuit breaker is open")
+        start = time.perf_counter()
+        try:
+            future = self.workers.submit(self.llm.invoke, messages, *args, **kwargs)
+        except LLMBusyError:
+            # Workers are only left busy by calls that outlived their deadline
+            self.breaker.record_failure(generation)
+            raise
+        try:
+            response = future.result(timeout=timeout or self.timeout_seconds)
+        except FutureTimeoutError:
+            # The call keeps its worker until the client's timeout; the pool counts it as busy
+            self.breaker.record_failure(generation, timed_out=True)
+            raise LLMTimeoutError(f"LLM did not answer within {timeout or self.timeout_seconds} seconds")
+        except Exception:
+            self.breaker.record_failure(generation)
+            raise
+        self.breaker.record_success(time.perf_counter() - start, generation)
+        return response
+
+    def __getattr__(self, name):
+        """Expose the wrapped model's other attributes."""
+        return getattr(self.llm, name)
+
+_circuit_breaker = None
+_circuit_breaker_lock = threading.Lock()
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Return the process-wide breaker for LLM calls.
+
+    OCR_LLM_FAILURE_RATIO (default 0.5) of bad calls among the last OCR_LLM_BREAKER_WINDOW
+    (default 20), with at least OCR_LLM_BREAKER_MIN_CALLS (default 5), opens it; calls
+    slower than OCR_LLM_SLOW_SECONDS (default 20) count as bad, and it stays open for
+    OCR_LLM_COOLDOWN_SECONDS (default 30).
+    """
+    global _circuit_breaker
+    with _circuit_breaker_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker(
+                failure_ratio=float(os.environ.get('OCR_LLM_FAILURE_RATIO', '0.5')),
+                window=int(os.environ.get('OCR_LLM_BREAKER_WINDOW', '20')),
+                min_calls=int(os.environ.get('OCR_LLM_BREAKER_MIN_CALLS', '5')),
+                slow_call_seconds=float(os.environ.get('OCR_LLM_SLOW_SECONDS', '20')),
+                cooldown_seconds=float(os.environ.get('OCR_LLM_COOLDOWN_SECONDS', '30'))
+            )
+        return _circuit_breaker
+
+def llm_timeout_seconds() -> float:
+    """The client timeout of every LLM request, from OCR_LLM_TIMEOUT_SECONDS (default 60)."""
+    return float(os.environ.get('OCR_LLM_TIMEOUT_SECONDS', '60'))
+
+def llm_max_retries() -> int:
+    """Retries of a failed LLM request inside its deadline, from OCR_LLM_MAX_RETRIES (default 1)."""
+    return int(os.environ.get('OCR_LLM_MAX_RETRIES', '1'))
+
+def guarded(llm) -> GuardedLLM:
+    """Wrap a chat model with the process-wide circuit breaker and the default deadline."""
+    if isinstance(llm, GuardedLLM):
+        return llm
+    return GuardedLLM(llm, get_circuit_breaker(), llm_timeout_seconds())
@@ -0,0 +1,86 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+from rapidfuzz import process, distance
+
+# rapidfuzz's default Jaro-Winkler prefix weight and the longest prefix it rewards
+PREFIX_WEIGHT = 0.1
+MAX_PREFIX = 4
+
+class FuzzyIndex:
+    """An index of pre-normalized names answering best-match lookups with vectorized rapidfuzz calls.
+
+    Keys are stored once, already normalized, and grouped by length. A Jaro-Winkler score
+    above the threshold is only reachable between keys of similar length, so a lookup
+    scores just the length buckets that can clear it, one process.extractOne call per bucket.
+    """
+
+    def __init__(self, keys: Optional[List[str]] = None):
+        """Initialize the index.
+
+        Args:
+            keys: Pre-normalized keys to index, in insertion order
+        """
+        self._buckets: Dict[int, List[str]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        for key in keys or []:
+            self.add(key)
+
+    def __len__(self) -> int:
+        """Return the number of indexed keys."""
+        return len(self._positions)
+
+    def __contains__(self, key: str) -> bool:
+        """Return whether the key is indexed."""
+        return key in self._positions
+
+    def add(self, key: str):
+        """Add a pre-normalized key to the index; adding a known key is a no-op.
+
+        Args:
+            key: The normalized key
+        """
+        if not key or key in self._positions:
+            return
+        self._positions[key] = len(self._positions)
+        length = len(key)
+        if length not in self._buckets:
+            self._buckets[length] = []
+            self._lengths.insert(bisect_left(self._lengths, length), length)
+        self._buckets[length].append(key)
+
+    @staticmethod
+    def _min_length_ratio(threshold: float) -> float:
+        """Return the smallest shorter/longer length ratio that can still score above the threshold.
+
+        Jaro-Winkler adds at most MAX_PREFIX * PREFIX_WEIGHT * (1 - jaro) to the Jaro score, and
+        Jaro is at most (2 + shorter / longer) / 3, so lower ratios cannot reach the threshold.
+        """
+        boost = MAX_PREFIX * PREFIX_WEIGHT
+        min_jaro = (threshold - boost) / (1 - boost)
+        return max(0.0, 3 * min_jaro - 2)
+
+    def best_match(self, query: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """Find the indexed key most similar to the query.
+
+        Args:
+            query: The normalized name to look up
+            threshold: Only scores strictly above this are returned
+
+        Returns:
+            (key, score) of the best match, the earliest added key on ties, or None
+        """
+        if not query or not self._positions:
+            return None
+        ratio = self._min_length_ratio(threshold)
+        low = len(query) * ratio
+        high = len(query) / ratio if ratio > 0 else float('inf')
+        best = None
+        for length in self._lengths[bisect_left(self._lengths, low):bisect_right(self._lengths, high)]:
+            match = process.extractOne(query, self._buckets[length], scorer=distance.JaroWinkler.similarity, processor=None, score_cutoff=threshold)
+            if match is None or match[1] <= threshold:
+                continue
+            (key, score, _) = match
+            if best is None or score > best[1] or (score == best[1] and self._positions[key] < self._positions[best[0]]):
+                best = (key, score)
+        return best
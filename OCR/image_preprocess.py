@@ -0,0 +1,117 @@
+import base64
+import io
+import os
+import time
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# Longest side sent to the model; gpt-4o-mini tiles images at 768 px on the short side anyway
+DEFAULT_MAX_SIDE = 1600
+DEFAULT_JPEG_QUALITY = 80
+# Side length of the copy used to find the document outline
+DETECTION_SIDE = 800
+# Ignore outlines covering less than this share of the photo, they are not the bill
+MIN_DOCUMENT_AREA = 0.25
+
+def preprocess_enabled() -> bool:
+    """Whether images are preprocessed before extraction, from OCR_PREPROCESS (default true)."""
+    return os.environ.get('OCR_PREPROCESS', 'true').lower() == 'true'
+
+def _document_box(image: Image.Image) -> Tuple[int, int, int, int]:
+    """Find the bounding box of the bill in a photo, or the whole image if no clear outline is found.
+
+    Returns:
+        (left, top, right, bottom) in image coordinates
+    """
+    (width, height) = image.size
+    scale = min(1.0, DETECTION_SIDE / max(width, height))
+    small = np.asarray(image.convert('L').resize((max(1, int(width * scale)), max(1, int(height * scale)))))
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((5, 5), np.uint8), iterations=2)
+    (contours, _) = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return (0, 0, width, height)
+    (x, y, w, h) = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    if w * h < MIN_DOCUMENT_AREA * small.shape[0] * small.shape[1]:
+        return (0, 0, width, height)
+    # Keep a small margin so text touching the edge of the paper is not clipped
+    pad = int(0.01 * max(small.shape))
+    left = max(0, int((x - pad) / scale))
+    top = max(0, int((y - pad) / scale))
+    right = min(width, int((x + w + pad) / scale))
+    bottom = min(height, int((y + h + pad) / scale))
+    return (left, top, right, bottom)
+
+def preprocess_image(encoded_image: str, max_side: int = DEFAULT_MAX_SIDE, quality: int = DEFAULT_JPEG_QUALITY, crop: bool = True) -> Tuple[str, Dict]:
+    """Prepare an uploaded photo for extraction.
+
+    Stages: decode, auto-orient from EXIF, crop to the document, downsample so the
+    longest side is at most max_side, and re-encode as JPEG. If the image cannot be
+    decoded, or the result would not be smaller, the original is returned unchanged.
+
+    Args:
+        encoded_image: The base64 encoded upload
+        max_side: Longest side of the output in pixels
+        quality: JPEG quality of the output
+        crop: Crop to the outline of the bill
+
+    Returns:
+        (base64 encoded image to send, report with the seconds of each stage and the sizes)
+    """
+    stages = {}
+    report = {'stages': stages}
+    start = time.perf_counter()
+
+    def lap(stage: str):
+        """Record the time since the previous stage."""
+        nonlocal start
+        now = time.perf_counter()
+        stages[stage] = round(now - start, 4)
+        start = now
+
+    try:
+        raw = base64.b64decode(encoded_image)
+        report['input_bytes'] = len(raw)
+        image = Image.open(io.BytesIO(raw))
+        report['input_size'] = image.size
+        # Let the JPEG decoder scale down by a power of two while staying above the target size
+        scale = max_side / max(image.size)
+        if scale < 1:
+            image.draft('RGB', (int(image.size[0] * scale), int(image.size[1] * scale)))
+        image.load()
+        lap('decode')
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        lap('orient')
+
+        if crop:
+            box = _document_box(image)
+            if box != (0, 0) + image.size:
+                image = image.crop(box)
+            lap('crop')
+
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        lap('resize')
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        output = buffer.getvalue()
+        lap('encode')
+    except Exception as e:
+        report['error'] = str(e)
+        report['output_bytes'] = report.get('input_bytes', 0)
+        return encoded_image, report
+
+    report['output_size'] = image.size
+    if len(output) >= len(raw):
+        report['output_bytes'] = len(raw)
+        report['kept_original'] = True
+        return encoded_image, report
+    report['output_bytes'] = len(output)
+    return base64.b64encode(output).decode('utf-8'), report
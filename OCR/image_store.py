@@ -0,0 +1,178 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# Longest side of the image shown on the review screen
+REVIEW_MAX_SIDE = 1600
+# Longest side of the thumbnail shown in queue listings
+THUMBNAIL_MAX_SIDE = 320
+DERIVATIVE_QUALITY = 80
+WEBP_QUALITY = 80
+VARIANTS = ('original', 'review', 'thumbnail')
+
+class OCRImageStore:
+    """The image files of OCR queue entries and their derivatives.
+
+    On ingest each original gets a review-resolution JPEG and a thumbnail, and the
+    original is optionally recompressed to WebP. All files of an entry are named after
+    its ID, e.g. '<id>.jpg', '<id>.review.jpg' and '<id>.thumbnail.jpg'. When a quota is
+    set, enforce_quota evicts the originals of the oldest entries first; review keeps
+    working from the derivative.
+
+    put, ingest and delete report the bytes they add or free, so callers can keep a
+    running total instead of scanning the directory with usage().
+    """
+
+    def __init__(self, images_dir: str, webp: Optional[bool] = None, quota_bytes: Optional[int] = None):
+        """Initialize the store.
+
+        Args:
+            images_dir: Directory holding the images
+            webp: Recompress originals to WebP; OCR_IMAGE_WEBP, default false
+            quota_bytes: Disk space the images may use; OCR_IMAGE_QUOTA_MB, default unlimited
+        """
+        self.images_dir = images_dir
+        self.webp = webp if webp is not None else os.environ.get('OCR_IMAGE_WEBP', 'false').lower() == 'true'
+        if quota_bytes is None and os.environ.get('OCR_IMAGE_QUOTA_MB'):
+            quota_bytes = int(float(os.environ['OCR_IMAGE_QUOTA_MB']) * 1024 * 1024)
+        self.quota_bytes = quota_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.images_dir, exist_ok=True)
+
+    @staticmethod
+    def entry_id(filename: str) -> str:
+        """Return the ID of the entry a file in the store belongs to."""
+        return filename.split('.', 1)[0]
+
+    def _candidates(self, entry_id: str, variant: str) -> List[str]:
+        """Possible files of a variant, in order of preference."""
+        if variant == 'original':
+            names = [f"{entry_id}.webp", f"{entry_id}.jpg"]
+        else:
+            names = [f"{entry_id}.{variant}.jpg"]
+        return [os.path.join(self.images_dir, name) for name in names]
+
+    def path(self, entry_id: str, variant: str = 'original') -> Optional[str]:
+        """Return the file of a variant of an entry's image, or None if it does not exist."""
+        for path in self._candidates(entry_id, variant):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def best_path(self, entry_id: str, variant: str = 'review') -> Optional[str]:
+        """Return the file of a variant, falling back to the closest variant that still exists.
+
+        Derivatives fall back to the original, e.g. for entries queued before derivatives
+        existed, and an evicted original falls back to the review image.
+        """
+        order = {'original': ('original', 'review', 'thumbnail'), 'review': ('review', 'original', 'thumbnail'), 'thumbnail': ('thumbnail', 'review', 'original')}
+        for candidate in order[variant]:
+            path = self.path(entry_id, candidate)
+            if path:
+                return path
+        return None
+
+    def put(self, entry_id: str, source_path: Optional[str] = None, data: bytes = b'') -> Tuple[str, int]:
+        """Store the original image of an entry, moving a file in or writing its bytes.
+
+        Returns:
+            Path of the original and its size in bytes
+        """
+        path = self._candidates(entry_id, 'original')[1]
+        if source_path:
+            os.replace(source_path, path)
+            # A moved file keeps its old mtime; make it young again so it is not taken for an orphan
+            os.utime(path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return (path, os.path.getsize(path))
+
+    def ingest(self, entry_id: str, original_path: str) -> Dict[str, int]:
+        """Create the derivatives of a newly stored original, and recompress it if configured.
+
+        Returns:
+            Size in bytes of every variant written
+        """
+        sizes = {}
+        with Image.open(original_path) as source:
+            # Decode at the smallest scale that still covers the review size
+            scale = REVIEW_MAX_SIDE / max(source.size)
+            if scale < 1:
+                source.draft('RGB', (int(source.size[0] * scale), int(source.size[1] * scale)))
+            image = ImageOps.exif_transpose(source).convert('RGB')
+            for (variant, max_side) in (('review', REVIEW_MAX_SIDE), ('thumbnail', THUMBNAIL_MAX_SIDE)):
+                image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                path = self._candidates(entry_id, variant)[0]
+                image.save(path, format='JPEG', quality=DERIVATIVE_QUALITY, optimize=True)
+                sizes[variant] = os.path.getsize(path)
+
+        if self.webp and not original_path.endswith('.webp'):
+            webp_path = self._candidates(entry_id, 'original')[0]
+            with Image.open(original_path) as original:
+                # exif is kept so the original still orients itself
+                original.save(webp_path, format='WEBP', quality=WEBP_QUALITY, exif=original.info.get('exif', b''))
+            if os.path.getsize(webp_path) < os.path.getsize(original_path):
+                os.remove(original_path)
+            else:
+                os.remove(webp_path)
+        original = self.path(entry_id, 'original')
+        sizes['original'] = os.path.getsize(original) if original else 0
+        return sizes
+
+    def delete(self, entry_id: str, variants=VARIANTS) -> int:
+        """Remove variants of an entry's image.
+
+        Returns:
+            Bytes freed
+        """
+        freed = 0
+        for variant in variants:
+            for path in self._candidates(entry_id, variant):
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    freed += size
+                except FileNotFoundError:
+                    pass
+        return freed
+
+    def usage(self) -> int:
+        """Total bytes used by the images, counted by scanning the directory."""
+        total = 0
+        with os.scandir(self.images_dir) as entries:
+            for entry in entries:
+                try:
+                    total += entry.stat().st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def enforce_quota(self, entry_ids_by_age: List[str], used: Optional[int] = None) -> Dict[str, int]:
+        """Evict originals, oldest entry first, until the images fit in the quota.
+
+        Args:
+            entry_ids_by_age: IDs of the entries whose originals may be evicted, oldest first
+            used: Bytes currently used, if the caller keeps a running total; scanned otherwise
+
+        Returns:
+            Bytes used before and after, and the number of originals evicted
+        """
+        with self._lock:
+            used = used if used is not None else self.usage()
+            report = {'bytes_before': used, 'originals_evicted': 0}
+            if self.quota_bytes is not None:
+                for entry_id in entry_ids_by_age:
+                    if used <= self.quota_bytes:
+                        break
+                    # Never evict an original that has no review image to fall back on
+                    if self.path(entry_id, 'review') is None:
+                        continue
+                    freed = self.delete(entry_id, ('original',))
+                    if freed:
+                        used -= freed
+                        report['originals_evicted'] += 1
+            report['bytes_after'] = used
+            return report
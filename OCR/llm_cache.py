@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from langchain_core.messages import AIMessage
+
+from .result_cache import OCRResultCache
+
+def llm_cache_enabled() -> bool:
+    """Whether LLM responses are cached, from OCR_LLM_CACHE (default true)."""
+    return os.environ.get('OCR_LLM_CACHE', 'true').lower() == 'true'
+
+class CachedLLM:
+    """Wraps a chat model so identical requests are answered from a disk cache.
+
+    The key is the SHA-256 of the model name, the temperature and the rendered messages,
+    images included, so a hit is exactly the request the model already answered. Only
+    the response text is kept. Wrap the rate limited model, so hits do not wait for a
+    token.
+    """
+
+    def __init__(self, llm, cache: Optional[OCRResultCache] = None, enabled: Optional[bool] = None):
+        """Initialize the wrapper.
+
+        Args:
+            llm: The chat model to call on a miss
+            cache: Disk cache holding the responses; defaults to the shared one, opened on first use
+            enabled: Use the cache; OCR_LLM_CACHE, default true
+        """
+        self.llm = llm
+        self._cache = cache
+        self.enabled = enabled if enabled is not None else llm_cache_enabled()
+
+    @property
+    def cache(self) -> OCRResultCache:
+        """The disk cache holding the responses."""
+        if self._cache is None:
+            self._cache = get_llm_cache()
+        return self._cache
+
+    def cache_key(self, messages) -> str:
+        """Return the cache key of a request."""
+        if hasattr(messages, 'to_messages'):
+            messages = messages.to_messages()
+        request = {
+            'model': getattr(self.llm, 'model_name', None) or type(self.llm).__name__,
+            'temperature': getattr(self.llm, 'temperature', None),
+            'messages': [[message.type, message.content] for message in messages]
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def invoke(self, messages, *args, bypass_cache: bool = False, **kwargs):
+        """Return the cached response to the messages, or invoke the model and cache its response.
+
+        Args:
+            messages: The rendered messages
+            bypass_cache: Always call the model; its response still replaces the cached one
+        """
+        if not self.enabled:
+            return self.llm.invoke(messages, *args, **kwargs)
+        key = self.cache_key(messages)
+        if not bypass_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return AIMessage(content=cached['content'])
+        response = self.llm.invoke(messages, *args, **kwargs)
+        self.cache.set(key, {'content': response.content})
+        return response
+
+    def forget(self, messages):
+        """Drop the cached response to the messages, e.g. after it could not be parsed."""
+        if self.enabled:
+            self.cache.delete(self.cache_key(messages))
+
+    def __getattr__(self, name):
+        """Expose the wrapped model's other attributes."""
+        return getattr(self.llm, name)
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> OCRResultCache:
+    """Return the process-wide LLM response cache.
+
+    Responses live in data/llm_response_cache for OCR_LLM_CACHE_TTL_SECONDS (default
+    30 days), and at most OCR_LLM_CACHE_MAX_ENTRIES (default 20000) are kept.
+    """
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = OCRResultCache(
+                cache_dir="data/llm_response_cache",
+                ttl_seconds=float(os.environ.get('OCR_LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600)),
+                max_entries=int(os.environ.get('OCR_LLM_CACHE_MAX_ENTRIES', 20000))
+            )
+        return _llm_cache
+
+def cached(llm) -> CachedLLM:
+    """Wrap a chat model with the process-wide LLM response cache."""
+    if isinstance(llm, CachedLLM):
+        return llm
+    return CachedLLM(llm)
+
+def get_llm_cache_stats() -> Dict:
+    """Get LLM response cache statistics, and whether the cache is enabled."""
+    stats = get_llm_cache().get_stats()
+    stats['enabled'] = llm_cache_enabled()
+    return stats
@@ -0,0 +1,142 @@
+import heapq
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from rapidfuzz import distance
+
+# Corpora smaller than this are cheap enough to score in full
+BLOCKING_MIN_NAMES = int(os.environ.get('OCR_BLOCKING_MIN_NAMES', '2000'))
+# Names scored with Jaro-Winkler per lookup
+BLOCK_SIZE = 200
+# Keys shared by more than this share of the corpus (e.g. 'textiles') are too common to block on
+MAX_KEY_SHARE = 0.05
+
+# Spellings and abbreviations of the same word, mapped to one form
+ABBREVIATIONS = {
+    'shri': 'shree', 'sri': 'shree', 'shre': 'shree', 'sree': 'shree', 'shrii': 'shree', 'shreee': 'shree',
+    'bros': 'brothers', 'bro': 'brothers', 'co': 'company', 'coy': 'company', 'corp': 'corporation', 'corpn': 'corporation',
+    'ent': 'enterprises', 'entp': 'enterprises', 'enterprise': 'enterprises', 'ind': 'industries', 'inds': 'industries',
+    'industry': 'industries', 'intl': 'international', 'mfg': 'manufacturing', 'mfrs': 'manufacturers', 'tex': 'textiles',
+    'textile': 'textiles', 'fab': 'fabrics', 'fabric': 'fabrics', 'agencies': 'agency', 'trading': 'traders', 'trader': 'traders',
+    'creation': 'creations', 'son': 'sons',
+}
+# Forms of address that often come and go between two spellings of a name
+HONORIFICS = {'shree', 'smt'}
+# Legal forms dropped from the end of a name, e.g. 'P LTD' or 'Pvt. Ltd.'
+LEGAL_SUFFIXES = {'pvt', 'p', 'ltd', 'limited', 'private', 'llp', 'plc', 'inc'}
+STOP_TOKENS = {'and', 'the', 'of'}
+
+# Spellings of one sound in transliterated Hindi, longest first
+PHONETIC_RULES = [('chh', 'c'), ('ch', 'c'), ('sh', 's'), ('kh', 'k'), ('gh', 'g'), ('bh', 'b'), ('dh', 'd'), ('th', 't'),
+                  ('ph', 'f'), ('jh', 'j'), ('ck', 'k'), ('x', 'ks'), ('q', 'k'), ('z', 'j'), ('w', 'v'), ('h', '')]
+VOWELS = set('aeiouy')
+# Relative weight of a shared key by kind: token, phonetic key of a token, phonetic key of the whole name
+KEY_WEIGHTS = {'t': 1.0, 'p': 0.8, 'n': 1.2}
+
+def tokenize(name: str) -> List[str]:
+    """Split a business name into lowercase tokens with abbreviations expanded.
+
+    'M/S S. Shardharam & Sons P LTD' gives ['s', 'shardharam', 'sons'].
+    """
+    text = re.sub(r'^\s*(m/s|messrs)\b\.?', ' ', (name or '').lower()).replace('&', ' and ')
+    tokens = [ABBREVIATIONS.get(token, token) for token in re.findall(r'[a-z0-9]+', text)]
+    tokens = [token for token in tokens if token not in STOP_TOKENS]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return tokens
+
+def phonetic_key(token: str) -> str:
+    """A key shared by spellings of a transliterated word that sound alike.
+
+    Aspirates and sibilants fold together, the first letter is kept and later vowels are
+    dropped, and repeated letters collapse: 'Shardharam' and 'Shardaram' both give 'srdrm',
+    'Laxmi' and 'Lakshmi' give 'lksm'.
+    """
+    key = token.lower()
+    for (spelling, sound) in PHONETIC_RULES:
+        key = key.replace(spelling, sound)
+    if not key:
+        return ''
+    letters = [key[0]] + [letter for letter in key[1:] if letter not in VOWELS]
+    return ''.join(letter for (i, letter) in enumerate(letters) if i == 0 or letter != letters[i - 1])
+
+def canonical_form(tokens: List[str]) -> str:
+    """The tokens a name is compared on, without honorifics."""
+    core = [token for token in tokens if token not in HONORIFICS]
+    return ' '.join(core or tokens)
+
+def block_keys(tokens: List[str]) -> List[str]:
+    """The blocking keys of a tokenized name: its tokens, their phonetic keys and the phonetic key of the whole name."""
+    keys = [f't:{token}' for token in tokens]
+    keys += [f'p:{phonetic_key(token)}' for token in tokens if not token.isdigit() and len(token) > 1]
+    joined = phonetic_key(''.join(token for token in tokens if token not in HONORIFICS))
+    if len(joined) > 1:
+        keys.append(f'n:{joined}')
+    return keys
+
+class BlockingIndex:
+    """Inverted lists from blocking keys to names, to pick the few names worth scoring.
+
+    A lookup ranks names by the inverse-frequency weight of the keys they share with the
+    query, so a rare surname counts more than 'textiles', and only the best BLOCK_SIZE are
+    scored with Jaro-Winkler instead of the whole corpus.
+    """
+
+    def __init__(self, names: List[str], max_key_share: float = MAX_KEY_SHARE):
+        """Index names by position.
+
+        Args:
+            names: The names, in corpus order
+            max_key_share: Keys shared by more of the corpus than this are skipped at lookup
+        """
+        self.size = len(names)
+        self.max_postings = max(50, int(self.size * max_key_share))
+        self.canonical: List[str] = []
+        self.postings: Dict[str, List[int]] = {}
+        for (position, name) in enumerate(names):
+            tokens = tokenize(name)
+            self.canonical.append(canonical_form(tokens))
+            for key in set(block_keys(tokens)):
+                self.postings.setdefault(key, []).append(position)
+
+    def candidates(self, query: str, limit: int = BLOCK_SIZE) -> List[int]:
+        """Positions of the names sharing the most weight of keys with the query, best first."""
+        lists = [(key, self.postings[key]) for key in set(block_keys(tokenize(query))) if key in self.postings]
+        if not lists:
+            return []
+        usable = [(key, posting) for (key, posting) in lists if len(posting) <= self.max_postings]
+        if not usable:
+            # Only common keys: block on the rarest one alone
+            usable = [min(lists, key=lambda item: len(item[1]))]
+        weights: Dict[int, float] = {}
+        for (key, posting) in usable:
+            weight = KEY_WEIGHTS[key[0]] * math.log(1 + self.size / len(posting))
+            for position in posting:
+                weights[position] = weights.get(position, 0.0) + weight
+        return heapq.nlargest(limit, weights, key=weights.__getitem__)
+
+    def search(self, query: str, lowercase_names: List[str], limit: int = 10, block_size: int = BLOCK_SIZE) -> Optional[List[Tuple[int, float]]]:
+        """Score the blocked candidates of a query.
+
+        A candidate's distance is the smaller Jaro-Winkler distance of the lowercase
+        names and of their canonical forms, so 'SHREE SHARDHARAM' is close to 'SHARDARAM'.
+
+        Args:
+            query: The name to look up
+            lowercase_names: Lowercase names, parallel to the indexed ones
+            limit: Number of matches returned
+            block_size: Number of candidates scored
+
+        Returns:
+            (position, distance) of the closest names, or None if no name shares a key with the query
+        """
+        positions = self.candidates(query, block_size)
+        if not positions:
+            return None
+        lowercase = query.lower()
+        canonical = canonical_form(tokenize(query))
+        scored = [(position, min(distance.JaroWinkler.distance(lowercase, lowercase_names[position]),
+                                 distance.JaroWinkler.distance(canonical, self.canonical[position])))
+                  for position in positions]
+        return heapq.nsmallest(limit, scored, key=lambda item: item[1])
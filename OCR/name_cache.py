@@ -1,8 +1,32 @@
-import json
-import os
 import re
+import threading
 from typing import Optional, Dict
-from rapidfuzz import distance
+from .fuzzy_index import FuzzyIndex
+from .append_log import AppendLog
+
+BUSINESS_SUFFIXES = ['pvt', 'ltd', 'limited', 'private']
+
+def normalize_name(name: str) -> str:
+    """Normalize a business name for consistent matching.
+    
+    Args:
+        name: The business name to normalize
+        
+    Returns:
+        Normalized version of the name
+    """
+    if not name:
+        return ""
+        
+    # Convert to lowercase and remove punctuation
+    normalized = re.sub(r'[^\w\s]', '', name.lower())
+    
+    # Split into words and filter out business suffixes
+    words = normalized.split()
+    words = [w for w in words if w not in BUSINESS_SUFFIXES]
+    
+    # Join back together
+    return ''.join(words)
 
 class NameMatchCache:
     """A persistent cache system for name matching results."""
@@ -11,34 +35,51 @@ class NameMatchCache:
         """Initialize the cache system.
         
         Args:
-            cache_file: Path to the JSON file for persistent storage
+            cache_file: Path to the append-only JSON-lines file for persistent storage
         """
         self.cache_file = cache_file
+        self._lock = threading.RLock()
+        self.store = AppendLog(cache_file)
         self.cache = self._load_cache()
+        self._rebuild_index()
         self.hits = 0
         self.misses = 0
     
     def _load_cache(self) -> dict:
         """Load the cache from disk."""
         try:
-            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            try:
-                with open(self.cache_file, 'r') as f:
-                    return json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                # Initialize with empty dict if file doesn't exist or is empty
-                with open(self.cache_file, 'w') as f:
-                    json.dump({}, f)
-                return {}
+            return self.store.load()
         except Exception as e:
             print(f"Error loading cache: {str(e)}")
             return {}
     
-    def _save_cache(self):
-        """Save the cache to disk."""
-        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
+    def _rebuild_index(self):
+        """Index every cached key from scratch."""
+        self.index = FuzzyIndex()
+        self._index_keys = {}
+        for cached_key in self.cache:
+            self._index(cached_key)
+    
+    def _apply_changes(self, changes: Optional[dict]):
+        """Index keys read from the store; None means the store reloaded the whole cache."""
+        if changes is None:
+            self._rebuild_index()
+            return
+        for cached_key in changes:
+            self._index(cached_key)
+    
+    def _refresh(self):
+        """Pick up mappings written by other processes sharing the cache file."""
+        try:
+            with self._lock:
+                self._apply_changes(self.store.refresh(self.cache))
+        except Exception as e:
+            print(f"Error refreshing cache: {str(e)}")
+    
+    def _save(self, normalized: str, matched_name: str):
+        """Append a single mapping to the cache file and the in-memory cache."""
+        with self._lock:
+            self._apply_changes(self.store.append(self.cache, {normalized: matched_name}))
     
     def _normalize_name(self, name: str) -> str:
         """Normalize a business name for consistent matching.
@@ -49,21 +90,19 @@ class NameMatchCache:
         Returns:
             Normalized version of the name
         """
-        if not name:
-            return ""
-            
-        # Convert to lowercase and remove punctuation
-        normalized = re.sub(r'[^\w\s]', '', name.lower())
-        
-        # Split into words and filter out business suffixes
-        words = normalized.split()
-        words = [w for w in words if w not in ['pvt', 'ltd', 'limited', 'private']]
-        
-        # Join back together
-        normalized = ''.join(words)
-        
-        return normalized
+        return normalize_name(name)
     
+    def _index(self, cached_key: str):
+        """Add a cache key to the fuzzy index under its normalized form.
+
+        Args:
+            cached_key: A key of the cache; keys written by older versions may not be normalized
+        """
+        normalized = self._normalize_name(cached_key)
+        if normalized and (normalized not in self._index_keys or cached_key == normalized):
+            self._index_keys[normalized] = cached_key
+            self.index.add(normalized)
+
     def get(self, name: str, threshold: float = 0.95) -> Optional[str]:
         """Get a matched name from the cache.
         
@@ -81,23 +120,19 @@ class NameMatchCache:
         if not normalized:
             return None
         
+        self._refresh()
+        
         # Try exact match first
         if normalized in self.cache:
             self.hits += 1
             return self.cache[normalized]
         
-        # Try fuzzy matching with normalized cached names
-        best_match = None
-        best_score = 0
-        for cached_key, cached_value in self.cache.items():
-            score = distance.JaroWinkler.similarity(normalized, self._normalize_name(cached_key))
-            if score > threshold and score > best_score and score > 0.95:
-                best_score = score
-                best_match = cached_value
-        
-        if best_match:
-            self.hits += 1
-            return best_match
+        # Try fuzzy matching against the index of normalized cached names
+        with self._lock:
+            match = self.index.best_match(normalized, max(threshold, 0.95))
+            if match:
+                self.hits += 1
+                return self.cache[self._index_keys[match[0]]]
         
         self.misses += 1
         return None
@@ -114,8 +149,7 @@ class NameMatchCache:
             
         normalized = self._normalize_name(name)
         if normalized:
-            self.cache[normalized] = matched_name
-            self._save_cache()
+            self._save(normalized, matched_name)
     
     def get_stats(self) -> Dict[str, float]:
         """Get cache performance statistics.
@@ -146,6 +180,5 @@ class NameMatchCache:
             
         normalized = self._normalize_name(original_name)
         if normalized:
-            self.cache[normalized] = corrected_name
-            self._save_cache()
+            self._save(normalized, corrected_name)
             print(f"Cache updated: {original_name} -> {corrected_name}")
@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from API_Database import retrieve_indivijual
+from API_Database.data_version import get_data_version
+from .name_cache import normalize_name
+from .name_blocking import BlockingIndex
+from .typeahead import TypeaheadIndex
+
+# How often, at most, a corpus asks the database whether its table changed
+VERSION_CHECK_SECONDS = 5
+
+class NameCorpus:
+    """The names of one entity table held in memory with their precomputed forms.
+
+    names, ids, lowercase and normalized are parallel lists, so a fuzzy match over
+    lowercase or normalized maps back to the original name and id by position.
+    """
+
+    def __init__(self, entity_type: str, rows: List[Tuple[int, str]], version: int = 0):
+        """Initialize the corpus.
+
+        Args:
+            entity_type: The table the names come from, e.g. 'supplier' or 'party'
+            rows: (id, name) pairs
+            version: The data version of the table the rows were read at
+        """
+        self.entity_type = entity_type
+        self.version = version
+        self.ids = [row[0] for row in rows]
+        self.names = [row[1] for row in rows]
+        self.lowercase = [name.lower() for name in self.names]
+        self.normalized = [normalize_name(name) for name in self.names]
+        self.id_by_name = {name: id for (id, name) in zip(self.ids, self.names)}
+        self._blocking = None
+        self._typeahead = None
+        self._blocking_lock = threading.Lock()
+        self._typeahead_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of names in the corpus."""
+        return len(self.names)
+
+    @property
+    def blocking(self) -> BlockingIndex:
+        """The blocking index of the names, built on first use."""
+        with self._blocking_lock:
+            if self._blocking is None:
+                self._blocking = BlockingIndex(self.names)
+            return self._blocking
+
+    @property
+    def typeahead(self) -> TypeaheadIndex:
+        """The typeahead index of the names, built on first use."""
+        with self._typeahead_lock:
+            if self._typeahead is None:
+                self._typeahead = TypeaheadIndex(self.names)
+            return self._typeahead
+
+    def build_indexes(self):
+        """Build the blocking and typeahead indexes now rather than on first use."""
+        self.blocking
+        self.typeahead
+
+    @classmethod
+    def load(cls, entity_type: str, version: int = 0) -> 'NameCorpus':
+        """Read every (id, name) of the entity table into a new corpus."""
+        rows = retrieve_indivijual.get_all_names_ids(entity_type, dict_cursor=False)
+        return cls(entity_type, [(row[0], row[1]) for row in rows], version)
+
+class NameCorpusCache:
+    """Per-entity corpora shared by every caller in the process.
+
+    A corpus is reloaded only when the table's data version moved, and the version is
+    read at most once every VERSION_CHECK_SECONDS, so lookups in between do no database I/O.
+    A reload, indexes included, happens outside the shared lock: while one thread rebuilds
+    an entity, other callers keep getting its previous corpus.
+    """
+
+    def __init__(self, check_seconds: float = VERSION_CHECK_SECONDS, get_version: Callable[[str], int] = get_data_version, load: Callable[[str, int], NameCorpus] = NameCorpus.load):
+        """Initialize the cache.
+
+        Args:
+            check_seconds: Minimum time between two version checks of the same entity
+            get_version: Returns the current data version of a table
+            load: Builds a corpus for a table at a version
+        """
+        self.check_seconds = check_seconds
+        self._get_version = get_version
+        self._load = load
+        self._corpora: Dict[str, NameCorpus] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._reload_locks: Dict[str, threading.Lock] = {}
+
+    def _is_fresh(self, entity_type: str, corpus: Optional[NameCorpus], now: float) -> bool:
+        """Whether a corpus was checked against the database within the check interval."""
+        return corpus is not None and now - self._checked_at[entity_type] < self.check_seconds
+
+    def get(self, entity_type: str) -> NameCorpus:
+        """Return the corpus of an entity, reloading it if the table changed."""
+        with self._lock:
+            corpus = self._corpora.get(entity_type)
+            if self._is_fresh(entity_type, corpus, time.monotonic()):
+                return corpus
+            reload_lock = self._reload_locks.setdefault(entity_type, threading.Lock())
+        # Serve the previous corpus while another thread is checking or rebuilding this one
+        if not reload_lock.acquire(blocking=corpus is None):
+            return corpus
+        try:
+            with self._lock:
+                corpus = self._corpora.get(entity_type)
+                now = time.monotonic()
+                if self._is_fresh(entity_type, corpus, now):
+                    return corpus
+            try:
+                version = self._get_version(entity_type)
+            except Exception as e:
+                # Without the version table, fall back to reloading once per check interval
+                print(f"Error reading data version of {entity_type}: {str(e)}")
+                version = None
+            if corpus is None or version is None or version != corpus.version:
+                corpus = self._load(entity_type, version or 0)
+                corpus.build_indexes()
+            with self._lock:
+                self._corpora[entity_type] = corpus
+                self._checked_at[entity_type] = now
+            return corpus
+        finally:
+            reload_lock.release()
+
+    def invalidate(self, entity_type: Optional[str] = None):
+        """Force the next get to reload one entity, or all of them."""
+        with self._lock:
+            if entity_type is None:
+                self._corpora.clear()
+            else:
+                self._corpora.pop(entity_type, None)
+
+_corpus_cache = NameCorpusCache()
+
+def get_name_corpus(entity_type: str) -> NameCorpus:
+    """Return the shared, up-to-date corpus of names for an entity type."""
+    return _corpus_cache.get(entity_type)
+
+def suggest_names(entity_type: str, query: str, limit: int = 10) -> List[Dict]:
+    """Suggest names of an entity type for a picker, from the shared corpus.
+
+    Returns:
+        Dictionaries with the id, name and how it matched ('prefix', 'word' or 'fuzzy'), best first
+    """
+    corpus = get_name_corpus(entity_type)
+    return [{'id': corpus.ids[position], 'name': corpus.names[position], 'match': kind}
+            for (position, kind) in corpus.typeahead.search(query, limit)]
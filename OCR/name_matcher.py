@@ -1,33 +1,68 @@
 import os
-from typing import List, Optional, Tuple, Dict
+import json
+from typing import List, Optional, Tuple, Dict, Union
 from rapidfuzz import process, distance
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
 
-from API_Database import retrieve_indivijual
 from .name_cache import NameMatchCache
+from .name_corpus import NameCorpus, get_name_corpus
+from .name_blocking import BLOCKING_MIN_NAMES
+from .rate_limit import rate_limited
+from .llm_cache import cached
+from .circuit_breaker import LLMUnavailableError, guarded, llm_max_retries, llm_timeout_seconds
+from .verify_batcher import VerificationBatcher
 
 load_dotenv()
 
+# Largest number of names verified in one LLM request
+MAX_VERIFY_BATCH = int(os.environ.get('OCR_VERIFY_BATCH_SIZE', '20'))
+# Largest prompt, in characters, of one batched verification
+MAX_VERIFY_PROMPT_CHARS = 12000
+# How long a verification waits for others to share its LLM request
+VERIFY_BATCH_WINDOW_SECONDS = float(os.environ.get('OCR_VERIFY_BATCH_WINDOW_MS', '20')) / 1000
+# How long a verification request may take before the fuzzy match is used instead
+VERIFY_DEADLINE_SECONDS = float(os.environ.get('OCR_VERIFY_DEADLINE_SECONDS', '15'))
+# Lowest fuzzy similarity accepted as a match while the LLM is unavailable
+FUZZY_ONLY_MIN_CONFIDENCE = float(os.environ.get('OCR_FUZZY_ONLY_MIN_CONFIDENCE', '0.9'))
+
+class FuzzyMatch(str):
+    """A name matched on fuzzy similarity alone, because the LLM was unavailable.
+
+    It is the best candidate when its confidence reaches FUZZY_ONLY_MIN_CONFIDENCE and
+    the empty string otherwise, so it is falsy exactly when no match was accepted.
+    """
+
+    def __new__(cls, name: str, confidence: float):
+        match = super().__new__(cls, name)
+        match.confidence = confidence
+        return match
+
 class NameMatcher:
     """A class to match business names using fuzzy matching and LLM verification."""
     
-    def __init__(self, cache_dir: str = "data"):
+    def __init__(self, cache_dir: str = "data", llm=None):
         """Initialize the name matcher with LLM and cache.
         
         Args:
             cache_dir: Directory to store the cache file
+            llm: Chat model to use instead of the default OpenAI client
         """
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is required")
-
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",  # Using 3.5 for cost efficiency
-            api_key=api_key,
-            temperature=0
-        )
+        if llm is None:
+            api_key = os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is required")
+
+            llm = ChatOpenAI(
+                model="gpt-4o-mini",  # Using 3.5 for cost efficiency
+                api_key=api_key,
+                temperature=0,
+                timeout=llm_timeout_seconds(),
+                max_retries=llm_max_retries()
+            )
+        # Cache outside the rate limit, so repeated prompts neither wait nor call the API
+        self.llm = cached(rate_limited(guarded(llm)))
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", "You are an expert in Indian business names and common variations."),
@@ -40,16 +75,30 @@ class NameMatcher:
             Response format: single line with match or 'None'""")
         ])
         
+        self.batch_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are an expert in Indian business names and common variations."),
+            ("user", """For each numbered query below, decide whether one of its potential matches is clearly the same business (considering common variations, typos, or abbreviations).
+            
+            {items}
+            
+            For a match you MUST return the EXACT string from that query's potential matches list.
+            Response format: only a JSON object mapping every query number to its match, or null if none match, e.g. {{"1": "Rachit Fashion", "2": null}}""")
+        ])
+        self.batcher = VerificationBatcher(self.verify_matches, MAX_VERIFY_BATCH, VERIFY_BATCH_WINDOW_SECONDS)
+        
         # Initialize cache
         cache_file = os.path.join(cache_dir, "name_match_cache.json")
         self.cache = NameMatchCache(cache_file)
 
-    def get_fuzzy_matches(self, query: str, database_names: List[str], limit: int = 10) -> List[Tuple[str, float]]:
+    def get_fuzzy_matches(self, query: str, database_names: Union[List[str], NameCorpus], limit: int = 10) -> List[Tuple[str, float]]:
         """Get initial matches using fuzzy matching.
         
+        Corpora of BLOCKING_MIN_NAMES or more only score the names their blocking index
+        picks, unless no name shares a token or phonetic key with the query.
+        
         Args:
             query: The name to match against the database
-            database_names: List of names from the database
+            database_names: A NameCorpus, or a list of names from the database
             limit: Maximum number of matches to return
             
         Returns:
@@ -58,22 +107,26 @@ class NameMatcher:
         # Convert query to lowercase
         query = query.lower()
         
-        # Convert all database names to lowercase for comparison
-        lowercase_names = [name.lower() for name in database_names]
+        # Compare against lowercase names, precomputed when given a corpus
+        if isinstance(database_names, NameCorpus):
+            (names, lowercase_names) = (database_names.names, database_names.lowercase)
+        else:
+            (names, lowercase_names) = (database_names, [name.lower() for name in database_names])
         
-        # Get matches using lowercase versions
-        matches = process.extract(
-            query, 
-            lowercase_names, 
-            scorer=distance.JaroWinkler.distance, 
-            limit=limit
-        )
+        blocked = None
+        if isinstance(database_names, NameCorpus) and len(database_names) >= BLOCKING_MIN_NAMES:
+            blocked = database_names.blocking.search(query, lowercase_names, limit)
+        if blocked is None:
+            matches = process.extract(
+                query, 
+                lowercase_names, 
+                scorer=distance.JaroWinkler.distance, 
+                limit=limit
+            )
+            blocked = [(index, score) for (_, score, index) in matches]
         
-        # Map back to original case names
-        original_case_matches = [
-            (database_names[lowercase_names.index(match[0])], match[1]) 
-            for match in matches
-        ]
+        # Map back to original case names by position
+        original_case_matches = [(names[index], score) for (index, score) in blocked]
         
         # Debug output
         print("\n=== Top Fuzzy Matches ===")
@@ -92,6 +145,9 @@ class NameMatcher:
             
         Returns:
             The verified match or None if no confident match found
+            
+        Raises:
+            LLMUnavailableError: The LLM timed out or its circuit breaker is open
         """
         # Check cache first
         cached_result = self.cache.get(query)
@@ -116,7 +172,7 @@ class NameMatcher:
             print(f"Query sent to AI: {query}")
             print(f"Candidates sent to AI: {candidates}")
             
-            response = self.llm.invoke(messages)
+            response = self.llm.invoke(messages, timeout=VERIFY_DEADLINE_SECONDS)
             result = response.content.strip()
             
             # Debug output after AI response
@@ -128,13 +184,144 @@ class NameMatcher:
                 return result
             return None
             
+        except LLMUnavailableError:
+            raise
         except Exception as e:
             print(f"Error in LLM verification: {str(e)}")
             return None
 
+    def _resolve_locally(self, query: str, candidates: List[str]) -> Optional[str]:
+        """Answer a verification from the cache or an exact match, without the LLM."""
+        cached_result = self.cache.get(query)
+        if cached_result:
+            return cached_result
+        for candidate in candidates:
+            if query.lower() == candidate.lower():
+                self.cache.set(query, candidate)
+                return candidate
+        return None
+
+    def _chunks(self, pairs: List[Tuple[int, str, List[str]]]) -> List[List[Tuple[int, str, List[str]]]]:
+        """Split numbered (index, query, candidates) pairs into batches within the size caps."""
+        chunks = [[]]
+        chars = 0
+        for pair in pairs:
+            size = len(pair[1]) + sum(len(candidate) + 4 for candidate in pair[2])
+            if chunks[-1] and (len(chunks[-1]) >= MAX_VERIFY_BATCH or chars + size > MAX_VERIFY_PROMPT_CHARS):
+                chunks.append([])
+                chars = 0
+            chunks[-1].append(pair)
+            chars += size
+        return chunks
+
+    def _verify_batch(self, pairs: List[Tuple[int, str, List[str]]]) -> Dict[int, Optional[str]]:
+        """Verify several queries with one LLM request.
+
+        Returns:
+            The answer of every pair the response settled; pairs it did not are left out
+            
+        Raises:
+            LLMUnavailableError: The LLM timed out or its circuit breaker is open
+        """
+        items = "\n".join(
+            f"{number}. Query name: {json.dumps(query)}\n   Potential matches: {json.dumps(candidates)}"
+            for (number, (_, query, candidates)) in enumerate(pairs, 1)
+        )
+        messages = self.batch_prompt.format_messages(items=items)
+        print(f"\n=== AI Batch Verification === {len(pairs)} queries")
+        try:
+            response = self.llm.invoke(messages, timeout=VERIFY_DEADLINE_SECONDS)
+        except LLMUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Error in batch LLM verification: {str(e)}")
+            return {}
+        try:
+            content = response.content.strip()
+            # Models sometimes wrap JSON in a code fence
+            if content.startswith("```"):
+                content = content.strip("`").split("\n", 1)[-1]
+            answers = json.loads(content)
+            if not isinstance(answers, dict):
+                raise ValueError("response is not a JSON object")
+        except Exception as e:
+            print(f"Error in batch LLM verification: {str(e)}")
+            self.llm.forget(messages)
+            return {}
+        settled = {}
+        for (number, (index, query, candidates)) in enumerate(pairs, 1):
+            if str(number) not in answers:
+                continue
+            answer = answers[str(number)]
+            if answer is None or answer == 'None':
+                settled[index] = None
+            elif answer in candidates:
+                self.cache.set(query, answer)
+                settled[index] = answer
+        return settled
+
+    def verify_matches(self, pairs: List[Tuple[str, List[str]]]) -> List[Optional[str]]:
+        """Verify many (query, candidates) pairs, packing those the cache cannot answer into few LLM requests.
+        
+        Pairs a batched response leaves unanswered, or all of them if it cannot be
+        parsed, fall back to one verify_match call each. While the LLM times out or its
+        circuit breaker is open, pairs get a FuzzyMatch instead of waiting.
+        
+        Args:
+            pairs: (query, candidates) pairs
+            
+        Returns:
+            The verified match, FuzzyMatch or None for every pair, in order
+        """
+        results: List[Optional[str]] = [None] * len(pairs)
+        remaining = []
+        for (index, (query, candidates)) in enumerate(pairs):
+            local = self._resolve_locally(query, candidates)
+            if local:
+                results[index] = local
+            elif candidates:
+                remaining.append((index, query, candidates))
+        if len(remaining) == 1:
+            (index, query, candidates) = remaining[0]
+            results[index] = self._verify_or_fuzzy(query, candidates)
+            return results
+        for chunk in self._chunks(remaining) if remaining else []:
+            try:
+                settled = self._verify_batch(chunk)
+            except LLMUnavailableError as e:
+                print(f"LLM unavailable, using fuzzy matches: {str(e)}")
+                settled = {index: self.fuzzy_only(query, candidates) for (index, query, candidates) in chunk}
+            for (index, query, candidates) in chunk:
+                results[index] = settled[index] if index in settled else self._verify_or_fuzzy(query, candidates)
+        return results
+
+    def _verify_or_fuzzy(self, query: str, candidates: List[str]) -> Optional[str]:
+        """Verify one pair with the LLM, or fall back to the fuzzy match if it is unavailable."""
+        try:
+            return self.verify_match(query, candidates)
+        except LLMUnavailableError as e:
+            print(f"LLM unavailable, using fuzzy match: {str(e)}")
+            return self.fuzzy_only(query, candidates)
+
+    def fuzzy_only(self, query: str, candidates: List[str]) -> FuzzyMatch:
+        """Match a query on fuzzy similarity alone, for when the LLM cannot verify it.
+
+        The answer is not cached, so the query is verified once the LLM is back.
+        """
+        self.llm.breaker.record_fallback('name_match')
+        matches = self.get_fuzzy_matches(query, candidates, limit=1)
+        if not matches:
+            return FuzzyMatch('', 0.0)
+        (name, score) = matches[0]
+        confidence = 1 - score
+        return FuzzyMatch(name if confidence >= FUZZY_ONLY_MIN_CONFIDENCE else '', confidence)
+
     def find_match(self, query: str, entity_type: str = 'supplier') -> Optional[str]:
         """Find the best match for a query name in the database.
         
+        The LLM verification is shared with other find_match calls made at about the
+        same time.
+        
         Args:
             query: The name to match
             entity_type: Type of entity to match against ('supplier' or 'party')
@@ -149,31 +336,55 @@ class NameMatcher:
             if cached_result:
                 return cached_result
             
-            # Get all names from database
-            data = retrieve_indivijual.get_all_names_ids(entity_type, dict_cursor=False)
-            database_names = [y[1] for y in data]
+            # Get all names from the in-memory corpus, refreshed when the table changes
+            corpus = get_name_corpus(entity_type)
             
             # Get fuzzy matches
-            matches = self.get_fuzzy_matches(query, database_names)
+            matches = self.get_fuzzy_matches(query, corpus)
             if not matches:
                 return None
                 
             # Extract just the names from matches
             candidate_names = [match[0] for match in matches]
             
-            # Verify using LLM
-            result = self.verify_match(query, candidate_names)
-            
-            # Cache the result if we found a match
-            if result:
-                self.cache.set(query, result)
-                
-            return result
+            # Verify using LLM, batched with concurrent lookups
+            return self.batcher.submit(query, candidate_names).result()
             
         except Exception as e:
             print(f"Error in name matching: {str(e)}")
             return None
 
+    def find_matches(self, queries: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Find the best match for several names with at most one batched LLM verification.
+        
+        Args:
+            queries: (name, entity_type) pairs
+            
+        Returns:
+            The best matching name or None for every query, in order
+        """
+        results: List[Optional[str]] = [None] * len(queries)
+        pairs = []
+        for (index, (query, entity_type)) in enumerate(queries):
+            try:
+                cached_result = self.cache.get(query)
+                if cached_result:
+                    results[index] = cached_result
+                    continue
+                matches = self.get_fuzzy_matches(query, get_name_corpus(entity_type))
+                if matches:
+                    pairs.append((index, (query, [match[0] for match in matches])))
+            except Exception as e:
+                print(f"Error in name matching: {str(e)}")
+        try:
+            answers = self.verify_matches([pair for (_, pair) in pairs])
+        except Exception as e:
+            print(f"Error in name matching: {str(e)}")
+            answers = [None] * len(pairs)
+        for ((index, _), answer) in zip(pairs, answers):
+            results[index] = answer
+        return results
+
     def get_cache_stats(self) -> Dict[str, float]:
         """Get cache performance statistics."""
         return self.cache.get_stats()
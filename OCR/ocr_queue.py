@@ -2,278 +2,639 @@ import json
 import os
 import uuid
 import base64
-from datetime import datetime
-from typing import Optional, Dict, List
+import hashlib
+import math
+import sqlite3
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional, Dict, List, Iterable
+from .result_cache import image_hash
+from .image_store import OCRImageStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    image_path TEXT NOT NULL,
+    image_hash TEXT,
+    ocr_data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    upload_time TEXT NOT NULL,
+    processed_time TEXT,
+    lease_owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS entries_status_upload_idx ON entries (status, upload_time);
+CREATE INDEX IF NOT EXISTS entries_status_processed_idx ON entries (status, processed_time);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_pending_hash_idx ON entries (image_hash) WHERE status = 'pending';
+
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats (name, value) VALUES ('total_pending', 0), ('total_processed', 0), ('total_requeued', 0);
+
+-- Keep the counters in step with the entries, in the same transaction
+CREATE TRIGGER IF NOT EXISTS entries_count_insert AFTER INSERT ON entries BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'total_' || NEW.status;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_count_delete AFTER DELETE ON entries BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'total_' || OLD.status;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_count_update AFTER UPDATE OF status ON entries WHEN OLD.status != NEW.status BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'total_' || OLD.status;
+    UPDATE stats SET value = value + 1 WHERE name = 'total_' || NEW.status;
+END;
+"""
+
+LEASE_INDEX = "CREATE INDEX IF NOT EXISTS entries_status_lease_idx ON entries (status, lease_expires)"
+
+# Size of the chunks uploads are copied to disk in
+CHUNK_SIZE = 64 * 1024
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 of a file, read in chunks; equal to image_hash of its base64 encoding."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# How often the background integrity check runs
+INTEGRITY_CHECK_SECONDS = 600
+# Image files younger than this are never treated as orphans
+ORPHAN_GRACE_SECONDS = 60
+# Staged uploads younger than this may still belong to a request, possibly in another
+# worker process; a batch of images can spend many minutes in extraction before it is queued
+STAGED_GRACE_SECONDS = 3600
+# Window over which review throughput is reported
+THROUGHPUT_WINDOW_SECONDS = 3600
+
+def default_lease_seconds() -> float:
+    """How long a claimed entry stays hidden from other operators, from OCR_LEASE_SECONDS (default 300)."""
+    return float(os.environ.get('OCR_LEASE_SECONDS', '300'))
+
+# Longest lease a client may ask for, in multiples of the default lease
+MAX_LEASE_MULTIPLE = 12
+
+def parse_lease_seconds(value) -> Optional[float]:
+    """Validate a lease length sent by a client, clamped to 1 second .. MAX_LEASE_MULTIPLE default leases.
+
+    Returns:
+        The lease length, or None for the default if no value was sent
+
+    Raises:
+        ValueError: If the value is not a finite number
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError('lease_seconds must be a number')
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('lease_seconds must be a number')
+    if not math.isfinite(seconds):
+        raise ValueError('lease_seconds must be a number')
+    return min(max(seconds, 1.0), MAX_LEASE_MULTIPLE * default_lease_seconds())
 
 class OCRQueue:
-    """A persistent queue system for OCR processing results."""
-    
-    def __init__(self, queue_dir: str = "data/ocr_queue"):
+    """A persistent queue system for OCR processing results.
+
+    Entry metadata lives in a SQLite database indexed on status and upload time, so
+    dequeueing, completing and counting entries never scan the whole queue; images are
+    stored as files next to it. Image files are only reconciled with the database by
+    verify_integrity, which runs in the background.
+
+    Operators claim entries under a lease: a claimed entry is hidden from everyone else
+    until it is completed, released, or its lease expires without a heartbeat, at which
+    point it is claimable again.
+    """
+
+    def __init__(self, queue_dir: str = "data/ocr_queue", store: Optional[OCRImageStore] = None):
         """Initialize the queue system.
-        
+
+        A queue.json left by the previous file-based queue is imported on first use.
+
         Args:
             queue_dir: Directory for queue storage (images and metadata)
+            store: Image store to use instead of one configured from the environment
         """
         # Convert to absolute path
         self.queue_dir = os.path.abspath(queue_dir)
         self.images_dir = os.path.join(self.queue_dir, "images")
-        self.queue_file = os.path.join(self.queue_dir, "queue.json")
-        
+        self.incoming_dir = os.path.join(self.queue_dir, "incoming")
+        self.db_path = os.path.join(self.queue_dir, "queue.db")
+        self.legacy_queue_file = os.path.join(self.queue_dir, "queue.json")
+
         # Create directories if they don't exist
         os.makedirs(self.images_dir, exist_ok=True)
-        os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
-        
-        self.queue = self._load_queue()
-        self._verify_queue()  # Verify and fix any issues
-    
-    def _load_queue(self) -> dict:
-        """Load the queue metadata from disk."""
-        try:
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        self.store = store or OCRImageStore(self.images_dir)
+
+        self._lock = threading.RLock()
+        # Uploads staged by this process that are not yet queued or discarded
+        self._staged = set()
+        self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self._add_lease_columns()
+        self._migrate_legacy_queue()
+        # Seeded once from the directory; kept up to date by every change to the images after that
+        if not self._query("SELECT 1 FROM stats WHERE name = 'image_bytes'"):
+            self._write([("INSERT OR IGNORE INTO stats (name, value) VALUES ('image_bytes', ?)", (self.store.usage(),))])
+
+    def _add_lease_columns(self):
+        """Add the lease columns to a database created before leases existed."""
+        with self._transaction() as connection:
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(entries)")}
+            for column in ("lease_owner TEXT", "lease_expires REAL"):
+                if column.split()[0] not in columns:
+                    connection.execute(f"ALTER TABLE entries ADD COLUMN {column}")
+            connection.execute(LEASE_INDEX)
+
+    @contextmanager
+    def _transaction(self):
+        """Run a read-modify-write in one transaction that holds the database write lock."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
             try:
-                with open(self.queue_file, 'r') as f:
-                    return json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                # Initialize with empty queue if file doesn't exist or is empty
-                initial_queue = {
-                    "entries": [],
-                    "stats": {
-                        "total_processed": 0,
-                        "total_pending": 0,
-                        "last_processed": None
-                    }
-                }
-                with open(self.queue_file, 'w') as f:
-                    json.dump(initial_queue, f, indent=2)
-                return initial_queue
-        except Exception as e:
-            print(f"Error loading queue: {str(e)}")
-            return {
-                "entries": [],
-                "stats": {
-                    "total_processed": 0,
-                    "total_pending": 0,
-                    "last_processed": None
-                }
-            }
-    
-    def _save_queue(self):
-        """Save the queue to disk."""
-        try:
-            os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
-            with open(self.queue_file, 'w') as f:
-                json.dump(self.queue, f, indent=2)
-        except Exception as e:
-            print(f"Error saving queue: {str(e)}")
-    
-    def _update_stats(self):
-        """Update queue statistics."""
-        pending_count = len([e for e in self.queue["entries"] if e["status"] == "pending"])
-        processed_count = len([e for e in self.queue["entries"] if e["status"] == "processed"])
-        
-        self.queue["stats"] = {
-            "total_processed": processed_count,
-            "total_pending": pending_count,
-            "last_processed": datetime.now().isoformat() if processed_count > 0 else None
-        }
-    
-    def _verify_queue(self):
-        """Verify queue integrity and fix any issues."""
-        fixed_entries = []
-        for entry in self.queue["entries"]:
-            if entry["status"] == "pending":
-                # Convert to absolute path
-                image_path = os.path.abspath(entry["image_path"])
-                if os.path.exists(image_path):
-                    entry["image_path"] = image_path
-                    fixed_entries.append(entry)
-                else:
-                    print(f"Warning: Skipping entry {entry['id']} - missing image")
-            else:
-                # Keep processed entries
-                fixed_entries.append(entry)
-                
-        self.queue["entries"] = fixed_entries
-        self._update_stats()
-        self._save_queue()
-        
-        # Clean up orphaned images
-        self._cleanup_orphaned_images()
-    
-    def _cleanup_orphaned_images(self):
-        """Remove image files that don't belong to any queue entry."""
-        if not os.path.exists(self.images_dir):
+                yield self._connection
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _write(self, statements):
+        """Run (sql, params) statements in one write transaction."""
+        with self._transaction() as connection:
+            for (sql, params) in statements:
+                connection.execute(sql, params)
+
+    def _add_image_bytes(self, delta: int):
+        """Move the running total of bytes used by the images."""
+        if delta:
+            self._write([("UPDATE stats SET value = value + ? WHERE name = 'image_bytes'", (delta,))])
+
+    def _image_bytes(self) -> int:
+        """Bytes used by the images, from the running total."""
+        rows = self._query("SELECT value FROM stats WHERE name = 'image_bytes'")
+        return rows[0]["value"] if rows else 0
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+        """Run a read query and return its rows."""
+        with self._lock:
+            return self._connection.execute(sql, tuple(params)).fetchall()
+
+    def _migrate_legacy_queue(self):
+        """Import the entries of a queue.json written by the file-based queue, then set it aside."""
+        if not os.path.exists(self.legacy_queue_file):
             return
-            
+        try:
+            with open(self.legacy_queue_file, 'r') as f:
+                entries = json.load(f).get("entries", [])
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error reading legacy queue: {str(e)}")
+            entries = []
+        statements = []
+        for entry in entries:
+            digest = entry.get("image_hash")
+            if not digest and entry.get("status") == "pending" and os.path.exists(entry.get("image_path", "")):
+                digest = hash_file(entry["image_path"])
+            # Duplicate pending images are skipped; their files are removed as orphans later
+            statements.append((
+                "INSERT OR IGNORE INTO entries (id, image_path, image_hash, ocr_data, status, upload_time, processed_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry["id"], os.path.abspath(entry.get("image_path", "")), digest, json.dumps(entry.get("ocr_data", {})),
+                 entry.get("status", "pending"), entry.get("upload_time") or datetime.now().isoformat(), entry.get("processed_time"))
+            ))
+        self._write(statements)
+        os.replace(self.legacy_queue_file, f"{self.legacy_queue_file}.migrated")
+        print(f"Migrated {len(entries)} OCR queue entries to {self.db_path}")
+
+    @staticmethod
+    def _to_entry(row: sqlite3.Row) -> Dict:
+        """Convert a database row to an entry dictionary."""
+        entry = dict(row)
+        entry["ocr_data"] = json.loads(entry["ocr_data"])
+        if entry.get("lease_expires") is not None:
+            entry["lease_expires"] = datetime.fromtimestamp(entry["lease_expires"]).isoformat()
+        return entry
+
+    def verify_integrity(self) -> Dict[str, int]:
+        """Reconcile the database with the image files.
+
+        Pending entries whose image is missing are dropped, and image files that
+        belong to no entry, or staged uploads that were never queued, are removed.
+        Finally the running total of image bytes is recounted from the directory and
+        the image quota is enforced.
+
+        Returns:
+            Number of entries dropped and images removed, and the quota report
+        """
+        dropped = []
+        for row in self._query("SELECT id FROM entries WHERE status = 'pending'"):
+            if self.store.best_path(row["id"]) is None:
+                print(f"Warning: Dropping entry {row['id']} - missing image")
+                dropped.append(("DELETE FROM entries WHERE id = ? AND status = 'pending'", (row["id"],)))
+        if dropped:
+            self._write(dropped)
+
+        # Clean up orphaned images; recent files may belong to an entry still being added
+        recent = time.time() - ORPHAN_GRACE_SECONDS
+        entry_ids = {row["id"] for row in self._query("SELECT id FROM entries")}
+        removed = 0
         for filename in os.listdir(self.images_dir):
-            if not filename.endswith('.jpg'):
+            if self.store.entry_id(filename) in entry_ids:
                 continue
-                
-            file_path = os.path.join(self.images_dir, filename)
-            entry_id = os.path.splitext(filename)[0]
-            
-            if not any(e["id"] == entry_id for e in self.queue["entries"]):
+            try:
+                path = os.path.join(self.images_dir, filename)
+                if os.path.getmtime(path) > recent:
+                    continue
+                # add_entries holds the lock from moving an image in until its row is committed
+                with self._lock:
+                    if self._query("SELECT 1 FROM entries WHERE id = ?", (self.store.entry_id(filename),)):
+                        continue
+                    os.remove(path)
+                removed += 1
+                print(f"Removed orphaned image: {filename}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error removing orphaned image {filename}: {str(e)}")
+
+        # Staged uploads that were never queued, e.g. after a crash mid-request
+        with self._lock:
+            staged = set(self._staged)
+        for filename in os.listdir(self.incoming_dir):
+            path = os.path.join(self.incoming_dir, filename)
+            if path in staged:
+                continue
+            try:
+                if os.path.getmtime(path) <= time.time() - STAGED_GRACE_SECONDS:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+
+        # Corrects any drift, e.g. from derivatives lost to a crash mid-ingest
+        self._write([("UPDATE stats SET value = ? WHERE name = 'image_bytes'", (self.store.usage(),))])
+
+        report = {"entries_dropped": len(dropped), "images_removed": removed}
+        report.update(self.enforce_quota())
+        return report
+
+    def start_integrity_checks(self, interval_seconds: Optional[float] = None) -> threading.Event:
+        """Run verify_integrity now and then every interval in a daemon thread.
+
+        Args:
+            interval_seconds: Time between checks; OCR_QUEUE_CHECK_SECONDS, default 600
+
+        Returns:
+            Event that stops the checks when set
+        """
+        interval = interval_seconds if interval_seconds is not None else float(os.environ.get('OCR_QUEUE_CHECK_SECONDS', INTEGRITY_CHECK_SECONDS))
+        stop = threading.Event()
+
+        def run():
+            """Check until the process exits."""
+            while True:
                 try:
-                    os.remove(file_path)
-                    print(f"Removed orphaned image: {filename}")
+                    self.verify_integrity()
                 except Exception as e:
-                    print(f"Error removing orphaned image {filename}: {str(e)}")
-    
+                    print(f"Error verifying OCR queue: {str(e)}")
+                if stop.wait(interval):
+                    return
+        threading.Thread(target=run, daemon=True, name='ocr-queue-integrity').start()
+        return stop
+
+    def pending_by_hash(self, hashes: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Map the image hash of pending entries to their ID.
+
+        Args:
+            hashes: Only look up these hashes; all pending entries if None
+        """
+        if hashes is None:
+            rows = self._query("SELECT image_hash, id FROM entries WHERE status = 'pending' AND image_hash IS NOT NULL")
+        else:
+            hashes = list(set(hashes))
+            rows = []
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows += self._query(f"SELECT image_hash, id FROM entries WHERE status = 'pending' AND image_hash IN ({','.join('?' * len(chunk))})", chunk)
+        return {row["image_hash"]: row["id"] for row in rows}
+
+    def stage_upload(self, stream: BinaryIO) -> str:
+        """Write an uploaded image stream to a file in the queue directory, in chunks.
+
+        The file is kept from the integrity check until add_entries moves it into the
+        queue or discard_staged removes it.
+
+        Returns:
+            Path of the staged file, to pass to add_entries as "image_path"
+        """
+        (fd, path) = tempfile.mkstemp(suffix='.jpg', dir=self.incoming_dir)
+        with self._lock:
+            self._staged.add(path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(stream, f, CHUNK_SIZE)
+        except Exception:
+            self.discard_staged([path])
+            raise
+        return path
+
+    def discard_staged(self, paths: Iterable[str]):
+        """Remove staged uploads that were not queued; paths already moved into the queue are ignored."""
+        with self._lock:
+            for path in paths:
+                self._staged.discard(path)
+                if os.path.exists(path):
+                    os.remove(path)
+
     def add_entries(self, entries: List[Dict]) -> List[str]:
         """Add multiple OCR results to queue.
-        
+
+        An image that is already pending, e.g. uploaded twice, is not queued again;
+        the ID of the pending entry is returned for it instead.
+
+        Each entry carries its OCR result under "ocr_data" and its image either base64
+        encoded under "image", or as a file written by stage_upload under "image_path",
+        which is moved into the queue without being read again.
+
         Args:
             entries: List of dictionaries containing OCR results and images
-            
+
         Returns:
             List of entry IDs
         """
         entry_ids = []
-        
-        # Ensure images directory exists
-        os.makedirs(self.images_dir, exist_ok=True)
-        
-        for entry in entries:
-            entry_id = str(uuid.uuid4())
-            image_path = os.path.join(self.images_dir, f"{entry_id}.jpg")
-            
-            try:
-                # Save and verify image
-                image_data = base64.b64decode(entry.get("image", ""))
-                with open(image_path, "wb") as f:
-                    f.write(image_data)
-                
-                # Verify image was saved
-                if not os.path.exists(image_path):
-                    raise Exception("Image file not created")
-                
-                # Verify image can be read
-                with open(image_path, "rb") as f:
-                    _ = f.read()
-                
-                # Store metadata in queue
-                queue_entry = {
-                    "id": entry_id,
-                    "image_path": os.path.abspath(image_path),  # Store absolute path
-                    "ocr_data": entry.get("ocr_data", {}),
-                    "status": "pending",
-                    "upload_time": datetime.now().isoformat()
-                }
-                self.queue["entries"].append(queue_entry)
+        with self._lock:
+            digests = [entry.get("image_hash") or (hash_file(entry["image_path"]) if entry.get("image_path") else image_hash(entry.get("image", ""))) for entry in entries]
+            pending = self.pending_by_hash(digests)
+            staged = []
+            for (entry, digest) in zip(entries, digests):
+                if digest in pending:
+                    if entry.get("image_path"):
+                        self.discard_staged([entry["image_path"]])
+                    entry_ids.append(pending[digest])
+                    continue
+                entry_id = str(uuid.uuid4())
+                image_path = os.path.join(self.images_dir, f"{entry_id}.jpg")
+
+                try:
+                    # Save image
+                    if entry.get("image_path"):
+                        (image_path, size) = self.store.put(entry_id, source_path=entry["image_path"])
+                        self._staged.discard(entry["image_path"])
+                    else:
+                        (image_path, size) = self.store.put(entry_id, data=base64.b64decode(entry.get("image", "")))
+                except Exception as e:
+                    print(f"Error saving image for entry {entry_id}: {str(e)}")
+                    # Clean up if file was partially created
+                    if os.path.exists(image_path):
+                        os.remove(image_path)
+                    continue
+                staged.append((len(entry_ids), entry_id, image_path, digest, json.dumps(entry.get("ocr_data", {})), size))
+                pending[digest] = entry_id
                 entry_ids.append(entry_id)
-                
+
+            inserted = []
+            try:
+                with self._transaction() as connection:
+                    added = 0
+                    for (position, entry_id, image_path, digest, ocr_data, size) in staged:
+                        cursor = connection.execute(
+                            "INSERT INTO entries (id, image_path, image_hash, ocr_data, status, upload_time) VALUES (?, ?, ?, ?, 'pending', ?) "
+                            "ON CONFLICT (image_hash) WHERE status = 'pending' DO NOTHING",
+                            (entry_id, image_path, digest, ocr_data, datetime.now().isoformat())
+                        )
+                        if cursor.rowcount:
+                            inserted.append((entry_id, image_path, size))
+                            added += size
+                        else:
+                            # Another process queued the same image after it was looked up; share its entry
+                            row = connection.execute("SELECT id FROM entries WHERE status = 'pending' AND image_hash = ?", (digest,)).fetchone()
+                            entry_ids[position] = row["id"]
+                    connection.execute("UPDATE stats SET value = value + ? WHERE name = 'image_bytes'", (added,))
+            except Exception:
+                for (_, _, image_path, _, _, _) in staged:
+                    os.remove(image_path)
+                raise
+            for (position, entry_id, image_path, _, _, _) in staged:
+                if entry_ids[position] != entry_id:
+                    os.remove(image_path)
+
+        ingested = 0
+        for (entry_id, image_path, size) in inserted:
+            try:
+                ingested += sum(self.store.ingest(entry_id, image_path).values()) - size
             except Exception as e:
-                print(f"Error saving image for entry {entry_id}: {str(e)}")
-                # Clean up if file was partially created
-                if os.path.exists(image_path):
-                    try:
-                        os.remove(image_path)
-                    except Exception as cleanup_error:
-                        print(f"Error cleaning up image file: {str(cleanup_error)}")
-                continue
-        
-        self._update_stats()
-        self._save_queue()
+                # Review falls back to the original
+                print(f"Error creating derivatives for entry {entry_id}: {str(e)}")
+        self._add_image_bytes(ingested)
+        if inserted and self.store.quota_bytes is not None:
+            self.enforce_quota()
         return entry_ids
-    
-    def get_next_entry(self) -> Optional[Dict]:
-        """Get next pending entry from queue.
-        
+
+    def enforce_quota(self) -> Dict[str, int]:
+        """Evict the originals of the oldest pending entries until the images fit the store's quota."""
+        entry_ids = [row["id"] for row in self._query("SELECT id FROM entries WHERE status = 'pending' ORDER BY upload_time, rowid")] if self.store.quota_bytes is not None else []
+        report = self.store.enforce_quota(entry_ids, self._image_bytes())
+        self._add_image_bytes(report['bytes_after'] - report['bytes_before'])
+        return report
+
+    def get_entry(self, entry_id: str) -> Optional[Dict]:
+        """Get the metadata of an entry, without its image.
+
+        Args:
+            entry_id: ID of the entry
+
         Returns:
-            Dictionary containing entry data or None if queue is empty
+            The entry, or None if there is no entry with that ID
         """
-        pending_entries = [e for e in self.queue["entries"] if e["status"] == "pending"]
-        if not pending_entries:
-            return None
-        
-        entry = pending_entries[0]
-        
-        try:
-            # Verify image path is absolute
-            image_path = os.path.abspath(entry["image_path"])
-            
-            # Load image from file
-            try:
-                with open(image_path, "rb") as f:
-                    image_data = base64.b64encode(f.read()).decode()
-            except Exception as e:
-                print(f"Error loading image for entry {entry['id']}: {str(e)}")
-                image_data = ""  # Return empty string if image can't be loaded
-            
-            # Convert to API format
-            result = {
-                "id": entry["id"],
-                "image": image_data,
-                "ocr_data": entry["ocr_data"],
-                "status": entry["status"],
-                "upload_time": entry["upload_time"]
-            }
-            return result
-            
-        except Exception as e:
-            print(f"Error processing entry {entry['id']}: {str(e)}")
-            # Skip this entry by marking it as processed
-            self.mark_complete(entry["id"])
-            # Try next entry recursively
-            return self.get_next_entry()
-    
-    def mark_complete(self, entry_id: str):
-        """Mark entry as processed and optionally cleanup image.
-        
+        rows = self._query("SELECT * FROM entries WHERE id = ?", (entry_id,))
+        return self._to_entry(rows[0]) if rows else None
+
+    @staticmethod
+    def _to_api(entry: Dict) -> Dict:
+        """Convert an entry to the API format; the image is served separately from get_image_path."""
+        return {
+            "id": entry["id"],
+            "ocr_data": entry["ocr_data"],
+            "status": entry["status"],
+            "upload_time": entry["upload_time"],
+            "lease_expires": entry["lease_expires"]
+        }
+
+    def get_image_path(self, entry_id: str, variant: str = 'original') -> Optional[str]:
+        """Get an image file of a pending entry.
+
+        Args:
+            entry_id: ID of the entry
+            variant: 'original', 'review' or 'thumbnail'; the closest existing variant is returned if it is missing
+
+        Returns:
+            The path, or None if the entry is not pending or has no image
+        """
+        rows = self._query("SELECT id FROM entries WHERE id = ? AND status = 'pending'", (entry_id,))
+        return self.store.best_path(entry_id, variant) if rows else None
+
+    def claim(self, owner: str, count: int = 1, lease_seconds: Optional[float] = None) -> List[Dict]:
+        """Lease the oldest available pending entries to an operator.
+
+        Pending entries that are not leased, or whose lease expired, are available.
+        The claim is a single write transaction, so concurrent operators, threads and
+        worker processes never receive the same entry.
+
+        Args:
+            owner: The operator claiming the entries
+            count: Largest number of entries to claim
+            lease_seconds: Lease length; OCR_LEASE_SECONDS, default 300
+
+        Returns:
+            The claimed entries in upload order, without images
+        """
+        expires = time.time() + (lease_seconds or default_lease_seconds())
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT * FROM entries WHERE status = 'pending' AND (lease_expires IS NULL OR lease_expires <= ?) ORDER BY upload_time, rowid LIMIT ?",
+                (time.time(), count)
+            ).fetchall()
+            connection.executemany("UPDATE entries SET lease_owner = ?, lease_expires = ? WHERE id = ?", [(owner, expires, row["id"]) for row in rows])
+            # An entry still carrying an owner was abandoned and has come back to the queue
+            requeued = sum(1 for row in rows if row["lease_owner"] is not None)
+            if requeued:
+                connection.execute("UPDATE stats SET value = value + ? WHERE name = 'total_requeued'", (requeued,))
+        entries = [self._to_entry(row) for row in rows]
+        for entry in entries:
+            entry["lease_owner"] = owner
+            entry["lease_expires"] = datetime.fromtimestamp(expires).isoformat()
+        return entries
+
+    def extend_lease(self, entry_id: str, owner: str, lease_seconds: Optional[float] = None) -> Optional[str]:
+        """Extend an operator's lease on an entry, the heartbeat of a review in progress.
+
+        Args:
+            entry_id: ID of the leased entry
+            owner: The operator holding the lease
+            lease_seconds: New lease length from now; OCR_LEASE_SECONDS, default 300
+
+        Returns:
+            The new expiry, or None if the operator no longer holds the lease
+        """
+        expires = time.time() + (lease_seconds or default_lease_seconds())
+        with self._transaction() as connection:
+            # A lapsed lease can still be renewed as long as nobody else claimed the entry
+            updated = connection.execute(
+                "UPDATE entries SET lease_expires = ? WHERE id = ? AND status = 'pending' AND lease_owner = ?",
+                (expires, entry_id, owner)
+            ).rowcount
+        return datetime.fromtimestamp(expires).isoformat() if updated else None
+
+    def release(self, entry_id: str, owner: str) -> bool:
+        """Give up an operator's lease so the entry can be claimed right away.
+
+        Returns:
+            Whether the operator held the lease
+        """
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE entries SET lease_owner = NULL, lease_expires = NULL WHERE id = ? AND status = 'pending' AND lease_owner = ?",
+                (entry_id, owner)
+            ).rowcount > 0
+
+    def get_next_entry(self, owner: str = "anonymous", lease_seconds: Optional[float] = None) -> Optional[Dict]:
+        """Claim the next pending entry from queue.
+
+        Args:
+            owner: The operator claiming the entry
+            lease_seconds: Lease length; OCR_LEASE_SECONDS, default 300
+
+        Returns:
+            Dictionary containing entry data or None if no entry is available
+        """
+        claimed = self.claim(owner, 1, lease_seconds)
+        return self._to_api(claimed[0]) if claimed else None
+
+    def claim_entries(self, owner: str, count: int, lease_seconds: Optional[float] = None) -> List[Dict]:
+        """Claim up to count pending entries, in the API format of get_next_entry."""
+        return [self._to_api(entry) for entry in self.claim(owner, count, lease_seconds)]
+
+    def mark_complete(self, entry_id: str, owner: Optional[str] = None) -> bool:
+        """Mark entry as processed and cleanup its image.
+
         Args:
             entry_id: ID of the entry to mark as complete
+            owner: The operator completing it; refused while another operator holds a live lease
+
+        Returns:
+            Whether the entry was completed
         """
-        for entry in self.queue["entries"]:
-            if entry["id"] == entry_id and entry["status"] == "pending":
-                entry["status"] = "processed"
-                entry["processed_time"] = datetime.now().isoformat()
-                
-                # Remove image file to save space
-                try:
-                    if os.path.exists(entry["image_path"]):
-                        os.remove(entry["image_path"])
-                except Exception as e:
-                    print(f"Error removing image for entry {entry_id}: {str(e)}")
-                break
-                
-        self._update_stats()
-        self._save_queue()
-    
+        with self._transaction() as connection:
+            rows = connection.execute("SELECT lease_owner, lease_expires FROM entries WHERE id = ? AND status = 'pending'", (entry_id,)).fetchall()
+            if not rows:
+                return False
+            lease_owner = rows[0]["lease_owner"]
+            if owner is not None and lease_owner not in (None, owner) and rows[0]["lease_expires"] > time.time():
+                return False
+            connection.execute("UPDATE entries SET status = 'processed', processed_time = ?, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                               (datetime.now().isoformat(), entry_id))
+
+        # Remove image files to save space
+        try:
+            self._add_image_bytes(-self.store.delete(entry_id))
+        except Exception as e:
+            print(f"Error removing image for entry {entry_id}: {str(e)}")
+        return True
+
     def get_status(self) -> Dict:
         """Get queue statistics.
-        
+
+        Besides the counts, reports how many entries are leased, how many abandoned
+        leases were re-queued, the age of the oldest pending entry and the number of
+        entries processed over the last THROUGHPUT_WINDOW_SECONDS.
+
         Returns:
             Dictionary containing queue statistics
         """
-        self._update_stats()
-        return self.queue["stats"]
-    
+        now = datetime.now()
+        counts = {row["name"]: row["value"] for row in self._query("SELECT name, value FROM stats")}
+        last_processed = self._query("SELECT MAX(processed_time) AS value FROM entries WHERE status = 'processed'")[0]["value"]
+        oldest_pending = self._query("SELECT MIN(upload_time) AS value FROM entries WHERE status = 'pending'")[0]["value"]
+        leased = self._query("SELECT COUNT(*) AS value FROM entries WHERE status = 'pending' AND lease_expires > ?", (time.time(),))[0]["value"]
+        window_start = (now - timedelta(seconds=THROUGHPUT_WINDOW_SECONDS)).isoformat()
+        recently_processed = self._query("SELECT COUNT(*) AS value FROM entries WHERE status = 'processed' AND processed_time >= ?", (window_start,))[0]["value"]
+        return {
+            "total_processed": counts.get("total_processed", 0),
+            "total_pending": counts.get("total_pending", 0),
+            "last_processed": last_processed,
+            "total_leased": leased,
+            "total_requeued": counts.get("total_requeued", 0),
+            "oldest_pending_age_seconds": round((now - datetime.fromisoformat(oldest_pending)).total_seconds(), 1) if oldest_pending else None,
+            "processed_per_hour": recently_processed * 3600 / THROUGHPUT_WINDOW_SECONDS,
+            "image_bytes": counts.get("image_bytes", 0),
+            "image_quota_bytes": self.store.quota_bytes
+        }
+
     def clear_processed(self, days_old: int = 30):
         """Remove processed entries older than specified days.
-        
+
         Args:
             days_old: Remove processed entries older than this many days
         """
-        current_time = datetime.now()
-        new_entries = []
-        
-        for entry in self.queue["entries"]:
-            if entry["status"] != "processed":
-                new_entries.append(entry)
-                continue
-                
-            processed_time = datetime.fromisoformat(entry["processed_time"])
-            age = (current_time - processed_time).days
-            
-            if age < days_old:
-                new_entries.append(entry)
-            else:
-                # Remove image file if it exists
-                try:
-                    if "image_path" in entry and os.path.exists(entry["image_path"]):
-                        os.remove(entry["image_path"])
-                except Exception as e:
-                    print(f"Error removing image for entry {entry.get('id')}: {str(e)}")
-                    
-        self.queue["entries"] = new_entries
-        self._update_stats()
-        self._save_queue()
+        cutoff = (datetime.now() - timedelta(days=days_old)).isoformat()
+        with self._lock:
+            rows = self._query("SELECT id FROM entries WHERE status = 'processed' AND processed_time <= ?", (cutoff,))
+            self._write([("DELETE FROM entries WHERE id = ?", (row["id"],)) for row in rows])
+
+        for row in rows:
+            # Remove image files if they exist
+            try:
+                self._add_image_bytes(-self.store.delete(row["id"]))
+            except Exception as e:
+                print(f"Error removing image for entry {row['id']}: {str(e)}")
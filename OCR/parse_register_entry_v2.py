@@ -1,7 +1,9 @@
 import base64
 import os
 import sys
-from typing import Optional
+import threading
+import time
+from typing import Callable, Optional
 from datetime import datetime
 
 sys.path.append('../')
@@ -28,10 +30,21 @@ from langchain.output_parsers import PydanticOutputParser
 from dotenv import load_dotenv
 
 from Exceptions import DataError
-from .name_matcher import NameMatcher
+from .name_matcher import FuzzyMatch, NameMatcher
+from .name_corpus import get_name_corpus
+from .rate_limit import rate_limited
+from .llm_cache import cached
+from .circuit_breaker import LLMUnavailableError, guarded, llm_max_retries, llm_timeout_seconds
+from .result_cache import OCRResultCache, image_hash
+from .image_preprocess import preprocess_image, preprocess_enabled
+from .bill_number_rules import BillNumberRules, get_bill_number_rules
 
 load_dotenv()
 
+# How long each LLM stage may take before it fails or degrades instead of holding the worker
+EXTRACT_DEADLINE_SECONDS = float(os.environ.get('OCR_EXTRACT_DEADLINE_SECONDS', '45'))
+BILL_NUMBER_DEADLINE_SECONDS = float(os.environ.get('OCR_BILL_NUMBER_DEADLINE_SECONDS', '10'))
+
 class InvoiceData(BaseModel):
     """Data model for invoice information."""
     supplier_name: str = Field(description="Raw OCR text for supplier name")
@@ -43,18 +56,29 @@ class InvoiceData(BaseModel):
     amount: int = Field(description="Total amount")
 
 class InvoiceParser:
-    def __init__(self):
-        """Initialize the invoice parser with LangChain components."""
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is required")
-
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=api_key,
-            max_tokens=300,
-            temperature=0
-        )
+    def __init__(self, llm=None, rules: Optional[BillNumberRules] = None):
+        """Initialize the invoice parser with LangChain components.
+        
+        Args:
+            llm: Chat model to use instead of the default OpenAI client
+            rules: Bill number rules to use instead of the shared ones
+        """
+        if llm is None:
+            api_key = os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is required")
+
+            llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                api_key=api_key,
+                max_tokens=300,
+                temperature=0,
+                timeout=llm_timeout_seconds(),
+                max_retries=llm_max_retries()
+            )
+        # Cache outside the rate limit, so repeated prompts neither wait nor call the API
+        self.llm = cached(rate_limited(guarded(llm)))
+        self.rules = rules if rules is not None else get_bill_number_rules()
         
         self.output_parser = PydanticOutputParser(pydantic_object=InvoiceData)
         self.prompt = self._create_prompt()
@@ -96,6 +120,8 @@ class InvoiceParser:
     def process_bill_number(self, bill_number: str, supplier_name: str) -> str:
         """Process bill number using AI to extract the core numeric identifier.
         
+        The LLM is only asked when no learned rule of the supplier fits the format.
+        
         Args:
             bill_number: The original bill number from OCR
             
@@ -105,6 +131,12 @@ class InvoiceParser:
         # If it's already purely numeric, return as is
         if bill_number.isdigit():
             return bill_number
+        
+        # A learned rule for the supplier's format saves the LLM call
+        learned = self.rules.apply(supplier_name, bill_number)
+        if learned:
+            print(f"Bill number {bill_number} -> {learned} by learned rule")
+            return learned
             
         try:
             # Debug output
@@ -128,7 +160,7 @@ class InvoiceParser:
             )
             
             # Get AI response
-            response = self.llm.invoke(messages)
+            response = self.llm.invoke(messages, timeout=BILL_NUMBER_DEADLINE_SECONDS)
             processed_number = response.content.strip()
             
             # Debug output
@@ -136,6 +168,10 @@ class InvoiceParser:
             
             return processed_number if processed_number else bill_number
             
+        except LLMUnavailableError as e:
+            print(f"LLM unavailable, keeping bill number as read: {str(e)}")
+            self.llm.breaker.record_fallback('bill_number')
+            return bill_number
         except Exception as e:
             print(f"Error processing bill number: {str(e)}")
             return bill_number
@@ -161,12 +197,22 @@ class InvoiceParser:
 
     def encode_image(self, image_path: str) -> str:
         """Encode an image file to base64 string."""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return encode_image(image_path)
 
-    def parse_invoice(self, encoded_image: str) -> dict:
-        """Parse invoice information from a base64 encoded image."""
+    def parse_invoice(self, encoded_image: str, process_bill_number: bool = True) -> dict:
+        """Parse invoice information from a base64 encoded image.
+        
+        Args:
+            encoded_image: The base64 encoded JPEG
+            process_bill_number: Normalize the bill number here; callers running the
+                stages concurrently pass False and call process_bill_number themselves
+        """
         try:
+            # Shrink phone photos to the bill at a resolution the model can read
+            if preprocess_enabled():
+                (encoded_image, report) = preprocess_image(encoded_image)
+                print(f"Image preprocessing: {report}")
+
             # Prepare the message with image
             messages = self.prompt.format_messages()
             messages[1].content = [
@@ -183,14 +229,21 @@ class InvoiceParser:
             ]
 
             # Get response from LLM
-            response = self.llm.invoke(messages)
+            response = self.llm.invoke(messages, timeout=EXTRACT_DEADLINE_SECONDS)
             
             # Parse and validate the response
-            parsed_data = self.output_parser.parse(response.content)
+            try:
+                parsed_data = self.output_parser.parse(response.content)
+            except Exception:
+                # Do not let a malformed response answer the next attempt too
+                self.llm.forget(messages)
+                raise
             
             # Convert to dict and process bill number
             result = parsed_data.model_dump()
-            if result.get('bill_number'):
+            # Keep the bill number as read, so confirmed results can teach the supplier's format
+            result['raw_bill_number'] = result.get('bill_number')
+            if process_bill_number and result.get('bill_number'):
                 result['bill_number'] = self.process_bill_number(
                     result['bill_number'],
                     result.get('supplier_name', '')  # Pass supplier name for context
@@ -202,48 +255,141 @@ class InvoiceParser:
             print(f"Error parsing invoice: {str(e)}")
             raise DataError({"status": "error", "message": f"Error parsing invoice: {str(e)}"})
 
-def parse_register_entry(encoded_image: str, cache_file: Optional[str] = None, queue_mode: bool = False) -> dict:
-    """Main function to parse register entries from images."""
+_instances = {}
+_instances_lock = threading.Lock()
+
+def _get_instance(name: str, factory):
+    """Return the process-wide instance stored under name, creating it on first use."""
+    instance = _instances.get(name)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+def get_invoice_parser() -> InvoiceParser:
+    """Return the shared InvoiceParser, created on first use."""
+    return _get_instance('invoice_parser', InvoiceParser)
+
+def get_name_matcher() -> NameMatcher:
+    """Return the shared NameMatcher, created on first use."""
+    return _get_instance('name_matcher', NameMatcher)
+
+def get_result_cache() -> OCRResultCache:
+    """Return the shared OCR result cache, created on first use."""
+    return _get_instance('result_cache', OCRResultCache)
+
+def cached_ocr(encoded_image: str, compute: Callable[[], dict], cache: Optional[OCRResultCache] = None) -> dict:
+    """Return the cached OCR result for an image, or compute and cache it.
+    
+    Args:
+        encoded_image: The base64 encoded image, hashed to find its cached result
+        compute: Runs the OCR pipeline on a miss
+        cache: Cache to use instead of the shared one
+    """
+    cache = cache or get_result_cache()
+    key = image_hash(encoded_image)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"\n=== OCR Cache Hit === {key}")
+        return cached
+    result = compute()
+    # Fuzzy-only matches are provisional; the next upload should verify them
+    if result.get('match_mode') != 'fuzzy_only':
+        cache.set(key, result)
+    return result
+
+def reset_instances():
+    """Drop the shared instances so the next call builds new ones, e.g. after the API key changed."""
+    with _instances_lock:
+        _instances.clear()
+
+def warmup() -> dict:
+    """Create the shared parser and matcher and load the name corpora ahead of the first invoice.
+    
+    Failures are reported rather than raised so the app can start without OCR configured.
+    
+    Returns:
+        Dictionary with the seconds each step took, or its error
+    """
+    steps = {
+        'invoice_parser': get_invoice_parser,
+        'name_matcher': get_name_matcher,
+        'supplier_names': lambda: get_name_corpus('supplier'),
+        'party_names': lambda: get_name_corpus('party'),
+    }
+    report = {}
+    for (step, run) in steps.items():
+        start = time.perf_counter()
+        try:
+            run()
+            report[step] = round(time.perf_counter() - start, 4)
+        except Exception as e:
+            report[step] = f"error: {str(e)}"
+    print(f"OCR warmup: {report}")
+    return report
+
+def set_matched_name(result: dict, field: str, matched: Optional[str]):
+    """Store the matched 'supplier' or 'party' name, or the OCR text if there is none, and flag fuzzy-only matches."""
+    result[f'{field}_name_matched'] = str(matched) if matched else result[f'{field}_name']
+    if isinstance(matched, FuzzyMatch):
+        # Flag the guess for the reviewer, with how similar the names were
+        result['match_mode'] = 'fuzzy_only'
+        result[f'{field}_match_confidence'] = round(matched.confidence, 3)
+
+def _parse_and_match(encoded_image: str) -> dict:
+    """Run the OCR pipeline: extract the invoice, then match the supplier and party names."""
+    # Parse invoice using OCR
+    parser = get_invoice_parser()
+    result = parser.parse_invoice(encoded_image)
+    
+    # Debug output for OCR result
+    print("\n=== OCR Output ===")
+    print(f"Raw OCR result: {result}")
+    
+    # Get the shared name matcher
+    matcher = get_name_matcher()
+    
+    # Debug output before name matching
+    print("\n=== Name Matching ===")
+    print(f"Original supplier name: {result.get('supplier_name')}")
+    print(f"Original party name: {result.get('party_name')}")
+    
+    # Match the supplier and party names present, verifying both with one LLM request
+    fields = [field for field in ('supplier', 'party') if result.get(f'{field}_name')]
+    matches = matcher.find_matches([(result[f'{field}_name'], field) for field in fields])
+    for (field, matched) in zip(fields, matches):
+        set_matched_name(result, field, matched)
+    
+    # Debug output after name matching
+    print("\n=== Final Results ===")
+    print(f"Matched supplier name: {result.get('supplier_name_matched', 'No match')}")
+    print(f"Matched party name: {result.get('party_name_matched', 'No match')}")
+    return result
+
+def parse_register_entry(encoded_image: str, cache_file: Optional[str] = None, queue_mode: bool = False, queue=None, image_path: Optional[str] = None) -> dict:
+    """Main function to parse register entries from images.
+    
+    Re-uploads of the same image are answered from the OCR result cache.
+    
+    Args:
+        encoded_image: The base64 encoded image
+        queue_mode: Add the result to the OCR queue
+        queue: OCRQueue to add to instead of the default one
+        image_path: The image as a file staged by the queue, moved in instead of decoding encoded_image
+    """
     try:
-        # Parse invoice using OCR
-        parser = InvoiceParser()
-        result = parser.parse_invoice(encoded_image)
-        
-        # Debug output for OCR result
-        print("\n=== OCR Output ===")
-        print(f"Raw OCR result: {result}")
-        
-        # Initialize name matcher
-        matcher = NameMatcher()
-        
-        # Debug output before name matching
-        print("\n=== Name Matching ===")
-        print(f"Original supplier name: {result.get('supplier_name')}")
-        print(f"Original party name: {result.get('party_name')}")
-        
-        # Match supplier name if present
-        if result.get('supplier_name'):
-            matched_supplier = matcher.find_match(result['supplier_name'], 'supplier')
-            result['supplier_name_matched'] = matched_supplier if matched_supplier else result['supplier_name']
-        
-        # Match party name if present
-        if result.get('party_name'):
-            matched_party = matcher.find_match(result['party_name'], 'party')
-            result['party_name_matched'] = matched_party if matched_party else result['party_name']
-        
-        # Debug output after name matching
-        print("\n=== Final Results ===")
-        print(f"Matched supplier name: {result.get('supplier_name_matched', 'No match')}")
-        print(f"Matched party name: {result.get('party_name_matched', 'No match')}")
+        result = cached_ocr(encoded_image, lambda: _parse_and_match(encoded_image))
         
         # If queue mode is enabled, store in OCR queue
         if queue_mode:
-            from .ocr_queue import OCRQueue
-            queue = OCRQueue()
-            entry = {
-                "image": encoded_image,
-                "ocr_data": result
-            }
+            if queue is None:
+                from .ocr_queue import OCRQueue
+                queue = OCRQueue()
+            entry = {"image_path": image_path} if image_path else {"image": encoded_image}
+            entry["ocr_data"] = result
             entry_ids = queue.add_entries([entry])
             result["queue_entry_id"] = entry_ids[0]
             print("\n=== Queue Status ===")
@@ -254,11 +400,10 @@ def parse_register_entry(encoded_image: str, cache_file: Optional[str] = None, q
         print(f"Error in parse_register_entry: {str(e)}")
         raise DataError({"status": "error", "message": f"Error processing invoice: {str(e)}"})
 
-# Keep the encode_image function at module level for backward compatibility
 def encode_image(image_path: str) -> str:
     """Encode an image file to base64 string."""
-    parser = InvoiceParser()
-    return parser.encode_image(image_path)
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
 
 # Example usage:
 # encoded_image = encode_image("path/to/image.jpg")
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """A thread-safe token bucket limiting how often an operation may start.
+
+    Tokens refill continuously at rate per second up to capacity; acquire blocks
+    until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Initialize the bucket full.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Largest burst allowed; defaults to one second of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens, waiting for them if needed.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class RateLimitedLLM:
+    """Wraps a chat model so every invoke first takes a token from a shared bucket."""
+
+    def __init__(self, llm, limiter: TokenBucket):
+        """Initialize the wrapper.
+
+        Args:
+            llm: The chat model to call
+            limiter: Bucket shared by every model calling the same API
+        """
+        self.llm = llm
+        self.limiter = limiter
+
+    def invoke(self, messages, *args, **kwargs):
+        """Wait for the rate limit, then invoke the model."""
+        self.limiter.acquire()
+        return self.llm.invoke(messages, *args, **kwargs)
+
+    def __getattr__(self, name):
+        """Expose the wrapped model's other attributes."""
+        return getattr(self.llm, name)
+
+_llm_limiter = None
+_llm_limiter_lock = threading.Lock()
+
+def get_llm_limiter() -> TokenBucket:
+    """Return the process-wide bucket for LLM calls.
+
+    The rate comes from OCR_LLM_REQUESTS_PER_SECOND (default 5) and the burst from
+    OCR_LLM_BURST (default 10).
+    """
+    global _llm_limiter
+    with _llm_limiter_lock:
+        if _llm_limiter is None:
+            rate = float(os.environ.get('OCR_LLM_REQUESTS_PER_SECOND', '5'))
+            burst = float(os.environ.get('OCR_LLM_BURST', '10'))
+            _llm_limiter = TokenBucket(rate, burst)
+        return _llm_limiter
+
+def rate_limited(llm) -> RateLimitedLLM:
+    """Wrap a chat model with the process-wide LLM rate limit."""
+    if isinstance(llm, RateLimitedLLM):
+        return llm
+    return RateLimitedLLM(llm, get_llm_limiter())
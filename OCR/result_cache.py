@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+def image_hash(encoded_image: str) -> str:
+    """Return the SHA-256 of the decoded image bytes, the key shared by the result cache and the OCR queue."""
+    return hashlib.sha256(base64.b64decode(encoded_image or "")).hexdigest()
+
+class OCRResultCache:
+    """A disk cache of OCR results keyed by the hash of the image.
+
+    Each result is its own small JSON file written atomically, so several processes can
+    share the directory. Entries expire after ttl_seconds, and once the cache holds more
+    than max_entries the least recently written ones are evicted.
+    """
+
+    def __init__(self, cache_dir: str = "data/ocr_result_cache", ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding one file per cached result
+            ttl_seconds: Age after which a result is ignored; OCR_RESULT_CACHE_TTL_SECONDS, default 7 days
+            max_entries: Largest number of results kept; OCR_RESULT_CACHE_MAX_ENTRIES, default 5000
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.environ.get('OCR_RESULT_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get('OCR_RESULT_CACHE_MAX_ENTRIES', 5000))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = len(self._files())
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        """Return the file holding the result for a key."""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _files(self):
+        """List the cached result files."""
+        return [name for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result for an image hash, or None if missing or expired."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                self._remove(path)
+                result = None
+            else:
+                with open(path, 'r') as f:
+                    result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def set(self, key: str, result: Dict):
+        """Store the result for an image hash, evicting old results if the cache is full."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if not existed:
+                self._entries += 1
+            full = self._entries > self.max_entries
+        if full:
+            self._evict()
+
+    def delete(self, key: str):
+        """Drop the cached result for a key, if any."""
+        self._remove(self._path(key))
+
+    def _remove(self, path: str):
+        """Delete a cached result file if it is still there."""
+        try:
+            os.remove(path)
+            with self._lock:
+                self._entries -= 1
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Drop expired results, then the oldest ones until the cache is at 90% of max_entries."""
+        now = time.time()
+        files = []
+        for name in self._files():
+            path = os.path.join(self.cache_dir, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        keep = int(self.max_entries * 0.9)
+        removed = 0
+        for (index, (mtime, path)) in enumerate(files):
+            if now - mtime <= self.ttl_seconds and len(files) - index <= keep:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._entries = len(files) - removed
+            self.evictions += removed
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache performance statistics.
+
+        Returns:
+            Dictionary containing cache statistics
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "total_entries": self._entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total > 0 else 0
+            }
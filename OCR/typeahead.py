@@ -0,0 +1,88 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from typing import Dict, List, Tuple
+
+# Share of the query's trigrams a name must contain to be suggested as a fuzzy match
+MIN_TRIGRAM_SHARE = 0.5
+# Trigrams in more names than this are too common to count
+MAX_TRIGRAM_NAMES = 2000
+
+def compact(text: str) -> str:
+    """Lowercase text without spaces or punctuation, so 'V.K. Fab' and 'vk fab' compare equal."""
+    return re.sub(r'[\W_]+', '', (text or '').lower())
+
+def trigrams(text: str) -> set:
+    """The trigrams of compacted text, padded so short words still have some."""
+    padded = f'  {compact(text)} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TypeaheadIndex:
+    """Suggestions for a picker, answered from memory.
+
+    Names whose start matches the query come first, then names with a later word that
+    does, each group in alphabetical order; both are ranges of a sorted array found with
+    bisect. If they are fewer than requested, names sharing most of the query's trigrams
+    fill the rest, so small typos still find the name.
+    """
+
+    def __init__(self, names: List[str]):
+        """Index names by position.
+
+        Args:
+            names: The names, in corpus order
+        """
+        full = sorted((compact(name), position) for (position, name) in enumerate(names))
+        words = []
+        for (position, name) in enumerate(names):
+            tokens = re.findall(r'\w+', name.lower())
+            words.extend((compact(' '.join(tokens[i:])), position) for i in range(1, len(tokens)))
+        words.sort()
+        (self._full_keys, self._full_positions) = ([key for (key, _) in full], [position for (_, position) in full])
+        (self._word_keys, self._word_positions) = ([key for (key, _) in words], [position for (_, position) in words])
+        self._trigrams: Dict[str, List[int]] = {}
+        for (position, name) in enumerate(names):
+            for trigram in trigrams(name):
+                self._trigrams.setdefault(trigram, []).append(position)
+
+    @staticmethod
+    def _prefix_range(keys: List[str], positions: List[int], prefix: str, found: Dict[int, str], limit: int, kind: str):
+        """Add positions whose key starts with the prefix, in key order, until limit are found."""
+        index = bisect_left(keys, prefix)
+        while len(found) < limit and index < len(keys) and keys[index].startswith(prefix):
+            found.setdefault(positions[index], kind)
+            index += 1
+
+    def _fuzzy(self, query: str, found: Dict[int, str], limit: int):
+        """Add the names sharing most of the query's trigrams, until limit are found.
+
+        Trigrams in more than MAX_TRIGRAM_NAMES names say little about which name was meant
+        and would dominate the time, so they are left out of the count.
+        """
+        postings = [self._trigrams.get(trigram, ()) for trigram in trigrams(query)
+                    if len(self._trigrams.get(trigram, ())) <= MAX_TRIGRAM_NAMES]
+        if not postings:
+            return
+        needed = MIN_TRIGRAM_SHARE * len(postings)
+        shared = Counter(chain.from_iterable(postings))
+        best = heapq.nlargest(limit, (position for (position, count) in shared.items() if count >= needed and position not in found),
+                              key=lambda position: (shared[position], -position))
+        for position in best[:limit - len(found)]:
+            found[position] = 'fuzzy'
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Suggest names for a query.
+
+        Returns:
+            (position, 'prefix', 'word' or 'fuzzy') of at most limit names, best first
+        """
+        prefix = compact(query)
+        found: Dict[int, str] = {}
+        self._prefix_range(self._full_keys, self._full_positions, prefix, found, limit, 'prefix')
+        if prefix:
+            self._prefix_range(self._word_keys, self._word_positions, prefix, found, limit, 'word')
+        if len(found) < limit and len(prefix) >= 3:
+            self._fuzzy(query, found, limit)
+        return list(found.items())
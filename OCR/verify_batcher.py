@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+class VerificationBatcher:
+    """Coalesces name verifications requested at about the same time into one call.
+
+    The first request of a batch waits window_seconds for others to join, then runs the
+    whole batch; a batch that reaches max_size runs at once. Every caller gets a future
+    for its own answer, so concurrent find_match calls, e.g. the supplier and party of
+    an invoice or several invoices of a batch upload, share one LLM request.
+    """
+
+    def __init__(self, verify_many: Callable[[List[Tuple[str, List[str]]]], List[Optional[str]]], max_size: int, window_seconds: float):
+        """Initialize the batcher.
+
+        Args:
+            verify_many: Verifies (query, candidates) pairs, returning one answer per pair
+            max_size: Largest number of requests run together
+            window_seconds: How long the first request of a batch waits for others
+        """
+        self.verify_many = verify_many
+        self.max_size = max_size
+        self.window_seconds = window_seconds
+        self._pending: List[Tuple[str, List[str], Future]] = []
+        self._lock = threading.Lock()
+
+    def _take(self) -> List[Tuple[str, List[str], Future]]:
+        """Remove up to max_size pending requests; the caller holds the lock."""
+        (batch, self._pending) = (self._pending[:self.max_size], self._pending[self.max_size:])
+        return batch
+
+    def _run(self, batch: List[Tuple[str, List[str], Future]]):
+        """Verify a batch and resolve the futures of its requests."""
+        if not batch:
+            return
+        try:
+            answers = self.verify_many([(query, candidates) for (query, candidates, _) in batch])
+        except Exception as e:
+            for (_, _, future) in batch:
+                future.set_exception(e)
+            return
+        for ((_, _, future), answer) in zip(batch, answers):
+            future.set_result(answer)
+
+    def submit(self, query: str, candidates: List[str]) -> Future:
+        """Request the verification of a query against its candidates.
+
+        Returns:
+            Future resolving to the verified match or None
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((query, candidates, future))
+            leader = len(self._pending) == 1
+            batch = self._take() if len(self._pending) >= self.max_size else None
+        if batch:
+            self._run(batch)
+        elif leader:
+            time.sleep(self.window_seconds)
+            with self._lock:
+                batch = self._take()
+            self._run(batch)
+        return future
@@ -4,6 +4,11 @@ import tempfile
 from Individual import Supplier, Party
 from hca_backend.OCR.name_cache import NameMatchCache
 
+# Importing the app must not start the OCR warmup against real services
+os.environ.setdefault('OCR_WARMUP', 'false')
+# Stub models count their calls, so responses must not be served from an earlier run
+os.environ.setdefault('OCR_LLM_CACHE', 'false')
+
 @pytest.fixture
 def temp_cache_dir():
     """Create a temporary directory for cache files."""
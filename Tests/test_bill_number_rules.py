@@ -0,0 +1,77 @@
+import threading
+from types import SimpleNamespace
+from OCR.bill_number_rules import BillNumberRules, learn_pattern
+from OCR.parse_register_entry_v2 import InvoiceParser
+
+class CountingLLM:
+    """Answers the bill number prompt with a fixed number and counts the calls."""
+
+    def __init__(self, answer='999'):
+        """Initializes the stub with its answer."""
+        self.answer = answer
+        self.calls = 0
+
+    def invoke(self, messages):
+        """Returns the fixed answer."""
+        self.calls += 1
+        return SimpleNamespace(content=self.answer)
+
+def test_learn_pattern_captures_confirmed_run():
+    """The confirmed digit run is captured and the year suffix matches any digits."""
+    assert learn_pattern('RF/123/23-24', '123') == r'^RF/(\d+)/\d+\-\d+$'
+    assert learn_pattern('INV-0042', '42') == r'^INV\-(\d+)$'
+    assert learn_pattern('RF/123', '456') is None
+
+def test_rule_used_after_confirmations(tmp_path):
+    """A format confirmed twice answers new bill numbers of the supplier without the LLM."""
+    rules = BillNumberRules(str(tmp_path / 'rules.json'))
+    rules.learn(['Rachit Fashion'], 'RF/101/23-24', '101')
+    assert rules.apply('Rachit Fashion', 'RF/102/23-24') is None
+    rules.learn(['Rachit Fashion'], 'RF/102/23-24', '102')
+    assert rules.apply('rachit fashion pvt ltd', 'rf/103/24-25') == '103'
+    assert rules.apply('Other Supplier', 'RF/103/24-25') is None
+    assert rules.get_stats()['llm_calls_avoided'] == 1
+
+def test_contradicted_rule_is_dropped(tmp_path):
+    """A rule that extracted the wrong number for a confirmed bill is no longer used."""
+    rules = BillNumberRules(str(tmp_path / 'rules.json'))
+    rules.learn(['Supplier'], 'A/1/7', '1')
+    rules.learn(['Supplier'], 'A/2/7', '2')
+    rules.learn(['Supplier'], 'A/3/8', '8')
+    assert rules.apply('Supplier', 'A/4/9') is None
+
+def test_rules_persist(tmp_path):
+    """Rules learned by one instance are read by another using the same file."""
+    path = str(tmp_path / 'rules.json')
+    writer = BillNumberRules(path, min_confirmations=1)
+    reader = BillNumberRules(path, min_confirmations=1)
+    writer.learn_from_ocr({'supplier_name': 'Supplier', 'raw_bill_number': 'X-5', 'bill_number': '5'}, '5')
+    assert reader.apply('Supplier', 'X-6') == '6'
+
+def test_llm_bill_number_is_not_learned(tmp_path):
+    """Without a bill number from the operator, the OCR result's own guess teaches nothing."""
+    rules = BillNumberRules(str(tmp_path / 'rules.json'), min_confirmations=1)
+    rules.learn_from_ocr({'supplier_name': 'Supplier', 'raw_bill_number': 'X-5', 'bill_number': '5'})
+    assert rules.rules == {}
+
+def test_concurrent_writers_keep_each_others_rules(tmp_path):
+    """Workers learning at the same time all end up in the file."""
+    path = str(tmp_path / 'rules.json')
+    writers = [BillNumberRules(path, min_confirmations=1) for _ in range(4)]
+    threads = [threading.Thread(target=writer.learn, args=([f'Supplier {i}'], f'S/{i + 10}', str(i + 10))) for (i, writer) in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(BillNumberRules(path).rules) == 4
+
+def test_parser_skips_llm_with_rule(tmp_path):
+    """process_bill_number only calls the LLM when no confident rule fits."""
+    llm = CountingLLM()
+    rules = BillNumberRules(str(tmp_path / 'rules.json'), min_confirmations=1)
+    rules.learn(['Supplier'], 'S/10', '10')
+    parser = InvoiceParser(llm=llm, rules=rules)
+    assert parser.process_bill_number('S/11', 'Supplier') == '11'
+    assert llm.calls == 0
+    assert parser.process_bill_number('T-11', 'Supplier') == '999'
+    assert llm.calls == 1
@@ -0,0 +1,152 @@
+import pytest
+from datetime import datetime
+from Entities import RegisterEntry
+from psql import db_connector
+
+class ScriptedCursor:
+    """A stand-in cursor that records statements and answers the bulk import's queries."""
+
+    def __init__(self, existing, rejected):
+        """Initializes the cursor with the existing bills to report and the number of rows expected to be rejected."""
+        self.existing = existing
+        self.rejected = rejected
+        self.statements = []
+        self.copied = []
+        self.description = []
+        self.rowcount = 0
+        self.last = ''
+
+    def execute(self, query):
+        """Records the executed statement."""
+        self.statements.append(query)
+        self.last = query
+
+    def copy_expert(self, sql, buffer):
+        """Records the rows loaded through COPY."""
+        self.statements.append(sql)
+        self.copied = buffer.read().splitlines()
+        self.rowcount = len(self.copied)
+
+    def fetchall(self):
+        """Answers the validation queries and returns ids for the INSERT."""
+        if 'missing_supplier' in self.last:
+            return []
+        if 'FROM register_entry r' in self.last:
+            return self.existing
+        if self.last.strip().startswith('INSERT INTO register_entry'):
+            return [{'id': 100 + i} for i in range(len(self.copied) - self.rejected)]
+        return [{'id': 1}]
+
+class FakeConnection:
+    """A stand-in connection that counts commits."""
+
+    def __init__(self):
+        """Initializes the commit counter."""
+        self.commits = 0
+
+    def commit(self):
+        """Counts a commit."""
+        self.commits += 1
+
+    def rollback(self):
+        """Rollbacks are not expected in these tests."""
+        raise AssertionError('unexpected rollback')
+
+    def close(self):
+        """Closing is a no-op for the stand-in connection."""
+        pass
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Routes database access to a scripted cursor reporting one duplicate bill."""
+    cursor = ScriptedCursor(existing=[{'supplier_id': 1, 'party_id': 2, 'bill_number': 501, 'register_date': datetime(2024, 4, 1)}], rejected=1)
+    connection = FakeConnection()
+    monkeypatch.setattr(db_connector, 'cursor', lambda dict=False: (connection, cursor))
+    monkeypatch.setenv('QUERY_REMOTE', 'false')
+    return connection, cursor
+
+def test_bulk_insert_reports_per_row_errors(fake_db):
+    """Valid rows are loaded with COPY and inserted together while bad rows are reported by position."""
+    (connection, cursor) = fake_db
+    rows = [{'bill_number': str(500 + i), 'amount': '1000', 'supplier_id': 1, 'party_id': 2, 'register_date': '2024-04-01'} for i in range(4)]
+    rows.append({'bill_number': '600', 'amount': '1000', 'supplier_id': 1, 'party_id': 2, 'register_date': 'not a date'})
+    ret = RegisterEntry.bulk_insert(rows)
+    assert ret['status'] == 'okay'
+    assert ret['total'] == 5
+    assert ret['inserted'] == 3
+    assert [error['row'] for error in ret['errors']] == [1, 4]
+    assert ret['errors'][0]['message'] == 'Duplicate Bill Number'
+    assert ret['rows_per_second'] > 0
+    assert len(cursor.copied) == 4
+    assert any(('NOT IN (1)' in statement for statement in cursor.statements))
+    assert connection.commits == 1
+
+def test_bulk_insert_statement_count_is_constant(fake_db):
+    """The number of statements does not grow with the size of the batch."""
+    (connection, cursor) = fake_db
+    rows = [{'bill_number': str(i), 'amount': '1000', 'supplier_id': 1, 'party_id': 2, 'register_date': '2024-04-01'} for i in range(200)]
+    RegisterEntry.bulk_insert(rows)
+    assert len(cursor.copied) == 200
+    assert len(cursor.statements) <= 7
+
+def test_bulk_insert_rejects_clashes_within_batch(monkeypatch):
+    """A bill repeated inside the batch less than six months apart is rejected after its first occurrence."""
+    cursor = ScriptedCursor(existing=[], rejected=1)
+    connection = FakeConnection()
+    monkeypatch.setattr(db_connector, 'cursor', lambda dict=False: (connection, cursor))
+    monkeypatch.setenv('QUERY_REMOTE', 'false')
+    rows = [{'bill_number': '700', 'amount': '1000', 'supplier_id': 1, 'party_id': 2, 'register_date': date} for date in ('2024-01-10', '2024-03-10', '2024-09-10')]
+    ret = RegisterEntry.bulk_insert(rows)
+    assert [error['row'] for error in ret['errors']] == [1]
+    assert ret['errors'][0]['message'] == 'Duplicate Bill Number too close in time'
+    assert ret['inserted'] == 2
+
+def test_bulk_insert_without_rejections_selects_every_row(monkeypatch):
+    """A fully valid batch inserts every staged row, with no NOT IN filter that would match none."""
+    cursor = ScriptedCursor(existing=[], rejected=0)
+    connection = FakeConnection()
+    monkeypatch.setattr(db_connector, 'cursor', lambda dict=False: (connection, cursor))
+    monkeypatch.setenv('QUERY_REMOTE', 'false')
+    rows = [{'bill_number': str(300 + i), 'amount': '1000', 'supplier_id': 1, 'party_id': 2, 'register_date': '2024-04-01'} for i in range(3)]
+    ret = RegisterEntry.bulk_insert(rows)
+    assert (ret['inserted'], ret['errors']) == (3, [])
+    [insert] = [statement for statement in cursor.statements if statement.strip().startswith('INSERT INTO register_entry')]
+    assert 'WHERE' not in insert and 'NULL' not in insert
+
+def test_bulk_insert_marks_order_forms_once(fake_db):
+    """Order forms are marked delivered with one statement using the latest new bill of each pair."""
+    (connection, cursor) = fake_db
+    rows = [{'bill_number': str(800 + i), 'amount': '1000', 'supplier_id': 1, 'party_id': 2 + i % 2, 'register_date': f'2024-05-0{i + 1}'} for i in range(4)]
+    RegisterEntry.bulk_insert(rows)
+    updates = [statement for statement in cursor.statements if statement.strip().startswith('UPDATE order_form')]
+    assert len(updates) == 1
+    assert "(1, 2, TIMESTAMP '2024-05-03')" in updates[0]
+    assert "(1, 3, TIMESTAMP '2024-05-04')" in updates[0]
+    assert 'o.delivered = false' in updates[0]
+
+def test_bulk_insert_audits_and_replicates_each_entry(fake_db, monkeypatch):
+    """Every imported entry gets its own audit row, and the remote replay keeps the audit columns."""
+    (connection, cursor) = fake_db
+    replayed = []
+    monkeypatch.setattr(db_connector, '_resolve_current_user_id', lambda user_id: 7)
+    monkeypatch.setattr(db_connector, 'exec_in_available_thread', lambda function, queries: replayed.extend(queries))
+    monkeypatch.setenv('QUERY_REMOTE', 'true')
+    original_fetchall = cursor.fetchall
+    monkeypatch.setattr(cursor, 'fetchall', lambda: [{**row, 'amount': 1000} for row in original_fetchall()])
+    rows = [{'bill_number': str(900 + i), 'amount': '1000', 'supplier_id': 1, 'party_id': 2, 'register_date': '2024-06-01'} for i in range(3)]
+    ret = RegisterEntry.bulk_insert(rows)
+    audit = [statement for statement in cursor.statements if 'INSERT INTO audit_log' in statement and "'register_entry'" in statement]
+    assert len(audit) == 1
+    assert ret['ids'] and all(f"'register_entry', {record_id}, 'INSERT'" in audit[0] for record_id in ret['ids'])
+    assert '"amount": 1000' in audit[0]
+    remote = [query for query in replayed if query.startswith('INSERT INTO "register_entry"')]
+    assert len(remote) == 1
+    assert '"created_by","last_updated_by"' in remote[0]
+    assert remote[0].count(',7,7)') == 3
+
+def test_copy_keeps_empty_strings_apart_from_null(fake_db):
+    """None is copied as the unquoted empty field COPY reads as NULL, while an empty string stays quoted."""
+    (connection, cursor) = fake_db
+    with db_connector.transaction() as tx:
+        tx.copy_rows('staging', ['a', 'b', 'c'], [[1, None, ''], [2, 'say "hi"', None]])
+    assert cursor.copied == ['"1",,""', '"2","say ""hi""",']
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from OCR import circuit_breaker, name_matcher, rate_limit
+from OCR.circuit_breaker import CircuitBreaker, CircuitOpenError, GuardedLLM, LLMBusyError, LLMTimeoutError, WorkerPool
+from OCR.name_matcher import FuzzyMatch, NameMatcher
+from OCR.parse_register_entry_v2 import cached_ocr
+from OCR.rate_limit import RateLimitedLLM, TokenBucket
+from OCR.result_cache import OCRResultCache
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """An OpenAI-compatible chat completions endpoint whose delay, status and answer the test sets."""
+
+    def do_POST(self):
+        """Answers a chat completion after the server's delay."""
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server.requests += 1
+        time.sleep(server.delay)
+        if server.status != 200:
+            body = {'error': {'message': 'upstream failure', 'type': 'server_error'}}
+        else:
+            body = {'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4o-mini',
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': server.answer}, 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}}
+        payload = json.dumps(body).encode('utf-8')
+        try:
+            self.send_response(server.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        """Keeps the test output quiet."""
+
+@pytest.fixture
+def fake_openai():
+    """Runs the fake endpoint on a free local port."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAI)
+    server.daemon_threads = True
+    (server.delay, server.status, server.answer, server.requests) = (0.0, 200, 'None', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def client(server) -> ChatOpenAI:
+    """A chat model talking to the fake endpoint without client retries."""
+    return ChatOpenAI(model='gpt-4o-mini', api_key='test', base_url=f'http://127.0.0.1:{server.server_port}/v1', timeout=5, max_retries=0, temperature=0)
+
+def prompt():
+    """Messages of a trivial request."""
+    return [HumanMessage(content='Rachit Fashon')]
+
+def test_deadline_frees_the_caller(fake_openai):
+    """A call slower than its deadline raises LLMTimeoutError at the deadline and counts as a failure."""
+    fake_openai.delay = 2
+    breaker = CircuitBreaker()
+    llm = GuardedLLM(client(fake_openai), breaker, timeout_seconds=5)
+    start = time.perf_counter()
+    with pytest.raises(LLMTimeoutError):
+        llm.invoke(prompt(), timeout=0.3)
+    assert time.perf_counter() - start < 1
+    assert breaker.get_stats()['timeouts'] == 1
+
+def test_calls_past_their_deadline_keep_their_worker(fake_openai):
+    """A timed-out call still holds its worker, so a new call is refused rather than queued behind it."""
+    fake_openai.delay = 1
+    workers = WorkerPool(1)
+    llm = GuardedLLM(client(fake_openai), CircuitBreaker(), timeout_seconds=5, workers=workers)
+    with pytest.raises(LLMTimeoutError):
+        llm.invoke(prompt(), timeout=0.2)
+    assert workers.busy == 1
+    with pytest.raises(LLMBusyError):
+        llm.invoke(prompt(), timeout=0.2)
+    fake_openai.delay = 0
+    time.sleep(1.2)
+    assert workers.busy == 0
+    assert llm.invoke(prompt()).content == 'None'
+
+def test_rate_limit_wait_is_outside_the_deadline(fake_openai):
+    """Waiting for a rate-limit token neither spends the stage deadline nor counts as a slow call."""
+    breaker = CircuitBreaker(slow_call_seconds=0.2)
+    limiter = TokenBucket(2, 1)
+    llm = RateLimitedLLM(GuardedLLM(client(fake_openai), breaker, timeout_seconds=5), limiter)
+    for _ in range(3):
+        llm.invoke(prompt(), timeout=0.3)
+    assert breaker.get_stats()['slow_calls'] == 0
+    assert breaker.get_stats()['timeouts'] == 0
+
+def test_failures_open_the_breaker(fake_openai):
+    """Once enough calls fail the breaker refuses calls without reaching the endpoint."""
+    fake_openai.status = 500
+    breaker = CircuitBreaker(min_calls=3, cooldown_seconds=60)
+    llm = GuardedLLM(client(fake_openai), breaker, timeout_seconds=5)
+    for _ in range(3):
+        with pytest.raises(Exception) as raised:
+            llm.invoke(prompt())
+        assert not isinstance(raised.value, CircuitOpenError)
+    with pytest.raises(CircuitOpenError):
+        llm.invoke(prompt())
+    stats = breaker.get_stats()
+    assert (fake_openai.requests, stats['state'], stats['rejected'], stats['times_opened']) == (3, 'open', 1, 1)
+
+def test_slow_calls_open_the_breaker(fake_openai):
+    """Calls that succeed but exceed slow_call_seconds count as bad."""
+    fake_openai.delay = 0.1
+    breaker = CircuitBreaker(min_calls=2, slow_call_seconds=0.05, cooldown_seconds=60)
+    llm = GuardedLLM(client(fake_openai), breaker, timeout_seconds=5)
+    llm.invoke(prompt())
+    llm.invoke(prompt())
+    assert breaker.get_stats()['state'] == 'open'
+    assert breaker.get_stats()['slow_calls'] == 2
+
+def test_trial_call_closes_the_breaker(fake_openai):
+    """After the cooldown one trial call goes through and a good answer closes the breaker."""
+    fake_openai.status = 500
+    breaker = CircuitBreaker(min_calls=2, cooldown_seconds=0.2)
+    llm = GuardedLLM(client(fake_openai), breaker, timeout_seconds=5)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            llm.invoke(prompt())
+    fake_openai.status = 200
+    with pytest.raises(CircuitOpenError):
+        llm.invoke(prompt())
+    time.sleep(0.25)
+    assert breaker.get_stats()['state'] == 'half_open'
+    assert llm.invoke(prompt()).content == 'None'
+    assert breaker.get_stats()['state'] == 'closed'
+
+def test_stale_call_does_not_decide_the_trial():
+    """A late answer to a call admitted before the breaker opened neither closes nor reopens it."""
+    breaker = CircuitBreaker(min_calls=2, cooldown_seconds=0)
+    stale = breaker.allow()
+    for _ in range(2):
+        breaker.record_failure(breaker.allow())
+    assert breaker.get_stats()['state'] == 'half_open'
+    trial = breaker.allow()
+    assert breaker.allow() is None
+    breaker.record_success(0.01, stale)
+    assert breaker.get_stats()['state'] == 'half_open'
+    breaker.record_failure(stale)
+    assert breaker.get_stats()['state'] == 'half_open'
+    breaker.record_success(0.01, trial)
+    assert breaker.get_stats()['state'] == 'closed'
+    breaker.record_failure(stale)
+    assert breaker.get_stats()['window_calls'] == 0
+
+def test_name_matching_degrades_to_fuzzy(fake_openai, monkeypatch, tmp_path):
+    """When verification misses its deadline the matcher answers with fuzzy matches and their confidence."""
+    fake_openai.delay = 2
+    breaker = CircuitBreaker(cooldown_seconds=60)
+    monkeypatch.setattr(circuit_breaker, '_circuit_breaker', breaker)
+    monkeypatch.setattr(rate_limit, '_llm_limiter', TokenBucket(1000, 1000))
+    monkeypatch.setattr(name_matcher, 'VERIFY_DEADLINE_SECONDS', 0.3)
+    matcher = NameMatcher(cache_dir=str(tmp_path), llm=client(fake_openai))
+    pairs = [('Rachit Fashon', ['Rachit Fashion', 'Radhika Fashion']), ('Zebra Traders', ['Pragti Fashion'])]
+    start = time.perf_counter()
+    (rachit, zebra) = matcher.verify_matches(pairs)
+    assert time.perf_counter() - start < 1
+    assert isinstance(rachit, FuzzyMatch) and rachit == 'Rachit Fashion' and rachit.confidence >= 0.9
+    assert isinstance(zebra, FuzzyMatch) and not zebra
+    assert breaker.get_stats()['fallbacks'] == {'name_match': 2}
+    assert matcher.cache.get('Rachit Fashon') is None
+
+def test_fuzzy_only_results_are_not_cached(tmp_path):
+    """An OCR result with fuzzy-only matches is recomputed on the next upload."""
+    cache = OCRResultCache(cache_dir=str(tmp_path), ttl_seconds=3600, max_entries=10)
+    cached_ocr('aW1hZ2U=', lambda: {'supplier_name': 'Rachit Fashon', 'match_mode': 'fuzzy_only'}, cache)
+    assert cache.get_stats()['total_entries'] == 0
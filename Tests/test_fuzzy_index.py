@@ -0,0 +1,52 @@
+import random
+import string
+import pytest
+from rapidfuzz import distance
+from hca_backend.OCR.fuzzy_index import FuzzyIndex
+
+def brute_force(query, keys, threshold):
+    """The linear scan the index replaces: first key with the highest score above the threshold."""
+    best = None
+    for key in keys:
+        score = distance.JaroWinkler.similarity(query, key)
+        if score > threshold and (best is None or score > best[1]):
+            best = (key, score)
+    return best
+
+def test_best_match_finds_close_key():
+    """A misspelt query finds the indexed name."""
+    index = FuzzyIndex(['rachitfashion', 'vkfabrics', 'samundersareecenterdk'])
+    (key, score) = index.best_match('rachitfashon', 0.95)
+    assert key == 'rachitfashion'
+    assert score > 0.95
+    assert index.best_match('nonexistentname', 0.95) is None
+
+def test_threshold_is_strict():
+    """Scores equal to the threshold are not matches, like the linear scan."""
+    index = FuzzyIndex(['abcdef'])
+    score = distance.JaroWinkler.similarity('abcdxy', 'abcdef')
+    assert index.best_match('abcdxy', score) is None
+    assert index.best_match('abcdxy', score - 0.01)[0] == 'abcdef'
+
+def test_add_is_idempotent():
+    """Adding a known key does not duplicate it."""
+    index = FuzzyIndex(['vkfabrics'])
+    index.add('vkfabrics')
+    index.add('')
+    assert len(index) == 1
+    assert 'vkfabrics' in index
+
+@pytest.mark.parametrize('threshold', [0.8, 0.9, 0.95])
+def test_matches_linear_scan(threshold):
+    """Length blocking never drops the match a full scan would return."""
+    rng = random.Random(7)
+    keys = list(dict.fromkeys((''.join(rng.choices(string.ascii_lowercase[:6], k=rng.randint(3, 14))) for _ in range(400))))
+    index = FuzzyIndex(keys)
+    for _ in range(200):
+        query = ''.join(rng.choices(string.ascii_lowercase[:6], k=rng.randint(3, 14)))
+        expected = brute_force(query, keys, threshold)
+        actual = index.best_match(query, threshold)
+        assert (expected is None) == (actual is None)
+        if expected:
+            assert actual[1] == pytest.approx(expected[1])
+            assert actual[0] == expected[0]
@@ -0,0 +1,52 @@
+import base64
+import io
+from PIL import Image
+from OCR.image_preprocess import preprocess_image
+
+TEST_IMAGE = 'Tests/test_data/test_image.jpeg'
+
+def encode(data):
+    """Base64 encodes image bytes."""
+    return base64.b64encode(data).decode()
+
+def decode(encoded):
+    """Opens a base64 encoded image."""
+    return Image.open(io.BytesIO(base64.b64decode(encoded)))
+
+def jpeg(image, **kwargs):
+    """Saves an image as JPEG bytes."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', **kwargs)
+    return buffer.getvalue()
+
+def test_photo_is_downsampled_and_smaller():
+    """The test photo comes back within max_side and with fewer bytes."""
+    with open(TEST_IMAGE, 'rb') as f:
+        raw = f.read()
+    (encoded, report) = preprocess_image(encode(raw), max_side=1600)
+    assert max(decode(encoded).size) <= 1600
+    assert report['output_bytes'] < report['input_bytes'] == len(raw)
+    assert set(report['stages']) == {'decode', 'orient', 'crop', 'resize', 'encode'}
+
+def test_exif_orientation_is_applied():
+    """A photo tagged as rotated is turned upright before encoding."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image = Image.linear_gradient('L').resize((400, 200)).convert('RGB')
+    (encoded, _) = preprocess_image(encode(jpeg(image, exif=exif, quality=100)), crop=False)
+    assert decode(encoded).size == (200, 400)
+
+def test_crops_to_document():
+    """A white page on a dark background is cropped close to the page."""
+    image = Image.new('RGB', (1000, 1000), (30, 30, 30))
+    image.paste((250, 250, 250), (200, 150, 800, 850))
+    (encoded, report) = preprocess_image(encode(jpeg(image, quality=100)))
+    (width, height) = decode(encoded).size
+    assert 600 <= width <= 650 and 700 <= height <= 750
+
+def test_undecodable_image_is_returned_unchanged():
+    """Bytes that are not an image are passed through with the error reported."""
+    encoded = encode(b'not an image')
+    (result, report) = preprocess_image(encoded)
+    assert result == encoded
+    assert 'error' in report
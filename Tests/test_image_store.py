@@ -0,0 +1,47 @@
+import os
+import shutil
+from PIL import Image
+from OCR.image_store import OCRImageStore, REVIEW_MAX_SIDE, THUMBNAIL_MAX_SIDE
+
+TEST_IMAGE = 'Tests/test_data/test_image.jpeg'
+
+def store_with_image(tmp_path, entry_id='entry', **kwargs):
+    """Creates a store holding a copy of the test photo as an entry's original."""
+    store = OCRImageStore(str(tmp_path / 'images'), **kwargs)
+    original = os.path.join(store.images_dir, f'{entry_id}.jpg')
+    shutil.copy(TEST_IMAGE, original)
+    return (store, original)
+
+def test_ingest_creates_derivatives(tmp_path):
+    """Ingest writes a review image and a thumbnail within their sizes, both smaller than the original."""
+    (store, original) = store_with_image(tmp_path, webp=False)
+    sizes = store.ingest('entry', original)
+    for (variant, max_side) in (('review', REVIEW_MAX_SIDE), ('thumbnail', THUMBNAIL_MAX_SIDE)):
+        with Image.open(store.path('entry', variant)) as image:
+            assert max(image.size) == max_side
+        assert sizes[variant] < sizes['original']
+    assert store.best_path('entry', 'original') == original
+
+def test_webp_recompression(tmp_path):
+    """With WebP enabled the original is replaced by a smaller WebP file."""
+    (store, original) = store_with_image(tmp_path, webp=True)
+    store.ingest('entry', original)
+    assert store.path('entry', 'original').endswith('.webp')
+    assert not os.path.exists(original)
+    assert os.path.getsize(store.path('entry', 'original')) < os.path.getsize(TEST_IMAGE)
+
+def test_quota_evicts_oldest_originals(tmp_path):
+    """Over the quota, originals are evicted oldest first and review falls back to the derivative."""
+    store = OCRImageStore(str(tmp_path / 'images'), webp=False)
+    for entry_id in ('old', 'new'):
+        original = os.path.join(store.images_dir, f'{entry_id}.jpg')
+        shutil.copy(TEST_IMAGE, original)
+        store.ingest(entry_id, original)
+    store.quota_bytes = store.usage() - 1
+    report = store.enforce_quota(['old', 'new'])
+    assert report['originals_evicted'] == 1
+    assert store.path('old', 'original') is None
+    assert store.best_path('old', 'original') == store.path('old', 'review')
+    assert store.path('new', 'original') is not None
+    assert store.delete('old') > 0
+    assert store.best_path('old') is None
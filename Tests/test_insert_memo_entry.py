@@ -0,0 +1,146 @@
+import pytest
+from Entities import MemoEntry, MemoBill
+from API_Database import insert_memo_entry, memo_number
+from psql import db_connector
+from Exceptions import DataError
+
+class RecordingCursor:
+    """A stand-in database cursor that records every statement it executes."""
+
+    def __init__(self):
+        """Initializes the cursor with an empty statement log."""
+        self.statements = []
+        self.description = []
+
+    def execute(self, query):
+        """Records the executed statement."""
+        self.statements.append(query)
+
+    def fetchall(self):
+        """Returns a RETURNING id row for the last statement."""
+        return [{'id': len(self.statements)}]
+
+class RecordingConnection:
+    """A stand-in database connection that counts commits and rollbacks."""
+
+    def __init__(self):
+        """Initializes the connection counters."""
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        """Counts a commit."""
+        self.commits += 1
+
+    def rollback(self):
+        """Counts a rollback."""
+        self.rollbacks += 1
+
+    def close(self):
+        """Closing is a no-op for the stand-in connection."""
+        pass
+
+@pytest.fixture
+def recorder(monkeypatch):
+    """Routes every database connection to a single recording connection and cursor."""
+    connections = []
+    cursor = RecordingCursor()
+
+    def fake_cursor(dict=False):
+        """Returns the shared recording connection and cursor."""
+        connection = RecordingConnection()
+        connections.append(connection)
+        return (connection, cursor)
+    monkeypatch.setattr(db_connector, 'cursor', fake_cursor)
+    monkeypatch.setenv('QUERY_REMOTE', 'false')
+    return connections, cursor
+
+def make_memo(mode, bills, payments, part_payment=None):
+    """Builds a memo entry with the given bills and payments without touching the database."""
+    memo = MemoEntry(memo_number=101, supplier_id=1, party_id=2, amount=3000, mode=mode, register_date='2024-04-01', payment=payments, selected_part=part_payment or [])
+    memo.memo_bills = bills
+    return memo
+
+def test_full_memo_uses_one_statement_per_table(recorder):
+    """A full memo with many bills and payments issues one INSERT per table inside one transaction."""
+    (connections, cursor) = recorder
+    bills = [MemoBill(bill_id, 1000, 'F') for bill_id in (11, 12, 13)]
+    payments = [{'bank_id': 1, 'cheque_number': 555, 'amount': 2000}, {'bank_id': 2, 'cheque_number': None, 'amount': 1000}]
+    memo = make_memo('Full', bills, payments, part_payment=[7, 8])
+    status = insert_memo_entry.insert_memo_entry(memo)
+    assert status['id'] == 1
+    assert len(cursor.statements) == 5
+    assert cursor.statements[0].startswith('INSERT INTO "memo_entry"')
+    assert cursor.statements[1].startswith('INSERT INTO "memo_bills"')
+    assert cursor.statements[1].count('(1,') == 3
+    assert cursor.statements[2].startswith('INSERT INTO "memo_payments"')
+    assert cursor.statements[2].count('(1,') == 2
+    assert cursor.statements[3].startswith('UPDATE "part_payments"')
+    assert '"memo_id" IN (7,8)' in cursor.statements[3]
+    assert 'GREATEST(next_number, 102)' in cursor.statements[4]
+    assert len(connections) == 1
+    assert connections[0].commits == 1
+
+def test_part_memo_bill_without_bill_id(recorder):
+    """A part memo stores its NULL bill_id without string patching and records the part payment."""
+    (connections, cursor) = recorder
+    memo = make_memo('Part', [MemoBill(None, 3000, 'PR')], [])
+    insert_memo_entry.insert_memo_entry(memo)
+    assert len(cursor.statements) == 4
+    assert 'VALUES (1,null,\'PR\',3000)' in cursor.statements[1]
+    assert cursor.statements[2].startswith('INSERT INTO "part_payments"')
+    assert connections[0].commits == 1
+
+def test_failed_statement_rolls_back(recorder, monkeypatch):
+    """A failing statement rolls back the whole memo instead of leaving a partial insert."""
+    (connections, cursor) = recorder
+
+    def failing_execute(query):
+        """Fails on the memo_payments insert."""
+        cursor.statements.append(query)
+        if 'memo_payments' in query:
+            raise Exception('payment insert failed')
+    monkeypatch.setattr(cursor, 'execute', failing_execute)
+    memo = make_memo('Full', [MemoBill(11, 1000, 'F')], [{'bank_id': 1, 'cheque_number': 1, 'amount': 1000}])
+    with pytest.raises(Exception):
+        insert_memo_entry.insert_memo_entry(memo)
+    assert connections[0].commits == 0
+    assert connections[0].rollbacks == 1
+
+def test_reserve_memo_number_bumps_counter_in_one_transaction(recorder):
+    """Without an expired reservation to reuse, a reservation bumps the counter and records the hold together."""
+    (connections, cursor) = recorder
+    answers = iter([[], [{'memo_number': 42}], [{'memo_number': 42, 'expires_at': '2024-04-01 10:30:00'}]])
+    cursor.fetchall = lambda: next(answers)
+    ret = memo_number.reserve_memo_number()
+    assert ret['memo_number'] == 42
+    assert 'FOR UPDATE SKIP LOCKED' in cursor.statements[0]
+    assert cursor.statements[1].strip().startswith('UPDATE memo_number_counter')
+    assert cursor.statements[2].strip().startswith('INSERT INTO memo_number_reservations')
+    assert len(connections) == 1
+    assert connections[0].commits == 1
+
+def test_multi_row_insert_audits_every_row_in_the_transaction(recorder, monkeypatch):
+    """Each row of a multi-row INSERT gets its own audit row, written on the transaction's cursor."""
+    (connections, cursor) = recorder
+    monkeypatch.setattr(cursor, 'fetchall', lambda: [{'id': 21}, {'id': 22}, {'id': 23}] if 'memo_bills' in cursor.statements[-1] else [{'id': 1}])
+    with db_connector.transaction(current_user_id=5) as tx:
+        tx.execute('INSERT INTO memo_bills (memo_id, bill_id, type, amount) VALUES (1,11,\'F\',100),(1,12,\'F\',200),(1,13,\'F\',300)')
+    audit = [statement for statement in cursor.statements if 'INSERT INTO audit_log' in statement]
+    assert len(audit) == 1
+    for (record_id, amount) in ((21, 100), (22, 200), (23, 300)):
+        assert f"'memo_bills', {record_id}, 'INSERT'" in audit[0]
+        assert f'"amount": "{amount}"' in audit[0]
+    assert cursor.statements[-1] == 'RELEASE SAVEPOINT audit_log'
+    assert len(connections) == 1 and connections[0].commits == 1
+
+def test_release_memo_number_only_frees_own_reservation(recorder, monkeypatch):
+    """Releasing filters on the current user, and someone else's reservation is reported as not reserved."""
+    (connections, cursor) = recorder
+    monkeypatch.setattr(db_connector, '_resolve_current_user_id', lambda user_id: 5)
+    memo_number.release_memo_number(204)
+    assert any('memo_number = 204 AND reserved_by = 5' in statement for statement in cursor.statements)
+    monkeypatch.setattr(cursor, 'fetchall', lambda: [])
+    with pytest.raises(DataError) as error:
+        memo_number.release_memo_number(205)
+    assert error.value.dict()['message'] == 'Memo number 205 is not reserved by you'
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+from OCR.llm_cache import CachedLLM
+from OCR.name_matcher import NameMatcher
+from OCR.result_cache import OCRResultCache
+
+class EchoLLM:
+    """A stand-in chat model that counts its calls and answers with a numbered echo."""
+
+    def __init__(self, model_name='stub-model', temperature=0, reply=None):
+        """Initializes the stub; reply fixes the answer instead of echoing."""
+        self.model_name = model_name
+        self.temperature = temperature
+        self.reply = reply
+        self.calls = 0
+
+    def invoke(self, messages):
+        """Answers with the call number and the last message."""
+        self.calls += 1
+        return SimpleNamespace(content=self.reply or f"{self.calls}: {messages[-1].content}")
+
+@pytest.fixture
+def response_cache(tmp_path):
+    """A response cache in a temporary directory."""
+    return OCRResultCache(cache_dir=str(tmp_path / 'llm'), ttl_seconds=3600, max_entries=100)
+
+def messages(text='Rachit Fashon'):
+    """Rendered messages of a prompt."""
+    return [SystemMessage(content='You are an expert.'), HumanMessage(content=text)]
+
+def test_identical_requests_hit_the_cache(response_cache):
+    """A repeated prompt is answered from the cache with the original response text."""
+    llm = EchoLLM()
+    model = CachedLLM(llm, response_cache, enabled=True)
+    first = model.invoke(messages())
+    second = model.invoke(messages())
+    assert first.content == second.content == '1: Rachit Fashon'
+    assert llm.calls == 1
+    assert model.invoke(messages('Impact Fashon')).content == '2: Impact Fashon'
+    assert response_cache.get_stats()['hits'] == 1
+
+def test_key_covers_model_and_temperature(response_cache):
+    """The same prompt to another model or at another temperature is a different request."""
+    keys = {CachedLLM(EchoLLM(model_name=name, temperature=temperature), response_cache, enabled=True).cache_key(messages())
+            for (name, temperature) in [('a', 0), ('a', 0.7), ('b', 0)]}
+    assert len(keys) == 3
+
+def test_bypass_refreshes_the_cached_response(response_cache):
+    """bypass_cache calls the model and its response replaces the cached one."""
+    llm = EchoLLM()
+    model = CachedLLM(llm, response_cache, enabled=True)
+    model.invoke(messages())
+    assert model.invoke(messages(), bypass_cache=True).content == '2: Rachit Fashon'
+    assert model.invoke(messages()).content == '2: Rachit Fashon'
+    assert llm.calls == 2
+
+def test_disabled_cache_always_calls_the_model(response_cache):
+    """With the cache disabled every invoke reaches the model and nothing is stored."""
+    llm = EchoLLM()
+    model = CachedLLM(llm, response_cache, enabled=False)
+    model.invoke(messages())
+    model.invoke(messages())
+    assert llm.calls == 2
+    assert response_cache.get_stats()['total_entries'] == 0
+
+def test_unparseable_response_is_not_kept(response_cache, tmp_path):
+    """A batch verification answer that is not JSON is dropped so the next attempt asks again."""
+    llm = EchoLLM(reply='Here are the matches')
+    matcher = NameMatcher(cache_dir=str(tmp_path), llm=llm)
+    matcher.llm = CachedLLM(matcher.llm.llm, response_cache, enabled=True)
+    pairs = [(0, 'Rachit Fashon', ['Rachit Fashion']), (1, 'Impact Fashon', ['Impact Fashion'])]
+    assert matcher._verify_batch(pairs) == {}
+    assert matcher._verify_batch(pairs) == {}
+    assert llm.calls == 2
+    assert response_cache.get_stats()['total_entries'] == 0
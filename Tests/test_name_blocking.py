@@ -0,0 +1,47 @@
+import pytest
+from OCR import name_matcher
+from OCR.name_blocking import BlockingIndex, phonetic_key, tokenize
+from OCR.name_corpus import NameCorpus
+from OCR.name_matcher import NameMatcher
+
+FILLER = [f'{word} {kind} {number}' for number in range(40) for word in ('Balaji', 'Ganesh', 'Ambika') for kind in ('Textiles', 'Sarees')]
+
+def test_tokenize_expands_abbreviations():
+    """Forms of address, legal suffixes and '&' are normalized before blocking."""
+    assert tokenize('M/S S. Shardharam & Sons P LTD') == ['s', 'shardharam', 'sons']
+    assert tokenize('Shri Rachit Fashion Pvt. Ltd.') == ['shree', 'rachit', 'fashion']
+    assert tokenize('Laxmi Tex') == ['laxmi', 'textiles']
+
+@pytest.mark.parametrize('left, right', [('Shardharam', 'SHARDARAM'), ('Laxmi', 'Lakshmi'), ('Agarwal', 'Aggarwaal'), ('Chhabra', 'Chabra'), ('Vinayak', 'Winayak')])
+def test_phonetic_key_joins_spellings(left, right):
+    """Transliterations of the same word share a phonetic key."""
+    assert phonetic_key(left) == phonetic_key(right)
+
+def test_phonetic_key_keeps_different_names_apart():
+    """Different words keep different keys."""
+    assert phonetic_key('Rachit') != phonetic_key('Radhika')
+
+def test_search_finds_spelling_variants():
+    """The directory name is found among the few scored candidates despite honorific and spelling changes."""
+    names = FILLER + ['Shardaram Textiles', 'Lakshmi Sarees & Sons']
+    index = BlockingIndex(names)
+    lowercase = [name.lower() for name in names]
+    assert index.search('SHREE SHARDHARAM TEXTILES', lowercase, limit=1)[0][0] == len(FILLER)
+    assert index.search('LAXMI SAREES &SONS', lowercase, limit=1)[0][0] == len(FILLER) + 1
+    assert len(index.candidates('SHREE SHARDHARAM TEXTILES', limit=500)) < len(names)
+
+def test_search_without_shared_keys_returns_none():
+    """A query sharing no key with any name leaves the caller to scan."""
+    index = BlockingIndex(FILLER)
+    assert index.search('Zyx', [name.lower() for name in FILLER]) is None
+
+def test_fuzzy_matches_use_blocking_on_large_corpora(monkeypatch):
+    """Corpora at the blocking threshold are matched through the index, smaller ones by scanning."""
+    matcher = NameMatcher.__new__(NameMatcher)
+    corpus = NameCorpus('supplier', list(enumerate(FILLER + ['Shardaram Textiles'])))
+    monkeypatch.setattr(name_matcher, 'BLOCKING_MIN_NAMES', len(corpus))
+    assert matcher.get_fuzzy_matches('SHREE SHARDHARAM TEXTILES', corpus, limit=1)[0][0] == 'Shardaram Textiles'
+    assert corpus._blocking is not None
+    small = NameCorpus('supplier', [(1, 'Shardaram Textiles')])
+    matcher.get_fuzzy_matches('SHARDARAM', small)
+    assert small._blocking is None
@@ -109,4 +109,72 @@ class TestNameCache:
         cache.update_mapping('New Test Name', 'New Corrected Name')
         stats_after = cache.get_stats()['total_entries']
         assert stats_after == stats_before + 1
-        assert cache.get('New Test Name') == 'New Corrected Name'
\ No newline at end of file
+        assert cache.get('New Test Name') == 'New Corrected Name'
+    def test_legacy_keys_are_indexed_normalized(self, temp_cache_file):
+        """Keys saved before normalization was applied are still found by fuzzy lookups."""
+        with open(temp_cache_file, 'w') as f:
+            json.dump({'V.K. Fabrics Pvt Ltd': 'V.K. Fabrics Private Limited'}, f)
+        cache = NameMatchCache(temp_cache_file)
+        assert cache.get('VK Fabric') == 'V.K. Fabrics Private Limited'
+
+    def test_set_appends_one_line(self, cache, temp_cache_file):
+        """Each mapping is appended as its own line instead of rewriting the file."""
+        cache.set('Rachit Fashion', 'Rachit Fashion Pvt Ltd')
+        cache.set('V.K. Fabrics', 'V.K. Fabrics Private Limited')
+        with open(temp_cache_file) as f:
+            lines = f.read().splitlines()
+        assert [json.loads(line) for line in lines] == [{'rachitfashion': 'Rachit Fashion Pvt Ltd'}, {'vkfabrics': 'V.K. Fabrics Private Limited'}]
+
+    def test_legacy_file_is_converted(self, temp_cache_file):
+        """An indented JSON cache from before the log format loads and keeps working."""
+        with open(temp_cache_file, 'w') as f:
+            json.dump({'kingsarees': 'KING SAREE'}, f, indent=2)
+        cache = NameMatchCache(temp_cache_file)
+        cache.set('Sur Shyam Fashion', 'SUR SHYAM FASHION')
+        reloaded = NameMatchCache(temp_cache_file)
+        assert reloaded.get('King Sarees') == 'KING SAREE'
+        assert reloaded.get('Sur Shyam Fashion') == 'SUR SHYAM FASHION'
+
+    def test_loading_legacy_file_does_not_write(self, temp_cache_file):
+        """Only an append converts a legacy file, so reading the cache never modifies it."""
+        with open(temp_cache_file, 'w') as f:
+            json.dump({'kingsarees': 'KING SAREE'}, f, indent=2)
+        with open(temp_cache_file, 'rb') as f:
+            before = f.read()
+        assert NameMatchCache(temp_cache_file).get('King Sarees') == 'KING SAREE'
+        with open(temp_cache_file, 'rb') as f:
+            assert f.read() == before
+
+    def test_torn_line_is_skipped(self, temp_cache_file):
+        """A line cut short by a crash is ignored and later appends stay readable."""
+        with open(temp_cache_file, 'w') as f:
+            f.write('{"kingsarees":"KING SAREE"}\n{"broken":"BRO')
+        cache = NameMatchCache(temp_cache_file)
+        assert cache.get('King Sarees') == 'KING SAREE'
+        cache.set('Sur Shyam Fashion', 'SUR SHYAM FASHION')
+        reloaded = NameMatchCache(temp_cache_file)
+        assert reloaded.get('Sur Shyam Fashion') == 'SUR SHYAM FASHION'
+        assert reloaded.get_stats()['total_entries'] == 2
+
+    def test_writers_share_the_file(self, temp_cache_file):
+        """Mappings written by another process sharing the file are picked up, including after compaction."""
+        first = NameMatchCache(temp_cache_file)
+        second = NameMatchCache(temp_cache_file)
+        first.set('Rachit Fashion', 'Rachit Fashion Pvt Ltd')
+        assert second.get('Rachit Fashon') == 'Rachit Fashion Pvt Ltd'
+        first.store.compact(first.cache)
+        first.set('King Sarees', 'KING SAREE')
+        assert second.get('King Sarees') == 'KING SAREE'
+        second.set('Parmar Silk', 'PARMAR SILK CREATION')
+        assert first.get('Parmar Silk') == 'PARMAR SILK CREATION'
+        assert first.get_stats()['total_entries'] == 3
+
+    def test_log_is_compacted(self, temp_cache_file):
+        """Repeated overwrites of the same key are compacted away."""
+        cache = NameMatchCache(temp_cache_file)
+        cache.store.compact_min_lines = 10
+        for i in range(25):
+            cache.set('Rachit Fashion', f'Rachit Fashion {i}')
+        with open(temp_cache_file) as f:
+            assert len(f.read().splitlines()) < 10
+        assert NameMatchCache(temp_cache_file).get('Rachit Fashion') == 'Rachit Fashion 24'
@@ -0,0 +1,95 @@
+import threading
+import pytest
+from hca_backend.OCR.name_corpus import NameCorpus, NameCorpusCache
+from hca_backend.OCR.name_matcher import NameMatcher
+from hca_backend.API_Database.data_version import get_data_versions
+
+ROWS = [(1, 'Rachit Fashion'), (2, 'RACHIT FASHION'), (3, 'V.K. Fabrics Pvt Ltd')]
+
+@pytest.fixture
+def tracked():
+    """A corpus cache over fake version and load functions that count their calls."""
+    state = {'version': 1, 'version_calls': 0, 'loads': 0}
+
+    def get_version(entity_type):
+        """Returns the current fake version."""
+        state['version_calls'] += 1
+        return state['version']
+
+    def load(entity_type, version):
+        """Builds a corpus from the fixed rows."""
+        state['loads'] += 1
+        return NameCorpus(entity_type, ROWS, version)
+    return state, get_version, load
+
+def test_corpus_precomputes_forms():
+    """Lowercase and normalized forms are parallel to the names and ids."""
+    corpus = NameCorpus('supplier', ROWS, 4)
+    assert corpus.lowercase[2] == 'v.k. fabrics pvt ltd'
+    assert corpus.normalized[2] == 'vkfabrics'
+    assert corpus.id_by_name['RACHIT FASHION'] == 2
+    assert len(corpus) == 3
+
+def test_corpus_reloads_only_on_version_change(tracked):
+    """The table is read again only after its data version moved."""
+    (state, get_version, load) = tracked
+    cache = NameCorpusCache(check_seconds=0, get_version=get_version, load=load)
+    first = cache.get('supplier')
+    assert cache.get('supplier') is first
+    assert state['loads'] == 1
+    state['version'] = 2
+    second = cache.get('supplier')
+    assert second is not first
+    assert second.version == 2
+    assert state['loads'] == 2
+
+def test_version_checks_are_throttled(tracked):
+    """Within the check interval the corpus is served without touching the database."""
+    (state, get_version, load) = tracked
+    cache = NameCorpusCache(check_seconds=60, get_version=get_version, load=load)
+    for _ in range(10):
+        cache.get('party')
+    assert state['version_calls'] == 1
+    assert state['loads'] == 1
+
+def test_reload_serves_previous_corpus_until_indexes_are_built(tracked):
+    """While one thread rebuilds a corpus, others get the old one, and the new one arrives indexed."""
+    (state, get_version, load) = tracked
+    (started, release) = (threading.Event(), threading.Event())
+
+    def slow_load(entity_type, version):
+        """Blocks the second load until the test lets it finish."""
+        if state['loads'] == 1:
+            started.set()
+            release.wait(5)
+        return load(entity_type, version)
+    cache = NameCorpusCache(check_seconds=0, get_version=get_version, load=slow_load)
+    first = cache.get('supplier')
+    state['version'] = 2
+    reloaded = []
+    thread = threading.Thread(target=lambda: reloaded.append(cache.get('supplier')))
+    thread.start()
+    assert started.wait(5)
+    assert cache.get('supplier') is first
+    release.set()
+    thread.join(5)
+    assert reloaded[0].version == 2
+    assert reloaded[0]._blocking is not None and reloaded[0]._typeahead is not None
+    assert cache.get('supplier') is reloaded[0]
+
+def test_fuzzy_matches_map_back_by_position():
+    """Names differing only in case keep their own spelling in the results."""
+    matcher = object.__new__(NameMatcher)
+    matches = matcher.get_fuzzy_matches('rachit fashion', NameCorpus('supplier', ROWS), limit=2)
+    assert sorted((name for (name, _) in matches)) == ['RACHIT FASHION', 'Rachit Fashion']
+
+def test_get_data_versions_defaults_to_zero():
+    """Tables without a version row report 0 and names are matched case-insensitively."""
+    queries = []
+
+    def execute(query):
+        """Answers the version lookup with a single row."""
+        queries.append(query)
+        return {'result': [{'table_name': 'supplier', 'version': 7}]}
+    assert get_data_versions(['supplier', 'Transport'], execute=execute) == {'supplier': 7, 'transport': 0}
+    assert len(queries) == 1
@@ -5,9 +5,9 @@ from hca_backend.OCR.name_matcher import NameMatcher
 class TestNameMatcher:
 
     @pytest.fixture
-    def matcher(self):
+    def matcher(self, tmp_path):
         """Initializes and returns a NameMatcher instance for fuzzy matching tests."""
-        return NameMatcher()
+        return NameMatcher(cache_dir=str(tmp_path))
 
     def test_initialization(self, matcher):
         """Test that the matcher initializes correctly."""
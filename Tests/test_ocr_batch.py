@@ -0,0 +1,134 @@
+import base64
+import json
+import re
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from OCR import batch, name_matcher, rate_limit
+from OCR.name_corpus import NameCorpus
+from OCR.name_matcher import NameMatcher
+from OCR.ocr_queue import OCRQueue
+from OCR.parse_register_entry_v2 import InvoiceParser
+from OCR.rate_limit import TokenBucket
+from OCR.result_cache import OCRResultCache
+
+class StubLLM:
+    """A local stand-in for the OpenAI chat model that answers each prompt of the pipeline."""
+
+    def __init__(self, delay=0.05):
+        """Initializes the stub with a per-call delay and in-flight counters."""
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, messages):
+        """Returns the canned answer for the prompt in messages."""
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return SimpleNamespace(content=self._answer(messages))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _answer(self, messages):
+        """Chooses the answer from the prompt text."""
+        content = messages[-1].content
+        if isinstance(content, list):
+            image = base64.b64decode(content[1]['image_url']['url'].split(',', 1)[1]).decode()
+            if image == 'broken':
+                raise ValueError('unreadable image')
+            number = image.split('-')[1]
+            return json.dumps({'supplier_name': 'Rachit Fashon', 'supplier_name_matched': None, 'party_name': 'Impact Fashon', 'party_name_matched': None, 'date': '2024-04-01', 'bill_number': f'RF/{number}', 'amount': 1000})
+        system = messages[0].content
+        if 'Invoice Number:' in system:
+            return re.search('Invoice Number: \\S+/(\\d+)', system).group(1)
+        if 'numbered query' in content:
+            self.batches += 1
+            candidates = re.findall('Potential matches: (.*)', content)
+            return json.dumps({str(number): json.loads(names)[0] for (number, names) in enumerate(candidates, 1)})
+        candidates = re.search('Potential matches: (.*)', content).group(1).split(', ')
+        return candidates[0]
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    """A parser and matcher sharing a stub LLM, with an in-memory name corpus and no rate limit."""
+    monkeypatch.setattr(rate_limit, '_llm_limiter', TokenBucket(1000, 1000))
+    corpora = {'supplier': NameCorpus('supplier', [(1, 'Rachit Fashion'), (2, 'Radhika Fashion')]), 'party': NameCorpus('party', [(1, 'Impact Fashion'), (2, 'Pragti Fashion')])}
+    monkeypatch.setattr(name_matcher, 'get_name_corpus', lambda entity_type: corpora[entity_type])
+    llm = StubLLM()
+    parser = InvoiceParser(llm=llm)
+    matcher = NameMatcher(cache_dir=str(tmp_path / 'cache'), llm=llm)
+    monkeypatch.setattr(batch, 'get_result_cache', lambda: OCRResultCache(str(tmp_path / 'results')))
+    return llm, parser, matcher
+
+def encode(text):
+    """Base64 encodes a fake image."""
+    return base64.b64encode(text.encode()).decode()
+
+def test_batch_streams_results_and_queues_once(pipeline, tmp_path, monkeypatch):
+    """Every image yields a line as it completes and successful ones are queued with one write."""
+    (llm, parser, matcher) = pipeline
+    queue = OCRQueue(str(tmp_path / 'queue'))
+    writes = []
+    original_add = queue.add_entries
+    monkeypatch.setattr(queue, 'add_entries', lambda entries: writes.append(len(entries)) or original_add(entries))
+    images = [encode(f'bill-{i}') for i in range(6)] + [encode('broken')]
+    lines = list(batch.process_batch(images, queue=queue, parser=parser, matcher=matcher, concurrency=3))
+    summary = lines[-1]
+    results = {line['index']: line for line in lines[:-1]}
+    assert sorted(results) == list(range(7))
+    assert results[6]['status'] == 'error'
+    assert results[2]['result']['bill_number'] == '2'
+    assert results[2]['result']['supplier_name_matched'] == 'Rachit Fashion'
+    assert results[2]['result']['party_name_matched'] == 'Impact Fashion'
+    assert summary['status'] == 'done'
+    assert (summary['succeeded'], summary['failed']) == (6, 1)
+    assert writes == [6]
+    assert sorted(summary['queue_entry_ids']) == list(range(6))
+    assert queue.get_status()['total_pending'] == 6
+
+def test_batch_runs_images_and_stages_concurrently(pipeline):
+    """Images overlap, and the stages after extraction of one image overlap too."""
+    (llm, parser, matcher) = pipeline
+    list(batch.process_batch([encode('bill-1')], parser=parser, matcher=matcher, concurrency=1))
+    assert llm.max_in_flight >= 2
+    llm.max_in_flight = 0
+    list(batch.process_batch([encode(f'bill-{i}') for i in range(2, 6)], parser=parser, matcher=matcher, concurrency=4))
+    assert llm.max_in_flight >= 4
+
+def test_batch_answers_repeated_images_from_cache(pipeline, tmp_path):
+    """A re-uploaded image does not reach the LLM again."""
+    (llm, parser, matcher) = pipeline
+    cache = OCRResultCache(str(tmp_path / 'repeat'))
+    first = list(batch.process_batch([encode('bill-7')], parser=parser, matcher=matcher, cache=cache))
+    calls = llm.calls
+    second = list(batch.process_batch([encode('bill-7')], parser=parser, matcher=matcher, cache=cache))
+    assert llm.calls == calls
+    assert second[0]['result'] == first[0]['result']
+    assert cache.get_stats()['hits'] == 1
+
+def test_supplier_and_party_share_one_verification(pipeline):
+    """The supplier and party names of an image are verified in a single batched request."""
+    (llm, parser, matcher) = pipeline
+    # A wide window so both stages always land in the same batch
+    matcher.batcher.window_seconds = 0.5
+    lines = list(batch.process_batch([encode('bill-8')], parser=parser, matcher=matcher))
+    assert lines[0]['result']['party_name_matched'] == 'Impact Fashion'
+    assert llm.batches == 1
+    assert llm.calls == 3
+
+def test_token_bucket_limits_rate():
+    """After the burst, calls are spaced by the refill rate."""
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
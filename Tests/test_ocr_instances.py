@@ -0,0 +1,50 @@
+import base64
+import threading
+import pytest
+from OCR import parse_register_entry_v2
+
+@pytest.fixture
+def counted_parser(monkeypatch):
+    """Replaces InvoiceParser with a counting stand-in and clears the shared instances around the test."""
+    created = []
+
+    class CountingParser:
+        """Records every construction."""
+
+        def __init__(self):
+            """Counts the construction."""
+            created.append(self)
+    monkeypatch.setattr(parse_register_entry_v2, 'InvoiceParser', CountingParser)
+    parse_register_entry_v2.reset_instances()
+    yield created
+    parse_register_entry_v2.reset_instances()
+
+def test_invoice_parser_is_built_once(counted_parser):
+    """Concurrent callers share a single parser."""
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(parse_register_entry_v2.get_invoice_parser())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(counted_parser) == 1
+    assert all((parser is counted_parser[0] for parser in seen))
+
+def test_warmup_reports_failures(counted_parser, monkeypatch):
+    """Warmup never raises; failing steps are reported."""
+
+    def fail(entity_type):
+        """Simulates an unreachable database."""
+        raise ConnectionError('database unavailable')
+    monkeypatch.setattr(parse_register_entry_v2, 'get_name_corpus', fail)
+    monkeypatch.setattr(parse_register_entry_v2, 'NameMatcher', lambda: object())
+    report = parse_register_entry_v2.warmup()
+    assert isinstance(report['invoice_parser'], float)
+    assert report['supplier_names'].startswith('error')
+
+def test_encode_image_needs_no_parser(tmp_path, monkeypatch):
+    """The module-level encode_image does not build an OpenAI client."""
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    image = tmp_path / 'bill.jpg'
+    image.write_bytes(b'jpeg bytes')
+    assert base64.b64decode(parse_register_entry_v2.encode_image(str(image))) == b'jpeg bytes'
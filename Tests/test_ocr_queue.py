@@ -1,9 +1,12 @@
 import os
 import json
 import base64
+import io
 import pytest
+import time
+import sqlite3
 from datetime import datetime, timedelta
-from OCR.ocr_queue import OCRQueue
+from OCR.ocr_queue import OCRQueue, parse_lease_seconds
 
 @pytest.fixture
 def queue_dir(tmp_path):
@@ -29,13 +32,11 @@ def test_queue_initialization(ocr_queue, queue_dir):
     """Test queue initialization and directory creation."""
     assert os.path.exists(queue_dir)
     assert os.path.exists(os.path.join(queue_dir, 'images'))
-    assert os.path.exists(os.path.join(queue_dir, 'queue.json'))
-    with open(os.path.join(queue_dir, 'queue.json')) as f:
-        data = json.load(f)
-    assert 'entries' in data
-    assert 'stats' in data
-    assert data['stats']['total_pending'] == 0
-    assert data['stats']['total_processed'] == 0
+    assert os.path.exists(os.path.join(queue_dir, 'queue.db'))
+    stats = ocr_queue.get_status()
+    assert stats['total_pending'] == 0
+    assert stats['total_processed'] == 0
+    assert stats['last_processed'] is None
 
 def test_add_entries(ocr_queue, sample_entry, queue_dir):
     """Test adding entries to queue."""
@@ -55,8 +56,10 @@ def test_get_next_entry(ocr_queue, sample_entry):
     assert entry is not None
     assert entry['status'] == 'pending'
     assert entry['ocr_data'] == sample_entry['ocr_data']
-    assert 'image' in entry
+    assert 'image' not in entry
     assert entry['id'] == entry_ids[0]
+    with open(ocr_queue.get_image_path(entry['id']), 'rb') as f:
+        assert f.read() == b'test image data'
 
 def test_mark_complete(ocr_queue, sample_entry, queue_dir):
     """Test marking entries as complete."""
@@ -75,15 +78,8 @@ def test_clear_processed(ocr_queue, sample_entry):
     entry_ids = ocr_queue.add_entries([sample_entry])
     ocr_queue.mark_complete(entry_ids[0])
     old_time = (datetime.now() - timedelta(days=31)).isoformat()
-    for entry in ocr_queue.queue['entries']:
-        if entry['id'] == entry_ids[0]:
-            entry['processed_time'] = old_time
-            break
-    with open(ocr_queue.queue_file) as f:
-        data = json.load(f)
-    data['entries'][0]['processed_time'] = old_time
-    with open(ocr_queue.queue_file, 'w') as f:
-        json.dump(data, f)
+    with sqlite3.connect(ocr_queue.db_path) as connection:
+        connection.execute('UPDATE entries SET processed_time = ? WHERE id = ?', (old_time, entry_ids[0]))
     ocr_queue.clear_processed(days_old=30)
     stats = ocr_queue.get_status()
     assert stats['total_pending'] == 0
@@ -91,7 +87,7 @@ def test_clear_processed(ocr_queue, sample_entry):
 
 def test_multiple_entries(ocr_queue, sample_entry):
     """Test handling multiple entries."""
-    entries = [sample_entry, {**sample_entry, 'ocr_data': {**sample_entry['ocr_data'], 'bill_number': '124'}}, {**sample_entry, 'ocr_data': {**sample_entry['ocr_data'], 'bill_number': '125'}}]
+    entries = [sample_entry, {'image': base64.b64encode(b'test image 124').decode(), 'ocr_data': {**sample_entry['ocr_data'], 'bill_number': '124'}}, {'image': base64.b64encode(b'test image 125').decode(), 'ocr_data': {**sample_entry['ocr_data'], 'bill_number': '125'}}]
     entry_ids = ocr_queue.add_entries(entries)
     assert len(entry_ids) == 3
     stats = ocr_queue.get_status()
@@ -120,4 +116,177 @@ def test_persistence(queue_dir, sample_entry):
     assert entry is not None
     assert entry['id'] == entry_ids[0]
     assert entry['ocr_data'] == sample_entry['ocr_data']
-    assert 'image' in entry
\ No newline at end of file
+    assert queue2.get_image_path(entry['id']) is not None
+def test_duplicate_images_are_not_queued_twice(ocr_queue, sample_entry):
+    """Re-uploading a pending image returns the pending entry instead of a new one."""
+    first = ocr_queue.add_entries([sample_entry])
+    second = ocr_queue.add_entries([sample_entry, dict(sample_entry)])
+    assert second == [first[0], first[0]]
+    assert ocr_queue.get_status()['total_pending'] == 1
+    ocr_queue.mark_complete(first[0])
+    third = ocr_queue.add_entries([sample_entry])
+    assert third[0] != first[0]
+
+def test_duplicate_from_another_process_shares_entry(ocr_queue, queue_dir, sample_entry, monkeypatch):
+    """An image queued by another worker after the pending lookup is skipped, not fatal to the batch."""
+    other = OCRQueue(queue_dir)
+    monkeypatch.setattr(ocr_queue, 'pending_by_hash', lambda digests=None: {})
+    [first] = other.add_entries([sample_entry])
+    other_image = {'image': base64.b64encode(b'other image data').decode(), 'ocr_data': {}}
+    ids = ocr_queue.add_entries([sample_entry, other_image])
+    assert ids[0] == first and ids[1] != first
+    assert ocr_queue.get_status()['total_pending'] == 2
+    assert sorted(os.listdir(os.path.join(queue_dir, 'images'))) == sorted(f'{entry_id}.jpg' for entry_id in ids)
+
+def test_migrates_legacy_queue_json(queue_dir, sample_entry):
+    """Entries of a queue.json from the file-based queue are imported once."""
+    os.makedirs(os.path.join(queue_dir, 'images'))
+    image_path = os.path.join(queue_dir, 'images', 'legacy.jpg')
+    with open(image_path, 'wb') as f:
+        f.write(b'test image data')
+    legacy = {'entries': [{'id': 'legacy', 'image_path': image_path, 'ocr_data': sample_entry['ocr_data'], 'status': 'pending', 'upload_time': '2024-01-29T10:00:00'}, {'id': 'done', 'image_path': os.path.join(queue_dir, 'images', 'done.jpg'), 'ocr_data': {}, 'status': 'processed', 'upload_time': '2024-01-28T10:00:00', 'processed_time': '2024-01-28T11:00:00'}], 'stats': {}}
+    with open(os.path.join(queue_dir, 'queue.json'), 'w') as f:
+        json.dump(legacy, f)
+    queue = OCRQueue(queue_dir)
+    assert not os.path.exists(os.path.join(queue_dir, 'queue.json'))
+    stats = queue.get_status()
+    assert (stats['total_pending'], stats['total_processed'], stats['last_processed']) == (1, 1, '2024-01-28T11:00:00')
+    assert queue.get_next_entry()['id'] == 'legacy'
+    assert queue.add_entries([sample_entry]) == ['legacy']
+
+def test_verify_integrity(ocr_queue, sample_entry, queue_dir):
+    """Pending entries without an image are dropped and stale orphaned images removed."""
+    entry_ids = ocr_queue.add_entries([sample_entry])
+    os.remove(ocr_queue.get_entry(entry_ids[0])['image_path'])
+    orphan = os.path.join(queue_dir, 'images', 'orphan.jpg')
+    recent = os.path.join(queue_dir, 'images', 'recent.jpg')
+    for path in (orphan, recent):
+        with open(path, 'wb') as f:
+            f.write(b'x')
+    stale = (datetime.now() - timedelta(hours=1)).timestamp()
+    os.utime(orphan, (stale, stale))
+    report = ocr_queue.verify_integrity()
+    assert (report['entries_dropped'], report['images_removed']) == (1, 1)
+    assert os.path.exists(recent) and not os.path.exists(orphan)
+    assert ocr_queue.get_status()['total_pending'] == 0
+
+def test_dequeue_order_and_counters(ocr_queue):
+    """Entries come out in upload order and the counters follow every change."""
+    images = [{'image': base64.b64encode(f'image {i}'.encode()).decode(), 'ocr_data': {'bill_number': str(i)}} for i in range(20)]
+    entry_ids = ocr_queue.add_entries(images)
+    for entry_id in entry_ids[:5]:
+        assert ocr_queue.get_next_entry()['id'] == entry_id
+        ocr_queue.mark_complete(entry_id)
+    ocr_queue.mark_complete(entry_ids[0])
+    stats = ocr_queue.get_status()
+    assert (stats['total_pending'], stats['total_processed']) == (15, 5)
+
+def test_claims_are_exclusive(ocr_queue, sample_entry):
+    """Two operators claiming at once never receive the same entry."""
+    images = [{'image': base64.b64encode(f'image {i}'.encode()).decode(), 'ocr_data': {'bill_number': str(i)}} for i in range(4)]
+    entry_ids = ocr_queue.add_entries(images)
+    first = ocr_queue.claim('alice', 3)
+    second = ocr_queue.claim('bob', 3)
+    assert [e['id'] for e in first] == entry_ids[:3]
+    assert [e['id'] for e in second] == entry_ids[3:]
+    assert ocr_queue.get_next_entry('carol') is None
+    assert ocr_queue.get_status()['total_leased'] == 4
+
+def test_expired_lease_is_requeued(ocr_queue, sample_entry):
+    """An entry whose lease lapsed goes to the next operator, and the old owner can no longer extend it."""
+    entry_id = ocr_queue.add_entries([sample_entry])[0]
+    assert ocr_queue.claim('alice', lease_seconds=0.05)[0]['id'] == entry_id
+    assert ocr_queue.claim('bob') == []
+    time.sleep(0.1)
+    assert ocr_queue.get_next_entry('bob')['id'] == entry_id
+    assert ocr_queue.extend_lease(entry_id, 'alice') is None
+    assert ocr_queue.extend_lease(entry_id, 'bob') is not None
+    assert ocr_queue.mark_complete(entry_id, 'alice') is False
+    assert ocr_queue.mark_complete(entry_id, 'bob') is True
+    assert ocr_queue.get_status()['total_requeued'] == 1
+
+def test_release_returns_entry(ocr_queue, sample_entry):
+    """A released entry can be claimed right away by another operator."""
+    entry_id = ocr_queue.add_entries([sample_entry])[0]
+    ocr_queue.claim('alice')
+    assert ocr_queue.release(entry_id, 'bob') is False
+    assert ocr_queue.release(entry_id, 'alice') is True
+    assert ocr_queue.claim('bob')[0]['id'] == entry_id
+
+def test_review_metrics(ocr_queue, sample_entry):
+    """The status reports the age of the oldest pending entry and recent throughput."""
+    entry_ids = ocr_queue.add_entries([sample_entry, {'image': base64.b64encode(b'other').decode(), 'ocr_data': {}}])
+    ocr_queue.mark_complete(entry_ids[0])
+    stats = ocr_queue.get_status()
+    assert stats['processed_per_hour'] == 1
+    assert stats['oldest_pending_age_seconds'] >= 0
+
+def test_staged_upload_is_moved_into_queue(ocr_queue, sample_entry, queue_dir):
+    """A streamed upload is queued by moving its file, and a duplicate upload is discarded."""
+    staged = ocr_queue.stage_upload(io.BytesIO(b'test image data'))
+    entry_id = ocr_queue.add_entries([{'image_path': staged, 'ocr_data': sample_entry['ocr_data']}])[0]
+    assert not os.path.exists(staged)
+    with open(ocr_queue.get_image_path(entry_id), 'rb') as f:
+        assert f.read() == b'test image data'
+    duplicate = ocr_queue.stage_upload(io.BytesIO(b'test image data'))
+    assert ocr_queue.add_entries([{'image_path': duplicate, 'ocr_data': {}}]) == [entry_id]
+    assert ocr_queue.add_entries([sample_entry]) == [entry_id]
+    assert os.listdir(os.path.join(queue_dir, 'incoming')) == []
+    ocr_queue.mark_complete(entry_id)
+    assert ocr_queue.get_image_path(entry_id) is None
+
+def test_integrity_check_keeps_uploads_in_flight(ocr_queue, queue_dir):
+    """Uploads still staged by a request survive the check, and a queued image is young again after its move."""
+    stale = (datetime.now() - timedelta(hours=2)).timestamp()
+    in_flight = ocr_queue.stage_upload(io.BytesIO(b'in flight'))
+    queued = ocr_queue.stage_upload(io.BytesIO(b'queued'))
+    abandoned = os.path.join(queue_dir, 'incoming', 'abandoned.jpg')
+    with open(abandoned, 'wb') as f:
+        f.write(b'x')
+    for path in (in_flight, queued, abandoned):
+        os.utime(path, (stale, stale))
+    entry_id = ocr_queue.add_entries([{'image_path': queued, 'ocr_data': {}}])[0]
+    assert os.path.getmtime(ocr_queue.get_image_path(entry_id)) > stale + 3600
+    ocr_queue.verify_integrity()
+    assert os.path.exists(in_flight) and not os.path.exists(abandoned)
+    ocr_queue.discard_staged([in_flight])
+    assert os.listdir(os.path.join(queue_dir, 'incoming')) == []
+
+def test_image_bytes_are_counted_without_scanning(ocr_queue, sample_entry, monkeypatch):
+    """The status and the quota read a running total of image bytes, and verify_integrity recounts it."""
+    usage = ocr_queue.store.usage
+    monkeypatch.setattr(ocr_queue.store, 'usage', lambda: pytest.fail('images directory scanned'))
+    ocr_queue.store.quota_bytes = 10 ** 9
+    entry_ids = ocr_queue.add_entries([sample_entry, {'image': base64.b64encode(b'other image').decode(), 'ocr_data': {}}])
+    assert ocr_queue.get_status()['image_bytes'] == usage() == len(b'test image data') + len(b'other image')
+    ocr_queue.mark_complete(entry_ids[0])
+    assert ocr_queue.get_status()['image_bytes'] == usage() == len(b'other image')
+    with open(os.path.join(ocr_queue.images_dir, f'{entry_ids[1]}.thumbnail.jpg'), 'wb') as f:
+        f.write(b'x')
+    monkeypatch.setattr(ocr_queue.store, 'usage', usage)
+    ocr_queue.verify_integrity()
+    assert ocr_queue.get_status()['image_bytes'] == usage()
+
+def test_real_image_gets_review_and_thumbnail(ocr_queue):
+    """A decodable image is served at review and thumbnail size, and every variant goes on completion."""
+    with open('Tests/test_data/test_image.jpeg', 'rb') as f:
+        entry_id = ocr_queue.add_entries([{'image': base64.b64encode(f.read()).decode(), 'ocr_data': {}}])[0]
+    review = ocr_queue.get_image_path(entry_id, 'review')
+    thumbnail = ocr_queue.get_image_path(entry_id, 'thumbnail')
+    assert review.endswith('.review.jpg') and thumbnail.endswith('.thumbnail.jpg')
+    assert os.path.getsize(thumbnail) < os.path.getsize(review) < os.path.getsize(ocr_queue.get_image_path(entry_id))
+    assert ocr_queue.get_status()['image_bytes'] == ocr_queue.store.usage()
+    ocr_queue.mark_complete(entry_id)
+    assert os.listdir(ocr_queue.images_dir) == []
+    assert ocr_queue.get_status()['image_bytes'] == 0
+
+def test_lease_seconds_are_validated_and_clamped(monkeypatch):
+    """Client lease lengths are clamped to 1 second .. 12 default leases, and non-numbers are rejected."""
+    monkeypatch.setenv('OCR_LEASE_SECONDS', '300')
+    assert parse_lease_seconds(None) is None
+    assert parse_lease_seconds('90') == 90.0
+    assert parse_lease_seconds(0) == 1.0
+    assert parse_lease_seconds(10 ** 9) == 3600.0
+    for value in ('soon', [60], True, float('inf')):
+        with pytest.raises(ValueError):
+            parse_lease_seconds(value)
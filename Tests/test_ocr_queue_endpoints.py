@@ -28,7 +28,7 @@ def mock_ocr_queue(monkeypatch):
 
     class MockOCRQueue:
 
-        def get_next_entry(self):
+        def get_next_entry(self, owner='anonymous', lease_seconds=None):
             """Returns the next OCR queue entry; simulated as None for testing."""
             return None
 
@@ -36,9 +36,13 @@ def mock_ocr_queue(monkeypatch):
             """Returns a simulated OCR queue status dictionary for testing."""
             return {'total_pending': 0, 'total_processed': 0}
 
-        def mark_complete(self, entry_id):
+        def get_entry(self, entry_id):
+            """Returns the entry with the ID; simulated as missing for testing."""
+            return None
+
+        def mark_complete(self, entry_id, owner=None):
             """Marks an OCR queue entry as complete; no action in test mode."""
-            pass
+            return False
     monkeypatch.setattr('app.ocr_queue', MockOCRQueue())
 
 @pytest.fixture
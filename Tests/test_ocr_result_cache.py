@@ -0,0 +1,50 @@
+import base64
+import os
+import time
+from OCR.result_cache import OCRResultCache, image_hash
+from OCR.parse_register_entry_v2 import cached_ocr
+
+def encode(data):
+    """Base64 encodes image bytes."""
+    return base64.b64encode(data).decode()
+
+def test_hash_is_of_decoded_bytes():
+    """The same bytes give the same key and different bytes a different one."""
+    assert image_hash(encode(b'bill')) == image_hash(encode(b'bill'))
+    assert image_hash(encode(b'bill')) != image_hash(encode(b'bill2'))
+
+def test_hit_skips_compute(tmp_path):
+    """A repeated image is answered from the cache and counted as a hit."""
+    cache = OCRResultCache(str(tmp_path))
+    calls = []
+
+    def compute():
+        """Counts pipeline runs."""
+        calls.append(1)
+        return {'bill_number': '12'}
+    assert cached_ocr(encode(b'bill'), compute, cache) == {'bill_number': '12'}
+    assert cached_ocr(encode(b'bill'), compute, cache) == {'bill_number': '12'}
+    assert len(calls) == 1
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+def test_expired_results_are_ignored(tmp_path):
+    """Results older than the TTL count as misses and are removed."""
+    cache = OCRResultCache(str(tmp_path), ttl_seconds=60)
+    cache.set('old', {'amount': 1})
+    path = os.path.join(str(tmp_path), 'old.json')
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert cache.get('old') is None
+    assert not os.path.exists(path)
+
+def test_size_bound_evicts_oldest(tmp_path):
+    """Past max_entries the oldest results are evicted first."""
+    cache = OCRResultCache(str(tmp_path), max_entries=10)
+    for i in range(11):
+        cache.set(f'key{i}', {'amount': i})
+        os.utime(os.path.join(str(tmp_path), f'key{i}.json'), (time.time() - 100 + i, time.time() - 100 + i))
+    stats = cache.get_stats()
+    assert stats['total_entries'] == 9
+    assert stats['evictions'] == 2
+    assert cache.get('key0') is None
+    assert cache.get('key10') == {'amount': 10}
@@ -0,0 +1,97 @@
+import json
+import threading
+import pytest
+from API_Database import reference_cache
+from API_Database.reference_cache import ReferenceCache
+
+@pytest.fixture
+def tracked():
+    """A reference cache over a fake version function, and a loader that counts its calls."""
+    state = {'version': 1, 'version_calls': 0, 'loads': 0, 'names': ['Rachit Fashion']}
+
+    def get_version(table):
+        """Returns the current fake version."""
+        state['version_calls'] += 1
+        return state['version']
+
+    def load():
+        """Serializes the current fake names."""
+        state['loads'] += 1
+        return json.dumps(state['names'])
+    return state, ReferenceCache(check_seconds=0, get_version=get_version), load
+
+def test_response_is_rebuilt_only_on_version_change(tracked):
+    """Rows are read again only after the table's data version moved, and the ETag follows the body."""
+    (state, cache, load) = tracked
+    first = cache.get('supplier', 'names', load)
+    assert cache.get('supplier', 'names', load) is first
+    assert state['loads'] == 1
+    state['names'].append('Rachna Sarees')
+    state['version'] = 2
+    second = cache.get('supplier', 'names', load)
+    assert second.version == 2 and 'Rachna Sarees' in second.body
+    assert second.etag != first.etag
+    assert cache.get_stats()['hits'] == 1
+
+def test_version_checks_are_throttled(tracked):
+    """Within the check interval the response is served without touching the database."""
+    (state, cache, load) = tracked
+    cache.check_seconds = 60
+    for _ in range(10):
+        cache.get('party', 'names', load)
+    assert (state['version_calls'], state['loads']) == (1, 1)
+
+def test_kinds_are_cached_apart_and_invalidated_together(tracked):
+    """The name list and the full table of one table are separate entries, invalidated together."""
+    (state, cache, load) = tracked
+    cache.get('bank', 'names', load)
+    cache.get('bank', 'all', load)
+    assert state['loads'] == 2
+    cache.invalidate('bank')
+    cache.get('bank', 'names', load)
+    assert state['loads'] == 3
+
+def test_unversioned_tables_are_not_cached(tracked):
+    """Tables without a data version are read on every request."""
+    (state, cache, load) = tracked
+    cache.get('users', 'all', load)
+    cache.get('users', 'all', load)
+    assert (state['version_calls'], state['loads']) == (0, 2)
+
+def test_slow_rebuild_does_not_block_other_tables(tracked):
+    """While one table is being read, responses of other tables are still built and served."""
+    (state, cache, load) = tracked
+    (started, release) = (threading.Event(), threading.Event())
+
+    def slow_load():
+        """Blocks until the test lets it finish."""
+        started.set()
+        release.wait(5)
+        return load()
+    thread = threading.Thread(target=cache.get, args=('supplier', 'all', slow_load))
+    thread.start()
+    assert started.wait(5)
+    assert 'Rachit Fashion' in cache.get('party', 'names', load).body
+    release.set()
+    thread.join(5)
+    assert state['loads'] == 2
+
+def test_reference_response_answers_304(monkeypatch, tracked):
+    """A client presenting the current ETag gets an empty 304, and a stale one gets the body."""
+    from app import app, reference_response
+    (state, cache, load) = tracked
+    monkeypatch.setattr(reference_cache, '_reference_cache', cache)
+    with app.test_request_context('/api/supplier_names_and_ids'):
+        response = reference_response('supplier', 'names', load)
+    assert response.status_code == 200
+    assert response.get_json() == ['Rachit Fashion']
+    etag = response.headers['ETag']
+    with app.test_request_context('/api/supplier_names_and_ids', headers={'If-None-Match': etag}):
+        response = reference_response('supplier', 'names', load)
+    assert response.status_code == 304
+    assert state['loads'] == 1
+    state['version'] = 2
+    state['names'].append('Rachna Sarees')
+    with app.test_request_context('/api/supplier_names_and_ids', headers={'If-None-Match': etag}):
+        response = reference_response('supplier', 'names', load)
+    assert response.status_code == 200 and response.headers['ETag'] != etag
@@ -0,0 +1,46 @@
+import pytest
+from API_Database.search_entities import MAX_SEARCH_LIMIT, SEARCH_LIMIT, build_search_query, parse_search_limit
+from Exceptions import DataError
+
+def test_individual_search_is_ranked_and_limited():
+    """Names match with typos through pg_trgm and the best matches come first."""
+    sql = build_search_query('supplier', 'rachit', limit=20)
+    assert """"name" ILIKE '%rachit%' OR 'rachit'<%"name\"""" in sql
+    assert 'ORDER BY GREATEST(word_similarity(\'rachit\',"name")' in sql
+    assert sql.endswith('LIMIT 20')
+
+def test_entry_search_matches_names_by_id():
+    """Register entries are found through the ids of the matching suppliers and parties."""
+    sql = build_search_query('register_entry', 'rachit')
+    assert '"register_entry"."supplier_id" IN (SELECT "matched_supplier"."id" FROM "supplier" "matched_supplier"' in sql
+    assert '"register_entry"."party_id" IN (SELECT "matched_party"."id" FROM "party" "matched_party"' in sql
+    assert '"supplier"."name" ILIKE' not in sql
+
+def test_numeric_search_ranks_exact_numbers_first():
+    """A number matches bill numbers exactly, and those rank above name similarity."""
+    sql = build_search_query('register_entry', '123')
+    assert '"register_entry"."bill_number"=123' in sql
+    assert 'GREATEST(CASE WHEN "register_entry"."bill_number"=123 THEN 1 ELSE 0 END' in sql
+
+def test_search_without_trigram():
+    """Without pg_trgm the search falls back to ILIKE, newest first, and quotes are escaped."""
+    sql = build_search_query('party', "o'neil", trigram=False)
+    assert 'word_similarity' not in sql and '<%' not in sql
+    assert "ILIKE '%o''neil%'" in sql
+    assert 'ORDER BY "id" DESC' in sql
+
+def test_filters_still_apply():
+    """Field filters and exact filters are combined with the search."""
+    sql = build_search_query('register_entry', 'rachit', field_filters=[{'entityType': 'register_entry', 'field': 'amount', 'operator': 'greaterThan', 'value': 100}], status='N')
+    assert '"register_entry"."amount">100' in sql
+    assert '"register_entry"."status"=\'N\'' in sql
+
+def test_limit_is_clamped_and_validated():
+    """Limits are clamped to 1..MAX_SEARCH_LIMIT and anything that is not an integer is rejected."""
+    assert parse_search_limit(None) == SEARCH_LIMIT
+    assert parse_search_limit(-5) == 1
+    assert parse_search_limit('7') == 7
+    assert parse_search_limit(10 ** 6) == MAX_SEARCH_LIMIT
+    for value in ['ten', 2.5, True, [3]]:
+        with pytest.raises(DataError):
+            parse_search_limit(value)
@@ -0,0 +1,40 @@
+from OCR import name_corpus
+from OCR.name_corpus import NameCorpus, NameCorpusCache, suggest_names
+from OCR.typeahead import TypeaheadIndex, compact
+
+NAMES = ['Shree Rachit Fashion', 'Rachna Sarees', 'V.K. Fabrics Pvt Ltd', 'Balaji Textiles', 'Rachit Fashion']
+
+def test_compact_ignores_case_and_punctuation():
+    """Dots, spaces and case do not matter when typing."""
+    assert compact('V.K. Fab') == compact('vk fab') == 'vkfab'
+
+def test_prefix_matches_come_first_in_order():
+    """Names starting with the query come before names with a later word that does."""
+    index = TypeaheadIndex(NAMES)
+    assert index.search('rach') == [(4, 'prefix'), (1, 'prefix'), (0, 'word')]
+
+def test_query_matches_across_punctuation():
+    """Initials typed without dots still find the name."""
+    assert TypeaheadIndex(NAMES).search('vk fab') == [(2, 'prefix')]
+
+def test_typos_fall_back_to_trigrams():
+    """A misspelt query fills the rest of the suggestions with close names."""
+    assert (3, 'fuzzy') in TypeaheadIndex(NAMES).search('balaj textils')
+
+def test_limit_and_empty_query():
+    """No more than limit suggestions are returned, and an empty query lists names in order."""
+    index = TypeaheadIndex(NAMES)
+    assert len(index.search('rach', limit=2)) == 2
+    assert index.search('', limit=2) == [(3, 'prefix'), (4, 'prefix')]
+
+def test_suggestions_refresh_with_data_version(monkeypatch):
+    """A data version bump rebuilds the corpus, and the typeahead index with it."""
+    state = {'version': 1, 'rows': [(10, 'Rachit Fashion')]}
+    cache = NameCorpusCache(check_seconds=0, get_version=lambda entity_type: state['version'],
+                            load=lambda entity_type, version: NameCorpus(entity_type, state['rows'], version))
+    monkeypatch.setattr(name_corpus, '_corpus_cache', cache)
+    assert suggest_names('supplier', 'rach') == [{'id': 10, 'name': 'Rachit Fashion', 'match': 'prefix'}]
+    state['rows'] = state['rows'] + [(11, 'Rachna Sarees')]
+    assert len(suggest_names('supplier', 'rach')) == 1
+    state['version'] = 2
+    assert [row['id'] for row in suggest_names('supplier', 'rach')] == [10, 11]
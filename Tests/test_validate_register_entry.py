@@ -0,0 +1,70 @@
+import pytest
+from datetime import datetime
+from Entities import RegisterEntry
+from Exceptions import DataError
+from API_Database import insert_register_entry
+from API_Database.validate_register_entry import months_between, validate_register_entries
+from psql import db_connector
+
+def make_bill(bill_number, register_date, supplier_id=1, party_id=2):
+    """Builds a register entry without touching the database."""
+    return RegisterEntry(bill_number=bill_number, amount=1000, supplier_id=supplier_id, party_id=party_id, register_date=register_date)
+
+@pytest.fixture
+def existing_bills(monkeypatch):
+    """Answers every query with the given existing bills and records the statements run."""
+    statements = []
+    rows = []
+
+    class Cursor:
+        """A stand-in cursor returning the configured existing bills."""
+        description = []
+
+        def execute(self, query):
+            """Records the executed statement."""
+            statements.append(query)
+
+        def fetchall(self):
+            """Returns the configured existing bills."""
+            return rows
+
+    class Connection:
+        """A stand-in connection."""
+
+        def commit(self):
+            """Commits are a no-op."""
+            pass
+
+        def close(self):
+            """Closing is a no-op."""
+            pass
+    monkeypatch.setattr(db_connector, 'cursor', lambda dict=False: (Connection(), Cursor()))
+    return rows, statements
+
+def test_months_between_matches_postgres_age():
+    """Month differences follow Postgres' AGE() in both directions."""
+    assert months_between(datetime(2023, 7, 10), datetime(2023, 1, 15)) == 5
+    assert months_between(datetime(2023, 1, 15), datetime(2023, 7, 10)) == 5
+    assert months_between(datetime(2023, 7, 15), datetime(2023, 1, 15)) == 6
+    assert months_between(datetime(2024, 2, 29), datetime(2023, 2, 28)) == 12
+
+def test_check_new_register_uses_one_query(existing_bills):
+    """A single query decides both the exact duplicate and the six month rule."""
+    (rows, statements) = existing_bills
+    rows.append({'supplier_id': 1, 'party_id': 2, 'bill_number': 55, 'register_date': datetime(2023, 1, 15)})
+    assert insert_register_entry.check_new_register(make_bill(55, '2023-01-15')) is False
+    with pytest.raises(DataError):
+        insert_register_entry.check_new_register(make_bill(55, '2023-05-01'))
+    assert insert_register_entry.check_new_register(make_bill(55, '2023-08-01')) is True
+    assert len(statements) == 3
+
+def test_validate_many_candidates(existing_bills):
+    """Many candidates are validated together against the database and against each other."""
+    (rows, statements) = existing_bills
+    rows.append({'supplier_id': 1, 'party_id': 2, 'bill_number': 10, 'register_date': datetime(2024, 1, 1)})
+    candidates = [make_bill(10, '2024-01-01'), make_bill(11, '2024-01-01'), make_bill(11, '2024-02-01'), make_bill(10, '2024-01-01', party_id=3)]
+    errors = validate_register_entries(candidates)
+    assert sorted(errors) == [0, 2]
+    assert errors[0]['message'] == 'Duplicate Bill Number'
+    assert errors[2]['message'] == 'Duplicate Bill Number too close in time'
+    assert len(statements) == 1
@@ -0,0 +1,99 @@
+import json
+import re
+import threading
+from types import SimpleNamespace
+import pytest
+from OCR import name_matcher, rate_limit
+from OCR.name_matcher import NameMatcher
+from OCR.rate_limit import TokenBucket
+from OCR.verify_batcher import VerificationBatcher
+
+class NameLLM:
+    """A deterministic stand-in that answers with the first candidate sharing the query's first word."""
+
+    def __init__(self, broken=False, skip=()):
+        """Initializes the stub; broken answers with invalid JSON and skip leaves query numbers out."""
+        self.broken = broken
+        self.skip = skip
+        self.prompts = []
+
+    def invoke(self, messages):
+        """Answers a single or batched verification prompt."""
+        content = messages[-1].content
+        self.prompts.append(content)
+        if 'numbered query' not in content:
+            query = re.search("Query name: '(.*)'", content).group(1)
+            candidates = re.search('Potential matches: (.*)', content).group(1).split(', ')
+            return SimpleNamespace(content=self._pick(query, candidates) or 'None')
+        if self.broken:
+            return SimpleNamespace(content='Here are the matches')
+        pairs = re.findall('Query name: (.*)\n\\s*Potential matches: (.*)', content)
+        answers = {str(number): self._pick(json.loads(query), json.loads(candidates)) for (number, (query, candidates)) in enumerate(pairs, 1) if number not in self.skip}
+        return SimpleNamespace(content='```json\n' + json.dumps(answers) + '\n```')
+
+    @staticmethod
+    def _pick(query, candidates):
+        """Returns the first candidate with the query's first word, or None."""
+        return next((candidate for candidate in candidates if candidate.split()[0].lower() == query.split()[0].lower()), None)
+
+@pytest.fixture
+def make_matcher(monkeypatch, tmp_path):
+    """Builds matchers over a stub LLM without a rate limit."""
+    monkeypatch.setattr(rate_limit, '_llm_limiter', TokenBucket(1000, 1000))
+
+    def make(llm):
+        """Returns a matcher using llm with its own cache."""
+        return NameMatcher(cache_dir=str(tmp_path / f'cache{id(llm)}'), llm=llm)
+    return make
+
+PAIRS = [('Rachit Fashon', ['Radhika Fashion', 'Rachit Fashion']), ('Impact Fashon', ['Pragti Fashion', 'Impact Fashion']), ('Zebra Traders', ['Pragti Fashion'])]
+
+def test_one_request_for_many_queries(make_matcher):
+    """Several queries are verified with one request and the answers mapped back in order."""
+    llm = NameLLM()
+    matcher = make_matcher(llm)
+    assert matcher.verify_matches(PAIRS) == ['Rachit Fashion', 'Impact Fashion', None]
+    assert len(llm.prompts) == 1
+    assert matcher.verify_matches(PAIRS[:2]) == ['Rachit Fashion', 'Impact Fashion']
+    assert len(llm.prompts) == 1
+
+def test_batches_are_capped(make_matcher, monkeypatch):
+    """More queries than the cap are split across requests."""
+    monkeypatch.setattr(name_matcher, 'MAX_VERIFY_BATCH', 2)
+    llm = NameLLM()
+    matcher = make_matcher(llm)
+    pairs = [(f'Name {i}', [f'Name {i} Ltd']) for i in range(5)]
+    assert matcher.verify_matches(pairs) == [f'Name {i} Ltd' for i in range(5)]
+    assert len(llm.prompts) == 3
+
+def test_unparseable_response_falls_back_to_single_calls(make_matcher):
+    """When the batched answer is not JSON each query is verified on its own."""
+    llm = NameLLM(broken=True)
+    matcher = make_matcher(llm)
+    assert matcher.verify_matches(PAIRS) == ['Rachit Fashion', 'Impact Fashion', None]
+    assert len(llm.prompts) == 4
+
+def test_missing_answers_fall_back(make_matcher):
+    """Only the queries the batched answer left out are verified again."""
+    llm = NameLLM(skip=(2,))
+    matcher = make_matcher(llm)
+    assert matcher.verify_matches(PAIRS) == ['Rachit Fashion', 'Impact Fashion', None]
+    assert len(llm.prompts) == 2
+
+def test_batcher_coalesces_concurrent_requests():
+    """Requests submitted within the window are verified together."""
+    calls = []
+
+    def verify_many(pairs):
+        """Records each batch and echoes the first candidate."""
+        calls.append(len(pairs))
+        return [candidates[0] for (_, candidates) in pairs]
+    batcher = VerificationBatcher(verify_many, max_size=10, window_seconds=0.2)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.submit(f'q{i}', [f'c{i}']).result())) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: f'c{i}' for i in range(4)}
+    assert calls == [4]
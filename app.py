@@ -1,8 +1,9 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file, url_for
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import os
 import json
+import threading
 import ast
 from dotenv import load_dotenv
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
@@ -18,15 +19,24 @@ from API_Database import insert_individual, retrieve_all, retrieve_from_id, sear
 from API_Database import edit_individual, delete_entry, retrieve_memo_entry
 from API_Database import update_register_entry, update_memo_entry
 from API_Database.audit_log import search_audit_logs, get_audit_history
+from API_Database.reference_cache import get_reference_cache
 from backup import backup
 from Entities import RegisterEntry, MemoEntry, OrderForm, Item, ItemEntry
 from Individual import Supplier, Party, Bank, Transporter, User
 from Reports import report_select, CustomEncoder
 from Legacy_Data import add_party, add_suppliers
 from Exceptions import DataError
-from OCR import parse_register_entry
-from OCR.ocr_queue import OCRQueue
+from OCR import parse_register_entry, warmup as ocr_warmup
+from OCR.ocr_queue import OCRQueue, parse_lease_seconds
+from OCR.batch import process_batch, MAX_BATCH_IMAGES
+from OCR.parse_register_entry_v2 import get_result_cache
+from OCR.llm_cache import get_llm_cache_stats
+from OCR.circuit_breaker import get_circuit_breaker, llm_busy_workers
+from OCR.bill_number_rules import get_bill_number_rules
+from OCR.name_corpus import suggest_names
 ocr_queue = OCRQueue()
+# Reconcile queue images with the database off the request path
+ocr_queue.start_integrity_checks()
 from utils import table_class_mapper
 load_dotenv()
 app = Flask(__name__)
@@ -34,6 +44,10 @@ app = Flask(__name__)
 CORS(app)
 
 name_cache = NameMatchCache()
+
+# Build the OCR clients and name corpora in the background so the first invoice does not pay for them
+if os.environ.get('OCR_WARMUP', 'true') == 'true':
+    threading.Thread(target=ocr_warmup, daemon=True).start()
 app.config['JSON_SORT_KEYS'] = False
 app.config['JWT_SECRET_KEY'] = 'NHYd198vQNOBa9HrIAGEGNYrKHBegc9Z'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
@@ -41,6 +55,17 @@ app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(hours=6)
 jwt = JWTManager(app)
 
 BASE = '/api'
+TYPEAHEAD_ENTITIES = ('supplier', 'party', 'bank')
+MAX_TYPEAHEAD_LIMIT = 50
+
+def reference_response(table: str, kind: str, load):
+    """Serves reference data from the reference cache with a strong ETag, answering 304 when the client's copy is current."""
+    cached = get_reference_cache().get(table, kind, load)
+    response = Response(cached.body, mimetype='application/json')
+    response.set_etag(cached.etag)
+    # Clients must revalidate every time, but the answer is usually an empty 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 # Custom decorator for checking permissions
 def permission_required(resource, action):
@@ -541,29 +566,36 @@ def search_audit_trail():
 def get_all_supplier_names():
     """Retrieves all supplier names and IDs from the database and returns them in JSON format."""
     
-    # Print the full request
-    print(request.args)
-    data = retrieve_indivijual.get_all_names_ids('supplier')
-    json_data = json.dumps(data)
-    return json_data
+    return reference_response('supplier', 'names', lambda: json.dumps(retrieve_indivijual.get_all_names_ids('supplier')))
 
 @app.route(BASE + '/party_names_and_ids', methods=['GET'])
 @jwt_required()
 @permission_required('party', 'read')
 def get_all_party_names():
     """Retrieves all party names and IDs from the database and returns them in JSON format."""
-    data = retrieve_indivijual.get_all_names_ids('party')
-    json_data = json.dumps(data)
-    return json_data
+    return reference_response('party', 'names', lambda: json.dumps(retrieve_indivijual.get_all_names_ids('party')))
 
 @app.route(BASE + '/bank_names_and_ids', methods=['GET'])
 @jwt_required()
 @permission_required('bank', 'read')
 def get_all_bank_names():
     """Retrieves all bank names and IDs from the database and returns them in JSON format."""
-    data = retrieve_indivijual.get_all_names_ids('bank')
-    json_data = json.dumps(data)
-    return json_data
+    return reference_response('bank', 'names', lambda: json.dumps(retrieve_indivijual.get_all_names_ids('bank')))
+
+@app.route(BASE + '/typeahead/<entity_type>', methods=['GET'])
+@jwt_required()
+def typeahead(entity_type: str):
+    """Suggests supplier, party or bank names for a picker, from an in-process index that refreshes when the names change."""
+    if entity_type not in TYPEAHEAD_ENTITIES:
+        return jsonify({'status': 'error', 'message': f'Invalid entity type: {entity_type}'}), 400
+    current_user = get_current_user()
+    if not current_user or not current_user.has_permission(entity_type, 'read'):
+        return jsonify({'status': 'error', 'message': 'Permission denied'}), 403
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_TYPEAHEAD_LIMIT)
+    try:
+        return jsonify(suggest_names(entity_type, request.args.get('q', ''), limit))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route(BASE + '/credit/<int:supplier_id>/<int:party_id>', methods=['GET'])
 @jwt_required()
@@ -619,7 +651,9 @@ def add_individual():
             'message': 'Permission denied'
         }), 403
     
-    return entity_mapping[entity_type].insert(data)
+    response = entity_mapping[entity_type].insert(data)
+    get_reference_cache().invalidate(entity_type)
+    return response
 
 @app.route(BASE + '/add/entry', methods=['POST'])
 @jwt_required()
@@ -658,6 +692,18 @@ def add_register_entry():
     response = RegisterEntry.insert(data)
     return jsonify(response)
 
+@app.route(BASE + '/bulk/register_entries', methods=['POST'])
+@jwt_required()
+@permission_required('register_entry', 'create')
+def bulk_add_register_entries():
+    """Validates and inserts a batch of register entries; returns per-row errors and the throughput in rows/sec."""
+    data = request.json
+    entries = data.get('entries') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or len(entries) == 0:
+        return jsonify({'status': 'error', 'message': 'No register entries provided'}), 400
+    response = RegisterEntry.bulk_insert(entries)
+    return jsonify(response)
+
 @app.route(BASE + '/add/memo_entry', methods=['POST'])
 @jwt_required()
 @permission_required('memo_entry', 'create')
@@ -710,8 +756,26 @@ def get_all():
                 'message': 'Permission denied'
             }), 403
         
+        # POST bodies are not revalidated by clients, so this only saves the database read;
+        # GET /get_all/<table_name> also answers 304 for individual tables
+        if retrieve_all.is_individual(table_name):
+            return reference_response(table_name, 'all', lambda: json.dumps(retrieve_all.get_all(**data), cls=CustomEncoder))
         return json.dumps(retrieve_all.get_all(**data), cls=CustomEncoder)
 
+@app.route(BASE + '/get_all/<string:table_name>', methods=['GET'])
+@jwt_required()
+def get_all_individual(table_name: str):
+    """Retrieves every record of an individual table with a strong ETag, answering 304 when the client's copy is current."""
+    current_user = get_current_user()
+    if not current_user or not current_user.has_permission(table_name, 'read'):
+        return jsonify({
+            'status': 'error',
+            'message': 'Permission denied'
+        }), 403
+    if not retrieve_all.is_individual(table_name):
+        return jsonify({'status': 'error', 'message': f'{table_name} takes filters, use POST /get_all'}), 400
+    return reference_response(table_name, 'all', lambda: json.dumps(retrieve_all.get_all(table_name), cls=CustomEncoder))
+
 @app.route(BASE + '/get_by_id/<string:table_name>/<int:id>')
 @jwt_required()
 def get_id(table_name: str, id: int):
@@ -754,6 +818,7 @@ def update_id(table_name: str):
         cls = table_class_mapper(table_name)
         instance = cls.from_dict(data)
         r_val = instance.update()
+        get_reference_cache().invalidate(table_name)
         return jsonify(r_val)
 
 @app.route(BASE + '/delete/<string:table_name>', methods=['POST'])
@@ -778,6 +843,7 @@ def delete(table_name: str):
         cls = table_class_mapper(table_name)
         instance = cls.from_dict(data, parse_memo_bills=True)
         r_val = instance.delete()
+        get_reference_cache().invalidate(table_name)
         return jsonify(r_val)
     raise DataError('Only POST requests are allowed on this /delete')
 
@@ -814,14 +880,24 @@ def parse_register_entry_route():
         image = request.files['image']
         queue_mode = request.form.get('queue_mode', 'false').lower() == 'true'
         print(request.files)
-        image_bytes = image.read()
-        encoded_image = base64.b64encode(image_bytes).decode('utf-8')
         if app.config.get('TESTING'):
             if queue_mode:
                 return (jsonify({'supplier_name': 'Test Supplier', 'supplier_name_matched': 'Test Supplier Ltd', 'party_name': 'Test Party', 'party_name_matched': 'Test Party Inc', 'bill_number': '123', 'amount': 1000, 'date': '2024-01-29', 'queue_entry_id': 'test_queue_id'}), 200)
             else:
                 return (jsonify({'supplier_name': 'Test Supplier', 'supplier_name_matched': 'Test Supplier Ltd', 'party_name': 'Test Party', 'party_name_matched': 'Test Party Inc', 'bill_number': '123', 'amount': 1000, 'date': '2024-01-29'}), 200)
-        parsed_data = parse_register_entry(encoded_image, queue_mode=queue_mode)
+        # A queued upload is written straight to disk and later moved into the queue
+        image_path = ocr_queue.stage_upload(image.stream) if queue_mode else None
+        try:
+            if image_path:
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
+            else:
+                image_bytes = image.read()
+            encoded_image = base64.b64encode(image_bytes).decode('utf-8')
+            parsed_data = parse_register_entry(encoded_image, queue_mode=queue_mode, queue=ocr_queue, image_path=image_path)
+        finally:
+            if image_path:
+                ocr_queue.discard_staged([image_path])
         if parsed_data is None:
             return (jsonify({'status': 'error', 'message': 'Failed to parse image'}), 500)
         return (jsonify(parsed_data), 200)
@@ -829,19 +905,89 @@ def parse_register_entry_route():
         print(f'Error in parse_register_entry_route: {str(e)}')
         return (jsonify({'status': 'error', 'message': f'Error processing image: {str(e)}'}), 500)
 
+@app.route(BASE + '/batch/parse_register_entries', methods=['POST'])
+@jwt_required()
+@permission_required('register_entry', 'create')
+def parse_register_entries_route():
+    """Parse many register entry images concurrently and stream one NDJSON line per image as it finishes."""
+    images = request.files.getlist('images')
+    if not images:
+        return (jsonify({'status': 'error', 'message': 'No images provided'}), 400)
+    if len(images) > MAX_BATCH_IMAGES:
+        return (jsonify({'status': 'error', 'message': f'At most {MAX_BATCH_IMAGES} images can be sent at once'}), 400)
+    queue_mode = request.form.get('queue_mode', 'true').lower() == 'true'
+    image_paths = None
+    if queue_mode:
+        # Write each upload straight to disk; the queue moves the files in instead of decoding them
+        image_paths = [ocr_queue.stage_upload(image.stream) for image in images]
+        encoded_images = []
+        for image_path in image_paths:
+            with open(image_path, 'rb') as f:
+                encoded_images.append(base64.b64encode(f.read()).decode('utf-8'))
+    else:
+        encoded_images = [base64.b64encode(image.read()).decode('utf-8') for image in images]
+
+    def generate():
+        """Serializes each result as one line."""
+        try:
+            for result in process_batch(encoded_images, queue=ocr_queue if queue_mode else None, image_paths=image_paths):
+                yield json.dumps(result, cls=CustomEncoder) + '\n'
+        finally:
+            # Failed images were never queued
+            ocr_queue.discard_staged(image_paths or [])
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def with_image_url(entry: dict) -> dict:
+    """Add the URLs of the review image and thumbnail to an OCR queue entry."""
+    return {
+        **entry,
+        'image_url': url_for('get_ocr_image', entry_id=entry['id']),
+        'thumbnail_url': url_for('get_ocr_image', entry_id=entry['id'], variant='thumbnail')
+    }
+
+@app.route(BASE + '/ocr_image/<string:entry_id>', methods=['GET'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def get_ocr_image(entry_id: str):
+    """Stream an image of a pending OCR entry from disk.
+
+    The variant query parameter selects 'review' (default), 'thumbnail' or 'original'.
+    send_file answers If-None-Match and Range requests from the file's ETag and size,
+    and the WSGI server can use sendfile, so the image is never base64 encoded or held
+    in memory.
+    """
+    variant = request.args.get('variant', 'review')
+    if variant not in ('review', 'thumbnail', 'original'):
+        return (jsonify({'status': 'error', 'message': 'Invalid variant'}), 400)
+    image_path = ocr_queue.get_image_path(entry_id, variant)
+    if image_path is None:
+        return (jsonify({'status': 'error', 'message': 'Image not found'}), 404)
+    # The file behind a URL can change, e.g. the original falls back to the review image once
+    # the quota evicts it, so clients revalidate every time; the ETag keeps that a cheap 304
+    response = send_file(image_path, conditional=True, etag=True)
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
 @app.route(BASE + '/get_next_ocr_entry', methods=['GET'])
 @jwt_required()
 @permission_required('register_entry', 'read')
 def get_next_ocr_entry():
-    """Get next pending OCR entry."""
+    """Claim the next pending OCR entry for the current user, hiding it from other operators until its lease expires.
+
+    The image is not embedded; it is fetched from the entry's image_url.
+    """
+    try:
+        lease_seconds = parse_lease_seconds(request.args.get('lease_seconds'))
+    except ValueError as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 400)
     try:
-        ocr_queue._verify_queue()
-        entry = ocr_queue.get_next_entry()
+        entry = ocr_queue.get_next_entry(get_jwt_identity(), lease_seconds)
         if entry is None:
             return (jsonify({'status': 'empty', 'message': 'No pending entries'}), 404)
         if not entry.get('ocr_data'):
             return (jsonify({'status': 'error', 'message': 'Invalid entry data'}), 500)
-        return (jsonify(entry), 200)
+        return (jsonify(with_image_url(entry)), 200)
     except Exception as e:
         print(f'Error in get_next_ocr_entry: {str(e)}')
         return (jsonify({'status': 'error', 'message': f'Error retrieving entry: {str(e)}'}), 500)
@@ -850,33 +996,138 @@ def get_next_ocr_entry():
 @jwt_required()
 @permission_required('register_entry', 'update')
 def mark_ocr_complete():
-    """Mark OCR entry as processed."""
+    """Mark OCR entry as processed, learning the supplier's bill number format from the saved bill number."""
     try:
         data = request.json
         entry_id = data.get('entry_id')
         if not entry_id:
             return (jsonify({'status': 'error', 'message': 'Entry ID required'}), 400)
-        ocr_queue.mark_complete(entry_id)
+        entry = ocr_queue.get_entry(entry_id)
+        completed = ocr_queue.mark_complete(entry_id, get_jwt_identity())
+        if completed:
+            get_bill_number_rules().learn_from_ocr(entry.get('ocr_data', {}), data.get('bill_number'), data.get('supplier_name'))
+        elif entry is not None and entry['status'] == 'pending':
+            return (jsonify({'status': 'error', 'message': 'Entry is leased by another operator'}), 409)
         return jsonify({'status': 'okay', 'message': 'Entry marked as processed'})
     except Exception as e:
         return (jsonify({'status': 'error', 'message': str(e)}), 500)
 
+@app.route(BASE + '/claim_ocr_entries', methods=['POST'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def claim_ocr_entries():
+    """Claim up to count pending OCR entries for the current user under one lease."""
+    try:
+        data = request.json or {}
+        count = int(data.get('count', 1))
+        if not 1 <= count <= MAX_BATCH_IMAGES:
+            return (jsonify({'status': 'error', 'message': f'count must be between 1 and {MAX_BATCH_IMAGES}'}), 400)
+        try:
+            lease_seconds = parse_lease_seconds(data.get('lease_seconds'))
+        except ValueError as e:
+            return (jsonify({'status': 'error', 'message': str(e)}), 400)
+        entries = ocr_queue.claim_entries(get_jwt_identity(), count, lease_seconds)
+        return jsonify({'status': 'okay', 'entries': [with_image_url(entry) for entry in entries]})
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': f'Error claiming entries: {str(e)}'}), 500)
+
+@app.route(BASE + '/extend_ocr_lease', methods=['POST'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def extend_ocr_lease():
+    """Extend the current user's lease on an OCR entry; sent periodically while the entry is being reviewed."""
+    try:
+        data = request.json or {}
+        entry_id = data.get('entry_id')
+        if not entry_id:
+            return (jsonify({'status': 'error', 'message': 'Entry ID required'}), 400)
+        try:
+            lease_seconds = parse_lease_seconds(data.get('lease_seconds'))
+        except ValueError as e:
+            return (jsonify({'status': 'error', 'message': str(e)}), 400)
+        lease_expires = ocr_queue.extend_lease(entry_id, get_jwt_identity(), lease_seconds)
+        if lease_expires is None:
+            return (jsonify({'status': 'error', 'message': 'Lease lost, the entry was claimed by another operator or completed'}), 409)
+        return jsonify({'status': 'okay', 'lease_expires': lease_expires})
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 500)
+
+@app.route(BASE + '/release_ocr_entry', methods=['POST'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def release_ocr_entry():
+    """Return an OCR entry claimed by the current user to the queue without completing it."""
+    try:
+        data = request.json or {}
+        entry_id = data.get('entry_id')
+        if not entry_id:
+            return (jsonify({'status': 'error', 'message': 'Entry ID required'}), 400)
+        if not ocr_queue.release(entry_id, get_jwt_identity()):
+            return (jsonify({'status': 'error', 'message': 'Entry is not leased by the current user'}), 409)
+        return jsonify({'status': 'okay', 'message': 'Entry released'})
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 500)
+
 @app.route(BASE + '/queue_status', methods=['GET'])
 @jwt_required()
 @permission_required('register_entry', 'read')
 def get_queue_status():
-    """Get OCR queue statistics."""
+    """Get OCR queue statistics, including leases, review throughput and the age of the oldest pending entry."""
     try:
         status = ocr_queue.get_status()
         return jsonify(status)
     except Exception as e:
         return (jsonify({'status': 'error', 'message': str(e)}), 500)
 
+@app.route(BASE + '/ocr_cache_status', methods=['GET'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def get_ocr_cache_status():
+    """Get OCR result cache statistics, including its hit rate."""
+    try:
+        return jsonify(get_result_cache().get_stats())
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 500)
+
+@app.route(BASE + '/llm_cache_status', methods=['GET'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def get_llm_cache_status():
+    """Get LLM response cache statistics, including its hit rate and whether it is enabled."""
+    try:
+        return jsonify(get_llm_cache_stats())
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 500)
+
+@app.route(BASE + '/llm_breaker_status', methods=['GET'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def get_llm_breaker_status():
+    """Get the LLM circuit breaker state, failure counts and how often OCR stages fell back to answers without the LLM."""
+    try:
+        return jsonify({**get_circuit_breaker().get_stats(), 'busy_workers': llm_busy_workers()})
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 500)
+
+@app.route(BASE + '/bill_number_rules_status', methods=['GET'])
+@jwt_required()
+@permission_required('register_entry', 'read')
+def get_bill_number_rules_status():
+    """Get learned bill number rule statistics, including the LLM calls they avoided."""
+    try:
+        return jsonify(get_bill_number_rules().get_stats())
+    except Exception as e:
+        return (jsonify({'status': 'error', 'message': str(e)}), 500)
+
 @app.route(BASE + '/update_name_mapping', methods=['POST'])
 @jwt_required()
 @permission_required('supplier', 'update')
 def update_name_mapping():
-    """Update the name mapping cache with human corrections."""
+    """Update the name mapping cache with human corrections.
+
+    A supplier correction may carry the invoice's raw_bill_number and the confirmed
+    bill_number, which teach the supplier's bill number format.
+    """
     try:
         data = request.json
         original_name = data.get('original_name')
@@ -887,6 +1138,8 @@ def update_name_mapping():
         if entity_type not in ['supplier', 'party']:
             return (jsonify({'status': 'error', 'message': 'Invalid entity type'}), 400)
         name_cache.update_mapping(original_name, corrected_name)
+        if entity_type == 'supplier' and data.get('raw_bill_number') and data.get('bill_number'):
+            get_bill_number_rules().learn([original_name, corrected_name], data['raw_bill_number'], data['bill_number'])
         return jsonify({'status': 'okay', 'message': 'Name mapping updated successfully'})
     except Exception as e:
         return (jsonify({'status': 'error', 'message': f'Error updating name mapping: {str(e)}'}), 500)
@@ -1034,6 +1287,33 @@ def get_next_available_memo_number():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route(BASE + '/v2/reserve_memo_number', methods=['POST'])
+@jwt_required()
+@permission_required('memo_entry', 'create')
+def reserve_memo_number():
+    """Reserves the next memo number so that no other operator receives it."""
+    try:
+        return json.dumps(MemoEntry.reserve_memo_number(), cls=CustomEncoder)
+    except DataError as e:
+        return handle_data_error(e)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route(BASE + '/v2/release_memo_number', methods=['POST'])
+@jwt_required()
+@permission_required('memo_entry', 'create')
+def release_memo_number():
+    """Releases a reserved memo number that was not used."""
+    try:
+        memo_number = request.json.get('memo_number')
+        if memo_number is None:
+            return jsonify({'status': 'error', 'message': 'memo_number is required'}), 400
+        return jsonify(MemoEntry.release_memo_number(int(memo_number)))
+    except DataError as e:
+        return handle_data_error(e)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route(BASE + '/memo_entries_with_dalali', methods=['GET'])
 @jwt_required()
 @permission_required('memo_entry', 'read')
@@ -1107,6 +1387,10 @@ def search():
         
         # Remove these keys so they don't interfere with additional filters
         search_data = {k: v for k, v in data.items() if k not in ['table_name', 'search']}
+        try:
+            search_data['limit'] = search_entities.parse_search_limit(search_data.get('limit'))
+        except DataError as e:
+            return jsonify(e.dict()), 400
         
         try:
             results = search_entities.search_entities(table_name, search_query, **search_data)
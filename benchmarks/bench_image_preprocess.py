@@ -0,0 +1,61 @@
+"""
+==== Description ====
+Measures image pre-processing on the invoices in Tests/test_data: payload size sent
+to the model and time of each stage (decode, orient, crop, resize, encode).
+
+End-to-end latency is estimated as pre-processing time plus the upload of the base64
+payload at --uplink-mbps. With --live and OPENAI_API_KEY set, each image is also sent
+to the model with and without pre-processing and the measured latency is printed.
+
+Usage:
+    python -m benchmarks.bench_image_preprocess [--max-side 1600] [--quality 80] [--uplink-mbps 10] [--live]
+"""
+import argparse
+import base64
+import glob
+import os
+import time
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'Tests', 'test_data')
+
+def upload_seconds(payload_bytes: int, uplink_mbps: float) -> float:
+    """Time to send a payload of base64 encoded bytes at the uplink speed."""
+    return payload_bytes * 4 / 3 * 8 / (uplink_mbps * 1_000_000)
+
+def live_latency(encoded_image: str, preprocess: bool) -> float:
+    """Send an image through InvoiceParser and return the seconds it took."""
+    from OCR.parse_register_entry_v2 import InvoiceParser
+    os.environ['OCR_PREPROCESS'] = 'true' if preprocess else 'false'
+    start = time.perf_counter()
+    InvoiceParser().parse_invoice(encoded_image)
+    return time.perf_counter() - start
+
+def run(max_side: int, quality: int, uplink_mbps: float, live: bool) -> None:
+    """Run the benchmark and print one row per image."""
+    from OCR.image_preprocess import preprocess_image
+    paths = sorted(glob.glob(os.path.join(TEST_DATA, '*.jp*g')) + glob.glob(os.path.join(TEST_DATA, '*.png')))
+    print(f'{"image":<20}{"in KB":>8}{"out KB":>8}{"decode":>8}{"orient":>8}{"crop":>8}{"resize":>8}{"encode":>8}{"e2e before":>12}{"e2e after":>11}')
+    for path in paths:
+        with open(path, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('utf-8')
+        start = time.perf_counter()
+        (_, report) = preprocess_image(encoded, max_side=max_side, quality=quality)
+        elapsed = time.perf_counter() - start
+        stages = report['stages']
+        before = upload_seconds(report['input_bytes'], uplink_mbps)
+        after = elapsed + upload_seconds(report['output_bytes'], uplink_mbps)
+        print(f'{os.path.basename(path):<20}{report["input_bytes"] / 1024:8.0f}{report["output_bytes"] / 1024:8.0f}'
+              + ''.join(f'{stages.get(stage, 0) * 1000:8.1f}' for stage in ('decode', 'orient', 'crop', 'resize', 'encode'))
+              + f'{before * 1000:12.0f}{after * 1000:11.0f}')
+        if live and os.environ.get('OPENAI_API_KEY'):
+            print(f'{"":<20}live model latency: {live_latency(encoded, False):.2f}s before, {live_latency(encoded, True):.2f}s after')
+    print('stage and e2e columns in ms; e2e is pre-processing plus upload, without model time')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-side', type=int, default=1600)
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--uplink-mbps', type=float, default=10)
+    parser.add_argument('--live', action='store_true')
+    args = parser.parse_args()
+    run(args.max_side, args.quality, args.uplink_mbps, args.live)
@@ -0,0 +1,104 @@
+"""
+==== Description ====
+Measures recall@10 and latency of name candidate generation: the full Jaro-Winkler
+scan get_fuzzy_matches did over every name, against the blocking index that scores only
+the names sharing a token or phonetic key with the query.
+
+Names are synthetic transliterated Hindi business names. Queries are corrupted the way
+OCR and data entry corrupt them: alternate spellings (sh/s, dh/d, aa/a, ksh/x, w/v),
+honorifics added or dropped ('SHREE SHARDHARAM' vs 'SHARDARAM'), abbreviated suffixes
+('P LTD', '&SONS', 'S.') and single-character typos.
+
+Usage:
+    python -m benchmarks.bench_name_blocking [--sizes 10000 100000] [--queries 300]
+"""
+import argparse
+import random
+import time
+from rapidfuzz import process, distance
+from OCR.name_blocking import BlockingIndex
+
+SYLLABLES = ['ra', 'sha', 'dha', 'ram', 'la', 'ksh', 'mi', 'ga', 'nesh', 'ba', 'ji', 'vi', 'jay', 'ku', 'mar', 'de', 'ka',
+             'ma', 'na', 'tha', 'pra', 'ti', 'su', 'resh', 'bha', 'gwa', 'an', 'chha', 'bra', 'go', 'yal', 'san', 'deep', 'har']
+WORDS = ['Textiles', 'Fabrics', 'Sarees', 'Creations', 'Fashion', 'Silk Mills', 'Traders', 'Enterprises', 'Garments', 'Suitings', 'Agency']
+HONORIFICS = ['Shree', 'Shri', 'Sri']
+SUFFIXES = ['', '', 'Pvt Ltd', '& Sons', 'Brothers']
+SPELLINGS = [('sh', 's'), ('dh', 'd'), ('aa', 'a'), ('a', 'aa'), ('ksh', 'x'), ('v', 'w'), ('ee', 'i'), ('i', 'ee'), ('chh', 'ch'), ('bh', 'b')]
+
+def make_word(rng: random.Random) -> str:
+    """A transliterated Hindi-like word."""
+    return ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).title()
+
+def make_names(count: int, seed: int = 1) -> list:
+    """Generate unique business names."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        parts = []
+        if rng.random() < 0.3:
+            parts.append(rng.choice(HONORIFICS))
+        parts.append(make_word(rng))
+        if rng.random() < 0.5:
+            parts.append(make_word(rng))
+        parts.append(rng.choice(WORDS))
+        parts.append(rng.choice(SUFFIXES))
+        names.add(' '.join(part for part in parts if part))
+    return list(names)
+
+def corrupt(name: str, rng: random.Random) -> str:
+    """Apply one or two of the variations seen between an invoice and the directory."""
+    query = name
+    for _ in range(rng.randint(1, 2)):
+        kind = rng.random()
+        if kind < 0.4:
+            options = [(old, new) for (old, new) in SPELLINGS if old in query.lower()]
+            if options:
+                (old, new) = rng.choice(options)
+                index = query.lower().index(old)
+                query = query[:index] + new + query[index + len(old):]
+        elif kind < 0.6:
+            words = query.split()
+            query = ' '.join(words[1:]) if words[0] in HONORIFICS else f'{rng.choice(HONORIFICS).upper()} {query}'
+        elif kind < 0.8:
+            query = query.replace('Pvt Ltd', 'P LTD').replace('& Sons', '&SONS').replace('Shree ', 'S. ')
+        else:
+            position = rng.randrange(1, len(query) - 1)
+            query = query[:position] + query[position + 1:]
+    return query.upper() if rng.random() < 0.5 else query
+
+def run(sizes: list, queries: int) -> None:
+    """Run the benchmark and print one row per corpus size."""
+    rng = random.Random(2)
+    print(f"{'names':>8} {'build s':>8} {'scan r@10':>10} {'scan ms/q':>10} {'block r@10':>11} {'block ms/q':>11} {'speedup':>8}")
+    for size in sizes:
+        names = make_names(size)
+        lowercase = [name.lower() for name in names]
+        targets = rng.sample(range(size), queries)
+        lookups = [corrupt(names[target], rng) for target in targets]
+
+        start = time.perf_counter()
+        index = BlockingIndex(names)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scan_hits = 0
+        for (target, lookup) in zip(targets, lookups):
+            matches = process.extract(lookup.lower(), lowercase, scorer=distance.JaroWinkler.distance, limit=10)
+            scan_hits += any(position == target for (_, _, position) in matches)
+        scan = (time.perf_counter() - start) * 1000 / queries
+
+        start = time.perf_counter()
+        block_hits = 0
+        for (target, lookup) in zip(targets, lookups):
+            matches = index.search(lookup, lowercase, 10) or []
+            block_hits += any(position == target for (position, _) in matches)
+        blocked = (time.perf_counter() - start) * 1000 / queries
+
+        print(f'{size:>8} {build:8.2f} {scan_hits / queries:10.1%} {scan:10.2f} {block_hits / queries:11.1%} {blocked:11.2f} {scan / blocked:7.1f}x')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+    run(args.sizes, args.queries)
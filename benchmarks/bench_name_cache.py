@@ -0,0 +1,95 @@
+"""
+==== Description ====
+Benchmarks NameMatchCache.get against cache sizes of 10k, 100k and 1M names.
+
+Compares the indexed lookup with the old linear scan, which re-normalized every
+cached key and scored it in a Python loop. The linear scan is skipped above
+--linear-limit names since it takes minutes per thousand queries there.
+
+Usage:
+    python -m benchmarks.bench_name_cache [--sizes 10000 100000 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+from rapidfuzz import distance
+from OCR.name_cache import NameMatchCache
+
+WORDS = ['textiles', 'fabrics', 'sarees', 'creations', 'fashion', 'silk', 'mills', 'traders', 'enterprises', 'garments', 'suitings', 'prints', 'handloom', 'agency', 'collection']
+
+def make_names(count: int, seed: int = 1) -> list:
+    """Generate unique, business-like names."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        prefix = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 8))).title()
+        names.add(f"{prefix} {rng.choice(WORDS).title()} {rng.randint(1, 999)}")
+    return list(names)
+
+def misspell(name: str, rng: random.Random) -> str:
+    """Drop or swap one character so the lookup misses the exact path."""
+    position = rng.randrange(1, len(name) - 1)
+    if rng.random() < 0.5:
+        return name[:position] + name[position + 1:]
+    return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+
+def linear_get(cache: NameMatchCache, name: str, threshold: float = 0.95):
+    """The lookup before the index: normalize and score every cached key."""
+    normalized = cache._normalize_name(name)
+    if normalized in cache.cache:
+        return cache.cache[normalized]
+    best_match = None
+    best_score = 0
+    for (cached_key, cached_value) in cache.cache.items():
+        score = distance.JaroWinkler.similarity(normalized, cache._normalize_name(cached_key))
+        if score > threshold and score > best_score:
+            best_score = score
+            best_match = cached_value
+    return best_match
+
+def build_cache(names: list, directory: str) -> NameMatchCache:
+    """Build a cache holding every name without writing the file once per name."""
+    cache = NameMatchCache(os.path.join(directory, f'cache_{len(names)}.json'))
+    for name in names:
+        normalized = cache._normalize_name(name)
+        cache.cache[normalized] = name
+        cache._index(normalized)
+    return cache
+
+def run(sizes: list, queries: int, linear_limit: int) -> None:
+    """Run the benchmark and print one row per cache size."""
+    rng = random.Random(2)
+    print(f"{'names':>10} {'build s':>9} {'index ms/q':>11} {'linear ms/q':>12} {'speedup':>8} {'hit rate':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            names = make_names(size)
+            lookups = [misspell(name, rng) for name in rng.sample(names, queries)]
+            start = time.perf_counter()
+            cache = build_cache(names, directory)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = sum(cache.get(lookup) is not None for lookup in lookups)
+            indexed = (time.perf_counter() - start) * 1000 / queries
+
+            linear = None
+            if size <= linear_limit:
+                sample = lookups[:max(1, min(queries, 20))]
+                start = time.perf_counter()
+                for lookup in sample:
+                    linear_get(cache, lookup)
+                linear = (time.perf_counter() - start) * 1000 / len(sample)
+            linear_text = f'{linear:12.2f}' if linear is not None else f"{'skipped':>12}"
+            speedup = f'{linear / indexed:7.1f}x' if linear is not None else f"{'-':>8}"
+            print(f'{size:>10} {build:9.2f} {indexed:11.3f} {linear_text} {speedup} {found / queries:9.0%}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--linear-limit', type=int, default=100000)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.linear_limit)
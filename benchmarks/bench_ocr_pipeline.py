@@ -0,0 +1,221 @@
+"""
+==== Description ====
+Runs parse_register_entry end to end, queue write included, against a local stub of
+the OpenAI endpoint (benchmarks/stub_openai_server.py), so throughput and stage
+latency can be measured without API credits.
+
+Inputs are Tests/test_data/test_image.jpeg and synthetic phone photos of bills. Each
+concurrency level uploads --uploads images from --concurrency worker threads, with
+fresh caches, queue and name cache, and reports:
+  - throughput and end-to-end latency of the uploads
+  - per-stage timings: decode, preprocessing, extraction, bill number, name matching, queue write
+  - name-cache hit rate, OCR result cache hits (re-uploads) and requests the stub served
+
+Model latency, jitter and failure injection are configurable; the name directory is
+synthetic and the database is not used.
+
+Usage:
+    python -m benchmarks.bench_ocr_pipeline [--uploads 40] [--concurrency 1 4 8] [--synthetic 30]
+        [--extract-latency-ms 2500] [--latency-ms 600] [--jitter-ms 200] [--failure-rate 0] [--names 5000]
+"""
+import argparse
+import base64
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+TEST_IMAGE = os.path.join(os.path.dirname(__file__), '..', 'Tests', 'test_data', 'test_image.jpeg')
+STAGES = ['decode', 'preprocess', 'extraction', 'bill_number', 'name_matching', 'queue_write', 'total']
+
+def synthetic_bill(index: int, rng: random.Random) -> str:
+    """A base64 JPEG of a bill photographed on a table, unique per index."""
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (3000, 4000), (rng.randint(60, 110), rng.randint(50, 90), rng.randint(40, 80)))
+    page = Image.new('RGB', (2200, 3000), (245, 243, 238))
+    draw = ImageDraw.Draw(page)
+    for row in range(40):
+        y = 150 + row * 70
+        draw.line((100, y + 50, 2100, y + 50), fill=(180, 180, 180), width=2)
+        draw.text((120, y), f'ITEM {index}-{row}  QTY {rng.randint(1, 50)}  RATE {rng.randint(100, 9999)}', fill=(20, 20, 20))
+    page = page.rotate(rng.uniform(-4, 4), expand=True, fillcolor=image.getpixel((0, 0)))
+    image.paste(page, (rng.randint(100, 600), rng.randint(100, 700)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+def load_images(synthetic: int) -> list:
+    """The test invoice followed by synthetic bills."""
+    with open(TEST_IMAGE, 'rb') as f:
+        images = [base64.b64encode(f.read()).decode('utf-8')]
+    rng = random.Random(3)
+    return images + [synthetic_bill(index, rng) for index in range(synthetic)]
+
+class StageTimer:
+    """Collects the duration of every pipeline stage.
+
+    Stages nested in extraction (preprocessing and the bill number, which parse_invoice
+    runs on the same thread) are subtracted from it, so extraction is the model call and
+    response parsing alone.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, stage: str, seconds: float):
+        """Record one duration of a stage."""
+        with self._lock:
+            self.samples[stage].append(seconds)
+        self._local.nested = getattr(self._local, 'nested', 0.0) + seconds
+
+    def wrap(self, stage: str, function):
+        """Wrap a function so each call is recorded as the stage."""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_preprocess(self, function):
+        """Wrap preprocess_image, splitting its own report into decode and the other stages."""
+        def timed(*args, **kwargs):
+            (encoded, report) = function(*args, **kwargs)
+            decode = report['stages'].get('decode', 0.0)
+            self.add('decode', decode)
+            self.add('preprocess', sum(report['stages'].values()) - decode)
+            return (encoded, report)
+        return timed
+
+    def wrap_extraction(self, function):
+        """Wrap parse_invoice, recording its time less the stages nested in it."""
+        def timed(*args, **kwargs):
+            self._local.nested = 0.0
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples['extraction'].append(elapsed - self._local.nested)
+        return timed
+
+def percentile(values: list, share: float) -> float:
+    """The value below which the given share of values lie."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else 0.0
+
+def run_level(server, images: list, uploads: int, concurrency: int, names: list) -> dict:
+    """Upload images at one concurrency level and return the measurements."""
+    from langchain_openai import ChatOpenAI
+    from OCR import circuit_breaker, name_corpus, parse_register_entry_v2, rate_limit
+    from OCR.bill_number_rules import BillNumberRules
+    from OCR.name_corpus import NameCorpus, NameCorpusCache
+    from OCR.name_matcher import NameMatcher
+    from OCR.ocr_queue import OCRQueue
+    from OCR.rate_limit import TokenBucket
+    from OCR.result_cache import OCRResultCache
+
+    rows = list(enumerate(names, 1))
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as directory:
+        def client():
+            """A chat model talking to the stub."""
+            return ChatOpenAI(model='gpt-4o-mini', api_key='stub', base_url=server.url, temperature=0, timeout=30, max_retries=1)
+
+        # Fresh shared state per level, so levels do not warm each other up
+        rate_limit._llm_limiter = TokenBucket(1000, 1000)
+        circuit_breaker._circuit_breaker = circuit_breaker.CircuitBreaker(slow_call_seconds=60)
+        name_corpus._corpus_cache = NameCorpusCache(get_version=lambda entity_type: 1, load=lambda entity_type, version: NameCorpus(entity_type, rows, version))
+        parser = parse_register_entry_v2.InvoiceParser(llm=client(), rules=BillNumberRules(os.path.join(directory, 'rules.json')))
+        matcher = NameMatcher(cache_dir=directory, llm=client())
+        queue = OCRQueue(queue_dir=os.path.join(directory, 'queue'))
+        result_cache = OCRResultCache(cache_dir=os.path.join(directory, 'results'))
+        parse_register_entry_v2.reset_instances()
+        parse_register_entry_v2._instances.update(invoice_parser=parser, name_matcher=matcher, result_cache=result_cache)
+
+        parser.parse_invoice = timer.wrap_extraction(parser.parse_invoice)
+        parser.process_bill_number = timer.wrap('bill_number', parser.process_bill_number)
+        matcher.find_matches = timer.wrap('name_matching', matcher.find_matches)
+        queue.add_entries = timer.wrap('queue_write', queue.add_entries)
+        original_preprocess = parse_register_entry_v2.preprocess_image
+        parse_register_entry_v2.preprocess_image = timer.wrap_preprocess(original_preprocess)
+        requests_before = sum(server.requests.values())
+        upload = timer.wrap('total', lambda image: parse_register_entry_v2.parse_register_entry(image, queue_mode=True, queue=queue))
+
+        errors = 0
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [pool.submit(upload, images[index % len(images)]) for index in range(uploads)]
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception:
+                        errors += 1
+        finally:
+            parse_register_entry_v2.preprocess_image = original_preprocess
+            parse_register_entry_v2.reset_instances()
+        elapsed = time.perf_counter() - start
+        name_stats = matcher.get_cache_stats()
+        breaker = circuit_breaker.get_circuit_breaker().get_stats()
+        queue._connection.close()
+    return {
+        'concurrency': concurrency,
+        'throughput': uploads / elapsed,
+        'errors': errors,
+        'samples': timer.samples,
+        'name_hit_ratio': name_stats.get('hit_ratio', 0),
+        'result_cache_hits': result_cache.get_stats()['hits'],
+        'llm_requests': sum(server.requests.values()) - requests_before,
+        'fallbacks': sum(breaker['fallbacks'].values())
+    }
+
+def run(uploads: int, levels: list, synthetic: int, extract_latency: float, latency: float, jitter: float, failure_rate: float, names_count: int) -> None:
+    """Run the benchmark and print a summary row and a stage table per concurrency level."""
+    os.environ['OCR_LLM_CACHE'] = 'false'
+    from benchmarks.bench_name_blocking import make_names
+    from benchmarks.stub_openai_server import StubOpenAIServer
+    images = load_images(synthetic)
+    names = make_names(names_count)
+    results = []
+    with StubOpenAIServer(names, latency=latency, extract_latency=extract_latency, jitter=jitter, failure_rate=failure_rate) as server:
+        for concurrency in levels:
+            results.append(run_level(server, images, uploads, concurrency, names))
+
+    print(f'{len(images)} distinct images, {uploads} uploads per level, extraction {extract_latency * 1000:.0f} ms, other calls {latency * 1000:.0f} ms, failure rate {failure_rate:.0%}')
+    print(f"{'workers':>8} {'uploads/s':>10} {'p50 s':>7} {'p95 s':>7} {'errors':>7} {'name hit':>9} {'re-uploads':>11} {'LLM calls':>10} {'fallbacks':>10}")
+    for result in results:
+        total = result['samples']['total']
+        print(f"{result['concurrency']:>8} {result['throughput']:10.2f} {percentile(total, 0.5):7.2f} {percentile(total, 0.95):7.2f} {result['errors']:>7} "
+              f"{result['name_hit_ratio']:9.0%} {result['result_cache_hits']:>11} {result['llm_requests']:>10} {result['fallbacks']:>10}")
+    print()
+    print(f"{'stage ms (mean / p95)':<22}" + ''.join(f"{str(result['concurrency']) + ' workers':>18}" for result in results))
+    for stage in STAGES:
+        cells = []
+        for result in results:
+            values = result['samples'].get(stage, [])
+            cells.append(f'{sum(values) / len(values) * 1000:8.1f} / {percentile(values, 0.95) * 1000:7.1f}' if values else f"{'-':>18}")
+        print(f'{stage:<22}' + ''.join(f'{cell:>18}' for cell in cells))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--synthetic', type=int, default=30)
+    parser.add_argument('--extract-latency-ms', type=float, default=2500)
+    parser.add_argument('--latency-ms', type=float, default=600)
+    parser.add_argument('--jitter-ms', type=float, default=200)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--names', type=int, default=5000)
+    args = parser.parse_args()
+    run(args.uploads, args.concurrency, args.synthetic, args.extract_latency_ms / 1000, args.latency_ms / 1000, args.jitter_ms / 1000,
+        args.failure_rate, args.names)
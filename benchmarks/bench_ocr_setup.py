@@ -0,0 +1,52 @@
+"""
+==== Description ====
+Measures the per-invoice setup cost of the OCR pipeline: building an InvoiceParser
+and a NameMatcher for every invoice, as parse_register_entry used to, against
+fetching the shared instances.
+
+No request is sent to OpenAI; a placeholder key is used when none is set.
+
+Usage:
+    python -m benchmarks.bench_ocr_setup [--invoices 50] [--cache-entries 5000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+def run(invoices: int, cache_entries: int) -> None:
+    """Run the benchmark and print the setup time per invoice."""
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    from OCR.name_cache import NameMatchCache
+    from OCR.name_matcher import NameMatcher
+    from OCR import parse_register_entry_v2
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = NameMatchCache(os.path.join(cache_dir, 'name_match_cache.json'))
+        cache.store.append(cache.cache, {f'supplier{i}': f'Supplier {i}' for i in range(cache_entries)})
+
+        start = time.perf_counter()
+        for _ in range(invoices):
+            parse_register_entry_v2.InvoiceParser()
+            NameMatcher(cache_dir=cache_dir)
+        before = (time.perf_counter() - start) * 1000 / invoices
+
+        parse_register_entry_v2.reset_instances()
+        parse_register_entry_v2._instances['name_matcher'] = NameMatcher(cache_dir=cache_dir)
+        parse_register_entry_v2.get_invoice_parser()
+        start = time.perf_counter()
+        for _ in range(invoices):
+            parse_register_entry_v2.get_invoice_parser()
+            parse_register_entry_v2.get_name_matcher()
+        after = (time.perf_counter() - start) * 1000 / invoices
+        parse_register_entry_v2.reset_instances()
+
+    print(f'{"setup per invoice":<24}{"ms":>10}')
+    print(f'{"new instances (before)":<24}{before:10.3f}')
+    print(f'{"shared instances (after)":<24}{after:10.5f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=50)
+    parser.add_argument('--cache-entries', type=int, default=5000)
+    args = parser.parse_args()
+    run(args.invoices, args.cache_entries)
@@ -0,0 +1,104 @@
+"""
+==== Description ====
+Measures /search queries on 100k+ suppliers and parties and 200k+ register entries:
+the previous unranked ILIKE search over the joined names, without trigram indexes,
+against the ranked, limited search of search_entities on the pg_trgm GIN indexes of
+search_trgm_upgrade.sql.
+
+Needs the database configured in .env and the pg_trgm extension. The tables are
+created in a scratch schema, bench_search, that is dropped at the end.
+
+Usage:
+    python -m benchmarks.bench_search [--individuals 100000] [--entries 200000] [--repeats 5]
+"""
+import argparse
+import io
+import random
+import time
+from benchmarks.bench_name_blocking import make_names
+
+QUERIES = ['shardaram', 'SHARDHARAM TEXTILES', 'lakshmi', 'balaji sarees', '98290', 'Surat']
+SCHEMA = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DROP SCHEMA IF EXISTS bench_search CASCADE;
+CREATE SCHEMA bench_search;
+SET search_path TO bench_search, public;
+CREATE TABLE supplier (id INT PRIMARY KEY, name VARCHAR(100) UNIQUE, address VARCHAR(300), phone_number VARCHAR(20));
+CREATE TABLE party (id INT PRIMARY KEY, name VARCHAR(100) UNIQUE, address VARCHAR(300), phone_number VARCHAR(20));
+CREATE TABLE register_entry (id INT PRIMARY KEY, supplier_id INT, party_id INT, register_date TIMESTAMP(0), amount INT,
+    bill_number INT, status VARCHAR(2) DEFAULT 'N', UNIQUE (supplier_id, party_id, bill_number, register_date));
+"""
+INDEXES = """
+CREATE INDEX supplier_name_trgm_idx ON supplier USING GIN (name gin_trgm_ops);
+CREATE INDEX supplier_address_trgm_idx ON supplier USING GIN (address gin_trgm_ops);
+CREATE INDEX supplier_phone_number_trgm_idx ON supplier USING GIN (phone_number gin_trgm_ops);
+CREATE INDEX party_name_trgm_idx ON party USING GIN (name gin_trgm_ops);
+CREATE INDEX register_entry_party_id_idx ON register_entry (party_id);
+ANALYZE;
+"""
+CITIES = ['Surat', 'Jaipur', 'Kolkata', 'Varanasi', 'Mumbai', 'Delhi', 'Bangalore']
+
+def copy(cur, table: str, rows: list):
+    """Load rows with COPY."""
+    buffer = io.StringIO(''.join('\t'.join(str(value) for value in row) + '\n' for row in rows))
+    cur.copy_from(buffer, table)
+
+def previous_search(table_name: str, search_query: str) -> str:
+    """The SQL search_entities built before: ILIKE on every field and the joined names, unranked and unlimited."""
+    pattern = search_query.replace("'", "''")
+    if table_name == 'register_entry':
+        numeric = f'OR r.bill_number = {search_query} OR r.amount = {search_query} ' if search_query.isdigit() else ''
+        return (f"SELECT r.*, s.name AS supplier_name, p.name AS party_name FROM register_entry r "
+                f"LEFT JOIN supplier s ON r.supplier_id = s.id LEFT JOIN party p ON r.party_id = p.id "
+                f"WHERE r.status ILIKE '%{pattern}%' {numeric}OR s.name ILIKE '%{pattern}%' OR p.name ILIKE '%{pattern}%'")
+    return f"SELECT * FROM {table_name} WHERE name ILIKE '%{pattern}%' OR address ILIKE '%{pattern}%' OR phone_number ILIKE '%{pattern}%'"
+
+def timed(cur, sql: str, repeats: int) -> tuple:
+    """Best wall time of a query in ms, and its row count."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cur.execute(sql)
+        rows = cur.fetchall()
+        best = min(best, time.perf_counter() - start)
+    return (best * 1000, len(rows))
+
+def run(individuals: int, entries: int, repeats: int) -> None:
+    """Load the scratch tables, then time every query before and after indexing."""
+    from psql.db_connector import connect
+    from API_Database.search_entities import build_search_query
+    rng = random.Random(5)
+    names = make_names(individuals * 2)
+    db = connect()
+    db.autocommit = True
+    cur = db.cursor()
+    try:
+        cur.execute(SCHEMA)
+        for (offset, table) in ((0, 'supplier'), (individuals, 'party')):
+            copy(cur, table, [(i + 1, names[offset + i], f'{rng.randint(1, 999)} Ring Road, {rng.choice(CITIES)}', f'98{rng.randint(10000000, 99999999)}')
+                              for i in range(individuals)])
+        copy(cur, 'register_entry', [(i + 1, rng.randint(1, individuals), rng.randint(1, individuals), f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+                                      rng.randint(1000, 500000), i + 1, 'N') for i in range(entries)])
+        cur.execute('ANALYZE')
+
+        cases = [(table, query) for table in ('supplier', 'register_entry') for query in QUERIES]
+        before = {case: timed(cur, previous_search(*case), repeats) for case in cases}
+        cur.execute(INDEXES)
+        after = {case: timed(cur, build_search_query(*case), repeats) for case in cases}
+
+        print(f'{individuals} suppliers, {individuals} parties, {entries} register entries; best of {repeats}')
+        print(f"{'table':<16}{'query':<22}{'before ms':>10}{'rows':>8}{'after ms':>10}{'rows':>6}{'speedup':>9}")
+        for case in cases:
+            ((before_ms, before_rows), (after_ms, after_rows)) = (before[case], after[case])
+            print(f'{case[0]:<16}{case[1]:<22}{before_ms:10.1f}{before_rows:8}{after_ms:10.1f}{after_rows:6}{before_ms / after_ms:8.1f}x')
+    finally:
+        cur.execute('DROP SCHEMA IF EXISTS bench_search CASCADE')
+        db.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--individuals', type=int, default=100000)
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    run(args.individuals, args.entries, args.repeats)
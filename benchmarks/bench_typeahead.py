@@ -0,0 +1,43 @@
+"""
+==== Description ====
+Measures /typeahead lookups on a synthetic name directory: the time to build the
+index, and the latency of queries typed a keystroke at a time, exact and misspelt.
+
+Usage:
+    python -m benchmarks.bench_typeahead [--names 100000] [--queries 200]
+"""
+import argparse
+import random
+import time
+from benchmarks.bench_name_blocking import corrupt, make_names
+from benchmarks.bench_ocr_pipeline import percentile
+
+def run(names_count: int, queries: int) -> None:
+    """Build the index, then time every keystroke of exact and misspelt queries."""
+    from OCR.typeahead import TypeaheadIndex
+    rng = random.Random(11)
+    names = make_names(names_count)
+    start = time.perf_counter()
+    index = TypeaheadIndex(names)
+    build = time.perf_counter() - start
+
+    print(f'{names_count} names, index built in {build:.2f} s')
+    print(f"{'queries':<10}{'keystrokes':>11}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'found':>8}")
+    for (label, make_query) in (('exact', lambda name: name), ('misspelt', lambda name: corrupt(name, rng))):
+        (latencies, found) = ([], 0)
+        for target in rng.sample(range(names_count), queries):
+            query = make_query(names[target])
+            for length in range(1, min(len(query), 12) + 1):
+                start = time.perf_counter()
+                results = index.search(query[:length])
+                latencies.append(time.perf_counter() - start)
+            found += any(position == target for (position, _) in results)
+        print(f'{label:<10}{len(latencies):>11}{percentile(latencies, 0.5) * 1000:9.3f}{percentile(latencies, 0.95) * 1000:9.3f}'
+              f'{max(latencies) * 1000:9.3f}{found / queries:8.0%}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--names', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    run(args.names, args.queries)
@@ -0,0 +1,156 @@
+"""
+A local stand-in for the OpenAI chat completions endpoint, for benchmarks that must not
+spend API credits. It recognizes the OCR prompts (invoice extraction, bill number
+normalization, single and batched name verification) and answers each plausibly after
+a configurable latency, failing a share of requests with HTTP 500 if asked to.
+
+Usage:
+    with StubOpenAIServer(names, extract_latency=2.5) as server:
+        llm = ChatOpenAI(model='gpt-4o-mini', api_key='stub', base_url=server.url)
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves POST /v1/chat/completions for the StubOpenAIServer that owns the HTTP server."""
+
+    def do_POST(self):
+        """Answer a chat completion request."""
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        (kind, content) = stub.answer(body.get('messages', []))
+        time.sleep(stub.delay(kind))
+        if stub.should_fail(kind):
+            (status, payload) = (500, {'error': {'message': 'injected failure', 'type': 'server_error'}})
+        else:
+            (status, payload) = (200, {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': body.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+            })
+        data = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        """Keep benchmark output quiet."""
+
+class StubOpenAIServer:
+    """An OpenAI-compatible endpoint on a free local port with injected latency and failures."""
+
+    def __init__(self, names: List[str], latency: float = 0.6, extract_latency: float = 2.5, jitter: float = 0.2, failure_rate: float = 0.0, distinct_suppliers: int = 25, seed: int = 0):
+        """Initialize the server; start it with start() or a with block.
+
+        Args:
+            names: Directory names the invoices are drawn from
+            latency: Seconds to answer a text prompt
+            extract_latency: Seconds to answer an extraction prompt with an image
+            jitter: Largest random deviation added to either latency, in seconds
+            failure_rate: Share of requests answered with HTTP 500
+            distinct_suppliers: Number of different suppliers the invoices come from
+            seed: Seed of the random latency and failures
+        """
+        self.names = names
+        self.latency = latency
+        self.extract_latency = extract_latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.suppliers = names[:distinct_suppliers]
+        self.requests = Counter()
+        self.failures = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass to ChatOpenAI."""
+        return f'http://127.0.0.1:{self._httpd.server_port}/v1'
+
+    def start(self) -> 'StubOpenAIServer':
+        """Serve requests on a background thread."""
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'StubOpenAIServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self, kind: str) -> float:
+        """Seconds to wait before answering a request of a kind."""
+        with self._lock:
+            base = self.extract_latency if kind == 'extraction' else self.latency
+            return max(0.0, base + self._random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self, kind: str) -> bool:
+        """Decide whether to fail a request, counting it either way."""
+        with self._lock:
+            self.requests[kind] += 1
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures[kind] += 1
+            return failed
+
+    def _invoice(self, image_url: str) -> dict:
+        """The fields of the invoice in an image, derived from the image so re-uploads agree."""
+        seed = int(hashlib.sha256(image_url.encode('utf-8')).hexdigest()[:12], 16)
+        supplier = self.suppliers[seed % len(self.suppliers)]
+        party = self.names[(seed // 7) % len(self.names)]
+        number = seed % 900 + 100
+        # OCR reads names in capitals and drops legal suffixes now and then
+        return {
+            'supplier_name': supplier.upper() if seed % 2 else supplier.replace(' Pvt Ltd', ''),
+            'supplier_name_matched': None,
+            'party_name': party.upper(),
+            'party_name_matched': None,
+            'date': f'2024-{seed % 12 + 1:02d}-{seed % 28 + 1:02d}',
+            'bill_number': f'{"".join(word[0] for word in supplier.split()[:2]).upper()}/{number}/24-25',
+            'amount': number * 37
+        }
+
+    def answer(self, messages: List[dict]) -> tuple:
+        """Classify a request and build its answer.
+
+        Returns:
+            (kind of prompt, answer text)
+        """
+        parts = []
+        for message in messages:
+            content = message.get('content')
+            parts.extend(content if isinstance(content, list) else [{'type': 'text', 'text': content or ''}])
+        images = [part['image_url']['url'] for part in parts if part.get('type') == 'image_url']
+        text = '\n'.join(part.get('text', '') for part in parts if part.get('type') == 'text')
+        if images:
+            return ('extraction', json.dumps(self._invoice(images[0])))
+        if 'Invoice Number:' in text:
+            raw = re.search(r'Invoice Number: (.*)', text).group(1)
+            digits = re.findall(r'\d+', raw)
+            return ('bill_number', digits[0] if digits else raw)
+        if 'numbered query' in text:
+            pairs = re.findall(r'(\d+)\. Query name: .*\n\s*Potential matches: (.*)', text)
+            return ('verify_batch', json.dumps({number: (json.loads(candidates) or [None])[0] for (number, candidates) in pairs}))
+        match = re.search(r'Potential matches: (.*)', text)
+        return ('verify', match.group(1).split(', ')[0] if match else 'None')
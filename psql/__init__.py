@@ -1,2 +1,2 @@
-from .db_connector import execute_query
+from .db_connector import execute_query, transaction, Transaction
 from .remote_connector import execute_remote_query
\ No newline at end of file
@@ -2,7 +2,10 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
 import re
-from typing import Tuple, Dict, Optional, Any
+import io
+import csv
+from contextlib import contextmanager
+from typing import Tuple, Dict, List, Optional, Any
 from dotenv import load_dotenv
 from Exceptions import DataError
 from .remote_connector import execute_remote_query
@@ -52,26 +55,21 @@ def add_audit_fields_to_query(query: str, query_type: str, current_user_id: Opti
             if 'created_by' in query.lower():
                 return query
                 
-            # Handle INSERT with column list and VALUES
+            # Handle INSERT with column list and VALUES (one or more rows)
             columns_match = re.search(r'INSERT\s+INTO\s+[^\s\(]+\s*\((.+?)\)', query, re.IGNORECASE | re.DOTALL)
-            values_match = re.search(r'VALUES\s*\((.+?)\)', query, re.IGNORECASE | re.DOTALL)
+            values_match = re.search(r'\)\s*VALUES\s*', query, re.IGNORECASE)
             
             if columns_match and values_match:
                 columns_str = columns_match.group(1).strip()
-                values_str = values_match.group(1).strip()
+                (rows, tail) = split_values_rows(query[values_match.end():])
                 
-                # Add created_by and last_updated_by to columns and values
-                new_columns = f"{columns_str}, created_by, last_updated_by"
-                new_values = f"{values_str}, {current_user_id}, {current_user_id}"
-                
-                # Replace in the query
-                new_query = re.sub(
-                    r'\((.+?)\)\s*VALUES\s*\((.+?)\)',
-                    f"({new_columns}) VALUES ({new_values})",
-                    query,
-                    flags=re.IGNORECASE | re.DOTALL
-                )
-                return new_query
+                if rows:
+                    # Add created_by and last_updated_by to columns and to every row
+                    new_columns = f"{columns_str}, created_by, last_updated_by"
+                    new_rows = ','.join(f"({row.strip()}, {current_user_id}, {current_user_id})" for row in rows)
+                    
+                    # Rebuild the query around the new column list and rows
+                    return f"{query[:columns_match.start(1)]}{new_columns}) VALUES {new_rows}{tail}"
         
         elif query_type == 'UPDATE':
             # Check if the query already includes last_updated_by
@@ -109,6 +107,39 @@ def add_audit_fields_to_query(query: str, query_type: str, current_user_id: Opti
     
     return query
 
+def split_values_rows(values_str: str) -> Tuple[List[str], str]:
+    """
+    Split the text following a VALUES keyword into its row tuples.
+    
+    Args:
+        values_str: The query text right after VALUES, e.g. "(1,'a'),(2,'b') RETURNING id"
+        
+    Returns:
+        Tuple: (inner text of every row tuple, the text trailing the last tuple)
+    """
+    rows = []
+    depth = 0
+    in_quotes = False
+    start = None
+    index = 0
+    for index, char in enumerate(values_str):
+        if char == "'":
+            in_quotes = not in_quotes
+        if in_quotes:
+            continue
+        if char == '(':
+            if depth == 0:
+                start = index + 1
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                rows.append(values_str[start:index])
+        elif depth == 0 and not char.isspace() and char != ',':
+            # Reached the clause following the last row (e.g. RETURNING, ON CONFLICT)
+            return rows, ' ' + values_str[index:]
+    return rows, ''
+
 def ensure_returning_id(query: str, query_type: str) -> str:
     """
     Ensure that INSERT, UPDATE, and DELETE queries have a RETURNING id clause.
@@ -138,21 +169,10 @@ def ensure_returning_id(query: str, query_type: str) -> str:
 
     return query
 
-def execute_query(query: str, dictCursor: bool=True, exec_remote: bool=True, current_user_id: Optional[int]=None, **kwargs):
+def _resolve_current_user_id(current_user_id: Optional[int]) -> Optional[int]:
     """
-    Executes a query and returns the result.
-    
-    Args:
-        query: The SQL query to execute
-        dictCursor: Whether to use a dictionary cursor
-        exec_remote: Whether to execute the query remotely
-        current_user_id: The ID of the current user (for audit trail)
-        **kwargs: Additional keyword arguments
-        
-    Returns:
-        Dict: The result of the query execution
+    Returns the given user ID, falling back to the user in Flask's request context.
     """
-    # If current_user_id is not provided, try to get it from Flask's context
     if current_user_id is None:
         try:
             # Import here to avoid circular imports
@@ -164,12 +184,19 @@ def execute_query(query: str, dictCursor: bool=True, exec_remote: bool=True, cur
         except (ImportError, RuntimeError):
             # Not in a Flask context or couldn't import the function
             pass
-    
-    
+    return current_user_id
+
+def _prepare_query(query: str, current_user_id: Optional[int]) -> Tuple[str, str]:
+    """
+    Validates the query type and adds audit fields and the RETURNING id clause.
+
+    Returns:
+        Tuple: (prepared query, query type)
+    """
     query_type = query.strip().split()[0].upper()
     if query_type == 'WITH':
         query_type = 'SELECT'
-    if query_type not in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP']:
+    if query_type not in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP', 'SET']:
         raise DataError('Invalid query type')
     
     # Add audit fields to INSERT and UPDATE queries
@@ -180,59 +207,106 @@ def execute_query(query: str, dictCursor: bool=True, exec_remote: bool=True, cur
     if query_type in ['INSERT', 'UPDATE', 'DELETE']:
         query = ensure_returning_id(query, query_type)
     
+    return query, query_type
+
+def _run_query(cur, query: str, query_type: str, current_user_id: Optional[int]) -> list:
+    """
+    Executes a prepared query on the given cursor, records its audit log and returns the fetched rows.
+    """
+    cur.execute(query)
+    
+    if query_type == 'SELECT':
+        return cur.fetchall()
+    
+    # Get the result for RETURNING clause
+    result = []
+    if query_type in ['INSERT', 'UPDATE', 'DELETE']:
+        result = cur.fetchall()
+        
+    # Record audit log for INSERT, UPDATE, DELETE
+    if query_type in ['INSERT', 'UPDATE', 'DELETE'] and current_user_id is not None and result:
+        _record_audit_logs(cur, query, query_type, current_user_id, result)
+    
+    return result
+
+def _record_audit_logs(cur, query: str, query_type: str, current_user_id: int, result: list) -> None:
+    """
+    Records one audit log row per row returned by the query, on the query's own cursor,
+    so the audit trail commits or rolls back with the change it describes.
+    A failed audit write is rolled back to a savepoint and does not fail the query.
+    """
+    try:
+        # Only import here to avoid circular imports
+        from API_Database.audit_log import record_audit_logs
+        
+        # Get record IDs directly from the RETURNING rows
+        if isinstance(result[0], dict):
+            record_ids = [row.get('id') for row in result]
+        else:
+            id_index = next((i for (i, col) in enumerate(cur.description) if col.name == 'id'), None)
+            record_ids = [None if id_index is None else row[id_index] for row in result]
+        
+        # Extract table name and changes; a multi-row INSERT has the values of each row
+        table_name, _, changes = extract_audit_info(query_type, query, cur)
+        row_changes = extract_insert_changes(query) if query_type == 'INSERT' else []
+        
+        # Skip audit logging for operations on the audit_log table itself to prevent infinite loops
+        if not table_name or table_name.lower() == 'audit_log':
+            return
+        if not row_changes and isinstance(result[0], dict) and len(result[0]) > 1:
+            # INSERT ... SELECT has no VALUES to read, but may return the inserted columns
+            row_changes = [{column: value for (column, value) in row.items() if column != 'id'} for row in result]
+        records = [(record_id, row_changes[i] if i < len(row_changes) else changes)
+                   for (i, record_id) in enumerate(record_ids) if record_id]
+        if not records:
+            return
+        
+        def execute_on_cursor(audit_query: str, **kwargs) -> Dict:
+            """Runs the audit query on the caller's cursor instead of a connection of its own."""
+            cur.execute(audit_query)
+            return {'result': cur.fetchall(), 'status': 'okay'}
+        
+        cur.execute('SAVEPOINT audit_log')
+        audit_result = record_audit_logs(current_user_id, table_name, query_type, records, execute=execute_on_cursor)
+        if audit_result['status'] == 'okay':
+            cur.execute('RELEASE SAVEPOINT audit_log')
+        else:
+            # Log the error but don't fail the transaction
+            cur.execute('ROLLBACK TO SAVEPOINT audit_log')
+            print(f"Error recording audit log: {audit_result['message']}")
+    except Exception as audit_error:
+        # Log the error but don't fail the transaction
+        print(f"Error recording audit log: {audit_error}")
+
+def execute_query(query: str, dictCursor: bool=True, exec_remote: bool=True, current_user_id: Optional[int]=None, **kwargs):
+    """
+    Executes a query and returns the result.
+    
+    Args:
+        query: The SQL query to execute
+        dictCursor: Whether to use a dictionary cursor
+        exec_remote: Whether to execute the query remotely
+        current_user_id: The ID of the current user (for audit trail)
+        **kwargs: Additional keyword arguments
+        
+    Returns:
+        Dict: The result of the query execution
+    """
+    # If current_user_id is not provided, try to get it from Flask's context
+    current_user_id = _resolve_current_user_id(current_user_id)
+    (query, query_type) = _prepare_query(query, current_user_id)
+    
     try:
         (db, cur) = cursor(dictCursor)
         
         # Execute the query
-        cur.execute(query)
+        result = _run_query(cur, query, query_type, current_user_id)
         
         # Handle non-SELECT queries
         if query_type != 'SELECT':
             if exec_remote and os.getenv('QUERY_REMOTE') == 'true':
                 exec_in_available_thread(execute_remote_query, query)
-
-            # Get the result for RETURNING clause
-            result = []
-            if query_type in ['INSERT', 'UPDATE', 'DELETE']:
-                result = cur.fetchall()
-                
-            # Record audit log for INSERT, UPDATE, DELETE
-            if query_type in ['INSERT', 'UPDATE', 'DELETE'] and current_user_id is not None and result:
-                try:
-                    # Only import here to avoid circular imports
-                    from API_Database.audit_log import record_audit_log
-                    
-                    # Get record ID directly from the result
-                    record_id = None
-                    if result and len(result) > 0:
-                        if isinstance(result[0], dict):
-                            record_id = result[0].get('id')
-                        else:
-                            for i, col in enumerate(cur.description):
-                                if col.name == 'id':
-                                    record_id = result[0][i]
-                                    break
-                    
-                    # Extract table name and changes
-                    table_name, _, changes = extract_audit_info(query_type, query, cur)
-                    
-                    # Skip audit logging for operations on the audit_log table itself to prevent infinite loops
-                    if table_name and record_id and table_name.lower() != 'audit_log':
-                        # Record the audit log
-                        record_audit_log(
-                            user_id=current_user_id,
-                            table_name=table_name,
-                            record_id=record_id,
-                            action=query_type,
-                            changes=changes
-                        )
-                except Exception as audit_error:
-                    # Log the error but don't fail the transaction
-                    print(f"Error recording audit log: {audit_error}")
-                
             db.commit()
-        else:
-            result = cur.fetchall()
         
         db.close()
         return {'result': result, 'status': 'okay', 'message': 'Query executed successfully!'}
@@ -240,6 +314,156 @@ def execute_query(query: str, dictCursor: bool=True, exec_remote: bool=True, cur
         print('Error executing query:', e)
         raise DataError({'status': 'error', 'message': f'Error with Query Execution: {e}'})
 
+def _replay_remote_queries(queries: List[str]) -> None:
+    """Sends committed queries to the remote server one after another, preserving their order."""
+    for query in queries:
+        execute_remote_query(query)
+
+def _copy_csv_field(value: Any) -> str:
+    """
+    Formats a value as a field of COPY's csv format: None as the unquoted empty field,
+    which COPY reads as NULL, and everything else quoted, so an empty string stays one.
+    """
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+class Transaction:
+    """
+    A group of queries executed on a single connection and committed together.
+
+    Queries are prepared exactly like in execute_query (audit fields, RETURNING id),
+    but nothing is committed, or sent to the remote server, until the surrounding
+    transaction() block exits without an error.
+    """
+
+    def __init__(self, db, cur, exec_remote: bool=True, current_user_id: Optional[int]=None) -> None:
+        """Initializes the transaction with an open connection and cursor."""
+        self.db = db
+        self.cursor = cur
+        self.exec_remote = exec_remote
+        self.current_user_id = current_user_id
+        self.remote_queries: List[str] = []
+
+    def execute(self, query: str, exec_remote: Optional[bool]=None) -> Dict:
+        """
+        Executes a query inside the transaction; returns the same shape as execute_query.
+
+        Args:
+            query: The SQL query to execute
+            exec_remote: Overrides the transaction's remote setting for this query
+        """
+        (query, query_type) = _prepare_query(query, self.current_user_id)
+        try:
+            result = _run_query(self.cursor, query, query_type, self.current_user_id)
+        except Exception as e:
+            print('Error executing query:', e)
+            raise DataError({'status': 'error', 'message': f'Error with Query Execution: {e}'})
+        if query_type != 'SELECT' and (self.exec_remote if exec_remote is None else exec_remote):
+            self.remote_queries.append(query)
+        return {'result': result, 'status': 'okay', 'message': 'Query executed successfully!'}
+
+    def copy_rows(self, table_name: str, columns: List[str], rows: List[List[Any]]) -> int:
+        """
+        Loads rows into a table with COPY ... FROM STDIN; returns the number of rows copied.
+        COPY is never replayed on the remote server, use replicate() for that.
+        
+        Args:
+            table_name: The table to load
+            columns: The columns, in the order the values appear in each row
+            rows: The rows to load; None values are loaded as NULL
+        """
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(_copy_csv_field(value) for value in row) + '\n')
+        buffer.seek(0)
+        columns_str = ', '.join(columns)
+        try:
+            self.cursor.copy_expert(f'COPY {table_name} ({columns_str}) FROM STDIN WITH (FORMAT csv)', buffer)
+        except Exception as e:
+            print('Error executing query:', e)
+            raise DataError({'status': 'error', 'message': f'Error with Query Execution: {e}'})
+        return self.cursor.rowcount
+
+    def replicate(self, query: str) -> None:
+        """Queues a query to be replayed on the remote server once the transaction commits."""
+        if self.exec_remote:
+            self.remote_queries.append(query)
+
+    def commit(self) -> None:
+        """Commits the transaction and replays its queries on the remote server if enabled."""
+        self.db.commit()
+        if self.remote_queries and os.getenv('QUERY_REMOTE') == 'true':
+            exec_in_available_thread(_replay_remote_queries, list(self.remote_queries))
+        self.remote_queries = []
+
+@contextmanager
+def transaction(dictCursor: bool=True, exec_remote: bool=True, current_user_id: Optional[int]=None):
+    """
+    Provides a Transaction whose queries are committed together when the block exits.
+
+    Any exception inside the block rolls back every query executed through it.
+
+    Example:
+        with transaction() as tx:
+            memo_id = tx.execute(insert_sql)['result'][0]['id']
+            tx.execute(bills_sql)
+    """
+    current_user_id = _resolve_current_user_id(current_user_id)
+    try:
+        (db, cur) = cursor(dictCursor)
+    except Exception as e:
+        print('Error executing query:', e)
+        raise DataError({'status': 'error', 'message': f'Error with Query Execution: {e}'})
+    tx = Transaction(db, cur, exec_remote=exec_remote, current_user_id=current_user_id)
+    try:
+        yield tx
+        tx.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _split_outside_quotes(text: str, quote: str) -> List[str]:
+    """
+    Split a comma separated list, ignoring commas inside quotes or parentheses.
+    """
+    parts = []
+    current = ""
+    in_quotes = False
+    depth = 0
+    for char in text:
+        if char == quote:
+            in_quotes = not in_quotes
+        elif not in_quotes and char == '(':
+            depth += 1
+        elif not in_quotes and char == ')':
+            depth -= 1
+        if char == ',' and not in_quotes and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current.strip())
+    return parts
+
+def extract_insert_changes(query: str) -> List[Dict[str, Any]]:
+    """
+    Extract the column values of every row of an INSERT ... VALUES query, in row order.
+    
+    Returns:
+        List: One dictionary of column to value text per row; empty if the query has no VALUES rows
+    """
+    columns_match = re.search(r'INSERT\s+INTO\s+[^\s\(]+\s*\((.+?)\)', query, re.IGNORECASE | re.DOTALL)
+    values_match = re.search(r'\)\s*VALUES\s*', query, re.IGNORECASE)
+    if not columns_match or not values_match:
+        return []
+    columns = [column.strip('"') for column in _split_outside_quotes(columns_match.group(1), '"')]
+    (rows, _) = split_values_rows(query[values_match.end():])
+    return [dict(zip(columns, _split_outside_quotes(row, "'"))) for row in rows]
+
 def extract_audit_info(query_type: str, query: str, cursor) -> Tuple[Optional[str], Optional[int], Optional[Dict[str, Any]]]:
     """
     Extract audit information from a query.